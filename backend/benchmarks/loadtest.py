@@ -0,0 +1,285 @@
+"""
+End-to-end load test: latency percentiles, error rates and throughput per
+concurrency level against a real uvicorn instance
+
+The synthetic corpus is served from a local HTTP server that stands in for
+video sites (the URL path fetches it through download_video's yt-dlp
+generic extractor). A configurable mix of upload, URL, history and stats
+requests is replayed at a target rate for each concurrency level.
+
+Usage (from backend/):
+    python benchmarks/loadtest.py --stub-spatial
+    python benchmarks/loadtest.py --stub-spatial --concurrency 1,2,4 --rate 2 --duration 30
+    python benchmarks/loadtest.py --target http://127.0.0.1:8000 --mix url=1 --output load.json
+"""
+import argparse
+import functools
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np
+import requests
+
+from synthetic import DEFAULT_CORPUS, QUICK_CORPUS, build_corpus
+
+REQUEST_KINDS = ("upload", "url", "history", "stats")
+PERCENTILES = (50, 90, 99)
+
+
+def parse_mix(value):
+    """'upload=4,url=4,history=1,stats=1' -> {'upload': 4.0, ...}"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind '{name}' (expected {', '.join(REQUEST_KINDS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_video_host(directory, port=0):
+    """Serves `directory` over HTTP in a background thread; returns (server, base URL)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def serve(args):
+    """--serve mode: the API under uvicorn, with its DB and workspaces in the workdir"""
+    import uvicorn
+    from run_benchmarks import install_stub_spatial, load_pipeline
+    if args.stub_spatial:
+        install_stub_spatial()
+    pipeline = load_pipeline(args.workdir)
+    uvicorn.run(pipeline.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_api(args):
+    """Launches a uvicorn instance in a child process and waits until it answers"""
+    port = args.port or free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port), "--workdir", args.workdir]
+    if args.stub_spatial:
+        command.append("--stub-spatial")
+    log = open(os.path.join(args.workdir, "server.log"), "w")
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with {process.returncode}, see {log.name}")
+        try:
+            requests.get(base + "/", timeout=1)
+            return process, base
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"API server did not start within {args.startup_timeout}s, see {log.name}")
+
+
+class RequestFactory:
+    """Builds the next request of the mix (thread-safe, deterministic for a seed)"""
+
+    def __init__(self, api, video_paths, video_base, mix, seed=0, coalesce=False):
+        self.api = api
+        self.video_paths = video_paths
+        self.video_base = video_base
+        self.kinds, weights = zip(*mix.items())
+        self.weights = np.asarray(weights) / sum(weights)
+        self.coalesce = coalesce
+        self._rng = random.Random(seed)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            kind = self._rng.choices(self.kinds, weights=self.weights)[0]
+            path = self._rng.choice(self.video_paths)
+            n = next(self._counter)
+        return kind, functools.partial(self._send, kind, path, n)
+
+    def _send(self, kind, path, n, session, timeout):
+        if kind == "upload":
+            with open(path, "rb") as f:
+                return session.post(f"{self.api}/api/analyze", timeout=timeout,
+                                    files={"file": (os.path.basename(path), f, "video/mp4")})
+        if kind == "url":
+            url = f"{self.video_base}/{os.path.basename(path)}"
+            # A unique query keeps concurrent requests for one video from sharing an analysis
+            if not self.coalesce:
+                url += f"?lt={n}"
+            return session.post(f"{self.api}/api/analyze_url", json={"url": url}, timeout=timeout)
+        return session.get(f"{self.api}/api/{kind}", timeout=timeout)
+
+
+def run_level(factory, concurrency, rate, duration, timeout):
+    """
+    Replay the mix with `concurrency` clients for `duration` seconds
+
+    With a target `rate` (requests/s, shared by all clients) requests are
+    scheduled on a fixed timeline and latency is measured from the scheduled
+    time, so a saturated server shows up as growing latency rather than as a
+    silently lower send rate. Without one, each client sends back to back.
+
+    Returns:
+        List of (kind, latency seconds, ok, status) tuples
+    """
+    samples = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    end = start + duration
+    tickets = itertools.count()
+
+    def client():
+        session = requests.Session()
+        while True:
+            if rate:
+                scheduled = start + next(tickets) / rate
+                if scheduled >= end:
+                    return
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= end:
+                    return
+            kind, send = factory.next()
+            try:
+                response = send(session, timeout)
+                ok, status = response.ok, response.status_code
+            except requests.RequestException as e:
+                ok, status = False, type(e).__name__
+            with lock:
+                samples.append((kind, time.perf_counter() - scheduled, ok, status))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        for future in [clients.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles, error rate and throughput, overall and per request kind"""
+    def stats(group):
+        latencies = np.array([latency for _, latency, _, _ in group]) * 1000
+        errors = sum(1 for _, _, ok, _ in group if not ok)
+        summary = {
+            "requests": len(group),
+            "errors": errors,
+            "error_rate": round(errors / len(group), 4) if group else 0.0,
+            "throughput_per_s": round(sum(1 for _, _, ok, _ in group if ok) / elapsed, 3) if elapsed else 0.0,
+        }
+        if len(latencies):
+            summary.update({f"p{p}_ms": round(float(np.percentile(latencies, p)), 1) for p in PERCENTILES})
+            summary["max_ms"] = round(float(latencies.max()), 1)
+        return summary
+
+    by_kind = defaultdict(list)
+    statuses = defaultdict(int)
+    for sample in samples:
+        by_kind[sample[0]].append(sample)
+        statuses[str(sample[3])] += 1
+    return dict(stats(samples), statuses=dict(statuses),
+                kinds={kind: stats(group) for kind, group in sorted(by_kind.items())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VerifAI end-to-end load test")
+    parser.add_argument("--stub-spatial", action="store_true", help="Replace SigLIP with a deterministic stub")
+    parser.add_argument("--quick", action="store_true", help="Only the small videos")
+    parser.add_argument("--concurrency", default="1,2,4", help="Comma-separated client counts to step through")
+    parser.add_argument("--rate", type=float, default=0.0, help="Target requests/s per level (0: closed loop)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("upload=4,url=4,history=1,stats=1"),
+                        help="Request mix weights, e.g. upload=4,url=4,history=1,stats=1")
+    parser.add_argument("--coalesce", action="store_true", help="Let URL requests for one video share an analysis")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--target", help="Base URL of an already running API (default: start one)")
+    parser.add_argument("--port", type=int, default=0, help="Port for the started API (default: any free port)")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--workdir", help="Where to write videos, the scratch DB and server log")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="verifai_load_")
+    if args.serve:
+        serve(args)
+        return 0
+
+    specs = QUICK_CORPUS if args.quick else DEFAULT_CORPUS
+    print(f"🎬 Generating {len(specs)} synthetic videos in {args.workdir}")
+    videos_dir = os.path.join(args.workdir, "videos")
+    paths = build_corpus(videos_dir, specs)
+    video_host, video_base = start_video_host(videos_dir)
+    print(f"🌐 Serving videos at {video_base}")
+
+    process = None
+    if args.target:
+        api = args.target.rstrip("/")
+    else:
+        process, api = start_api(args)
+        print(f"🚀 API started at {api}")
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    results = []
+    try:
+        factory = RequestFactory(api, paths, video_base, args.mix, seed=args.seed, coalesce=args.coalesce)
+        for concurrency in levels:
+            print(f"⏱️ {concurrency} client(s) for {args.duration:.0f}s"
+                  + (f" at {args.rate:g} req/s" if args.rate else ""))
+            samples, elapsed = run_level(factory, concurrency, args.rate, args.duration, args.timeout)
+            summary = dict(summarize(samples, elapsed), concurrency=concurrency, elapsed_s=round(elapsed, 2))
+            results.append(summary)
+            print(f"   {summary['requests']:>5} req  {summary['throughput_per_s']:>7.2f} ok/s  "
+                  f"errors {summary['error_rate']:.1%}  "
+                  + "  ".join(f"p{p} {summary.get(f'p{p}_ms', 0):>8.1f} ms" for p in PERCENTILES))
+            for kind, stats in summary["kinds"].items():
+                print(f"     {kind:<8} {stats['requests']:>5} req  p50 {stats.get('p50_ms', 0):>8.1f} ms  "
+                      f"p99 {stats.get('p99_ms', 0):>8.1f} ms  errors {stats['errors']}")
+    finally:
+        video_host.shutdown()
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"api": api, "mix": args.mix, "rate": args.rate, "duration_s": args.duration,
+                       "cpu_count": os.cpu_count(), "levels": results}, f, indent=2)
+
+    # Throughput curve: where adding clients stops adding completed requests
+    print("📈 Throughput by concurrency: "
+          + ", ".join(f"{r['concurrency']}→{r['throughput_per_s']:.2f}/s" for r in results))
+    return 1 if any(r["requests"] and r["error_rate"] == 1.0 for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
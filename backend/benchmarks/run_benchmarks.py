@@ -0,0 +1,250 @@
+"""
+Reproducible benchmarks: per-engine timings, end-to-end /api/analyze latency
+and a golden-score check so performance work can't silently change verdicts
+
+Usage (from backend/):
+    python benchmarks/run_benchmarks.py --stub-spatial
+    python benchmarks/run_benchmarks.py --stub-spatial --update-golden
+    python benchmarks/run_benchmarks.py --quick --repeat 5 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np
+
+from synthetic import DEFAULT_CORPUS, QUICK_CORPUS, build_corpus
+from utils.frame_similarity import gated_scores
+from utils.frame_views import FrameViews, as_views
+
+GOLDEN_PATH = os.path.join(BENCH_DIR, "golden_scores.json")
+SCORE_KEYS = ("spatial", "temporal", "forensic", "metadata", "final_confidence")
+
+
+class StubSpatialDetector:
+    """Deterministic stand-in for the SigLIP model (no torch, no weights download)"""
+    max_side = 448
+
+    def detect(self, frame_array):
+        gray = as_views(frame_array).gray(64).astype(np.float32)
+        # Texture energy squashed to 0-1: cheap, deterministic and frame-dependent
+        energy = float(np.mean(np.abs(np.diff(gray, axis=1)))) / 32.0
+        return float(min(energy, 1.0))
+
+    def detect_batch(self, frames):
+        return [self.detect(frame) for frame in frames]
+
+    def detect_frames(self, frames, max_inferences=10, stop=None):
+        return gated_scores(frames, self.detect, max_inferences=max_inferences, stop=stop)
+
+
+def install_stub_spatial():
+    module = types.ModuleType("models.spatial_detector")
+    module.SpatialDetector = StubSpatialDetector
+    sys.modules["models.spatial_detector"] = module
+
+
+def load_pipeline(workdir):
+    """Import the FastAPI app with its database and upload dir inside `workdir`"""
+    import database
+    database.DB_PATH = os.path.join(workdir, "bench_results.db")
+    os.chdir(workdir)
+    import pipeline
+    return pipeline
+
+
+def fresh(frames):
+    """Copy FrameViews without their cached views so every repeat pays full cost"""
+    return [FrameViews(f.bgr(), source_shape=f.source_shape, timestamp=f.timestamp) for f in frames]
+
+
+def measure(func, repeat):
+    """Returns (last result, timings in seconds, peak traced bytes)"""
+    timings = []
+    result = None
+    tracemalloc.start()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, timings, peak
+
+
+def summarize(timings, items=1):
+    best = min(timings)
+    return {
+        "best_ms": round(best * 1000, 2),
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "throughput_per_s": round(items / best, 2) if best > 0 else None,
+    }
+
+
+def bench_engines(pipeline, path, repeat):
+    """Times each engine the way run_analysis calls it and returns its scores"""
+    sample, timings, peak = measure(
+        lambda: pipeline.sample_frames_adaptive(path, budget=10, max_side=pipeline.FRAME_MAX_SIDE), repeat)
+    frames, runs = sample["frames"], sample["runs"]
+    report = {"decode": dict(summarize(timings, len(sample["sequence"]) + len(frames)), peak_bytes=peak)}
+
+    spatial, timings, peak = measure(
+        lambda: pipeline.spatial_engine.detect_frames(fresh(frames), max_inferences=10), repeat)
+    report["spatial"] = dict(summarize(timings, len(frames)), peak_bytes=peak,
+                             inferences=spatial["inferences"], skipped=spatial["skipped"])
+
+    def run_temporal():
+        fresh_runs = [fresh(run) for run in runs]
+        sequence = [f for run in fresh_runs for f in run]
+        return pipeline.temporal_engine.detect_all_temporal(sequence, runs=fresh_runs)
+
+    temporal, timings, peak = measure(run_temporal, repeat)
+    report["temporal"] = dict(summarize(timings, len(sample["sequence"])), peak_bytes=peak)
+
+    forensic, timings, peak = measure(
+        lambda: [pipeline.forensic_engine.detect_all_artifacts(f) for f in fresh(frames[::2])], repeat)
+    report["forensic"] = dict(summarize(timings, len(frames[::2])), peak_bytes=peak)
+
+    metadata, timings, peak = measure(lambda: pipeline.metadata_engine.check_metadata(path), repeat)
+    report["metadata"] = dict(summarize(timings), peak_bytes=peak)
+
+    scores = {
+        "spatial": pipeline.safe_float(spatial["scores"]),
+        "temporal": pipeline.safe_float(temporal["confidence"]),
+        "forensic": pipeline.safe_float([r["confidence"] for r in forensic]),
+        "metadata": pipeline.safe_float(metadata["confidence"]),
+    }
+    return report, scores
+
+
+def bench_endpoint(pipeline, path, repeat):
+    """Times the full /api/analyze path through FastAPI's TestClient"""
+    from fastapi.testclient import TestClient
+    client = TestClient(pipeline.app)
+
+    def post():
+        with open(path, "rb") as f:
+            response = client.post("/api/analyze", files={"file": (os.path.basename(path), f, "video/mp4")})
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/analyze returned {response.status_code}: {response.text}")
+        return response.json()
+
+    result, timings, peak = measure(post, repeat)
+    return dict(summarize(timings), peak_bytes=peak), result
+
+
+def compare_golden(results, golden, tolerance, spatial_mode):
+    """Lists every score that drifted beyond `tolerance` or flipped its verdict"""
+    problems = []
+    if golden.get("spatial_model") != spatial_mode:
+        print(f"⚠️ Golden scores were recorded with the '{golden.get('spatial_model')}' spatial model; "
+              f"spatial and final scores are not compared.")
+    for name, entry in results.items():
+        expected = golden.get("videos", {}).get(name)
+        if expected is None:
+            problems.append(f"{name}: no golden entry")
+            continue
+        for key in SCORE_KEYS:
+            if key in ("spatial", "final_confidence") and golden.get("spatial_model") != spatial_mode:
+                continue
+            diff = abs(entry["scores"][key] - expected[key])
+            if diff > tolerance:
+                problems.append(f"{name}.{key}: {entry['scores'][key]:.4f} vs golden {expected[key]:.4f}")
+        if golden.get("spatial_model") == spatial_mode and entry["classification"] != expected["classification"]:
+            problems.append(f"{name}: verdict {entry['classification']} vs golden {expected['classification']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VerifAI benchmark suite")
+    parser.add_argument("--stub-spatial", action="store_true", help="Replace SigLIP with a deterministic stub")
+    parser.add_argument("--quick", action="store_true", help="Only the small videos")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Allowed absolute score drift")
+    parser.add_argument("--update-golden", action="store_true", help="Rewrite golden_scores.json")
+    parser.add_argument("--output", help="Write the full results as JSON")
+    parser.add_argument("--workdir", help="Where to write videos and the scratch DB (default: temp dir)")
+    args = parser.parse_args()
+
+    spatial_mode = "stub" if args.stub_spatial else "siglip"
+    if args.stub_spatial:
+        install_stub_spatial()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="verifai_bench_")
+    specs = QUICK_CORPUS if args.quick else DEFAULT_CORPUS
+    print(f"🎬 Generating {len(specs)} synthetic videos in {workdir}")
+    paths = build_corpus(os.path.join(workdir, "videos"), specs)
+
+    pipeline = load_pipeline(workdir)
+
+    results = {}
+    for spec, path in zip(specs, paths):
+        print(f"⏱️ {spec.name} ({spec.width}x{spec.height}, {spec.seconds}s, motion={spec.motion}, faces={spec.faces})")
+        engines, scores = bench_engines(pipeline, path, args.repeat)
+        endpoint, report = bench_endpoint(pipeline, path, args.repeat)
+        scores["final_confidence"] = report["final_confidence"]
+        results[spec.name] = {
+            "engines": engines,
+            "endpoint": endpoint,
+            "scores": {k: round(v, 4) for k, v in scores.items()},
+            "classification": report["classification"],
+        }
+        for stage, stats in engines.items():
+            print(f"   {stage:<9} best {stats['best_ms']:>9.2f} ms  peak {stats['peak_bytes'] / 1e6:7.1f} MB")
+        print(f"   endpoint  best {endpoint['best_ms']:>9.2f} ms  -> {report['classification']} "
+              f"({report['final_confidence']:.3f})")
+
+    summary = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "spatial_model": spatial_mode,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "videos": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.update_golden:
+        golden = {
+            "spatial_model": spatial_mode,
+            "videos": {name: dict(r["scores"], classification=r["classification"]) for name, r in results.items()},
+        }
+        with open(GOLDEN_PATH, "w") as f:
+            json.dump(golden, f, indent=2)
+            f.write("\n")
+        print(f"✅ Golden scores written to {GOLDEN_PATH}")
+        return 0
+
+    if not os.path.exists(GOLDEN_PATH):
+        print("⚠️ No golden scores yet; run with --update-golden to record them.")
+        return 0
+
+    with open(GOLDEN_PATH) as f:
+        golden = json.load(f)
+    problems = compare_golden(results, golden, args.tolerance, spatial_mode)
+    if problems:
+        print("❌ Scores drifted from golden values:")
+        for problem in problems:
+            print(f"   {problem}")
+        return 1
+    print("✅ All scores match the golden values")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
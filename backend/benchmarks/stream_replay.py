@@ -0,0 +1,173 @@
+"""
+Live-stream replay for the streaming analysis mode
+
+A synthetic video is cut into MPEG-TS segments and published as a live HLS
+playlist on a local HTTP server, one segment at a time as if it were being
+broadcast. The verdicts streamed back by /api/analyze_stream are printed as
+they arrive. With --growing-file the segments are instead appended to one
+local file that the streaming reader follows in-process.
+
+Usage (from backend/):
+    python benchmarks/stream_replay.py --stub-spatial
+    python benchmarks/stream_replay.py --stub-spatial --seconds 120 --speed 4 --update 10
+    python benchmarks/stream_replay.py --stub-spatial --growing-file
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import requests
+
+from loadtest import start_api, start_video_host
+from synthetic import VideoSpec, write_segments
+
+
+class LivePublisher:
+    """Publishes segments to a live playlist (or a growing file) at `speed` times real time"""
+
+    def __init__(self, segments, segment_seconds, speed, playlist=None, growing_file=None):
+        self.segments = segments
+        self.segment_seconds = segment_seconds
+        self.speed = speed
+        self.playlist = playlist
+        self.growing_file = growing_file
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _write_playlist(self, published, ended):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(self.segment_seconds + 0.999)}",
+                 "#EXT-X-MEDIA-SEQUENCE:0"]
+        for path in published:
+            lines += [f"#EXTINF:{self.segment_seconds:.3f},", os.path.basename(path)]
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        # Replace atomically so the player never reads half a playlist
+        temporary = self.playlist + ".tmp"
+        with open(temporary, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temporary, self.playlist)
+
+    def publish(self, count):
+        published = self.segments[:count]
+        if self.playlist:
+            self._write_playlist(published, ended=count == len(self.segments))
+        if self.growing_file:
+            with open(self.growing_file, "ab") as out, open(published[-1], "rb") as segment:
+                shutil.copyfileobj(segment, out)
+
+    def _run(self):
+        for count in range(2, len(self.segments) + 1):
+            time.sleep(self.segment_seconds / self.speed)
+            self.publish(count)
+
+    def start(self):
+        # The first segment is there before the player connects
+        self.publish(1)
+        self.thread.start()
+
+
+def print_update(update, started):
+    scores = update["scores"]
+    print(f"   t={update['stream_time']:>6.1f}s  +{time.perf_counter() - started:>6.1f}s  "
+          f"{update['classification']:<12} {update['final_confidence']:.3f}  "
+          f"spatial {scores['spatial']:.2f} temporal {scores['temporal']:.2f} forensic {scores['forensic']:.2f}  "
+          f"window {update['window']['frames']} frames" + ("  (final)" if update["final"] else ""))
+
+
+def replay_api(args, base, playlist_url):
+    """Streams verdicts from the API for the live playlist"""
+    started = time.perf_counter()
+    updates = 0
+    with requests.post(f"{base}/api/analyze_stream", stream=True, timeout=args.seconds * 4 + 60,
+                       json={"url": playlist_url, "max_seconds": args.seconds,
+                             "update_seconds": args.update, "window_seconds": args.window}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                print_update(json.loads(line), started)
+                updates += 1
+    return updates
+
+
+def replay_growing_file(args, path):
+    """Follows the growing file in-process"""
+    from run_benchmarks import install_stub_spatial, load_pipeline
+    if args.stub_spatial:
+        install_stub_spatial()
+    pipeline = load_pipeline(args.workdir)
+    from utils import streaming
+    analyzer = streaming.StreamAnalyzer(pipeline.spatial_engine.detect_frames, pipeline.temporal_engine,
+                                        pipeline.forensic_engine, window_seconds=args.window,
+                                        max_side=pipeline.FRAME_MAX_SIDE)
+    started = time.perf_counter()
+    updates = 0
+    for update in streaming.analyze_stream(path, analyzer, update_seconds=args.update, max_seconds=args.seconds,
+                                           idle_timeout=max(5.0, 2 * args.segment_seconds / args.speed)):
+        print_update(update, started)
+        updates += 1
+    return updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VerifAI live-stream replay")
+    parser.add_argument("--stub-spatial", action="store_true", help="Replace SigLIP with a deterministic stub")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of the synthetic broadcast")
+    parser.add_argument("--segment-seconds", type=float, default=2.0)
+    parser.add_argument("--speed", type=float, default=2.0, help="Publish this many times faster than real time")
+    parser.add_argument("--update", type=float, default=5.0, help="Stream seconds between verdicts")
+    parser.add_argument("--window", type=float, default=30.0, help="Stream seconds the statistics cover")
+    parser.add_argument("--faces", action="store_true", help="Draw a talking head into the video")
+    parser.add_argument("--growing-file", action="store_true", help="Follow a growing local file in-process")
+    parser.add_argument("--target", help="Base URL of an already running API (default: start one)")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--workdir", help="Where to write segments, the scratch DB and server log")
+    args = parser.parse_args()
+
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="verifai_stream_"))
+    live_dir = os.path.join(args.workdir, "live")
+    spec = VideoSpec("broadcast", 854, 480, args.seconds, motion="medium", faces=args.faces, scene_cuts=2)
+    print(f"🎬 Rendering {args.seconds:.0f}s broadcast as {args.segment_seconds:g}s segments in {live_dir}")
+    segments = write_segments(spec, live_dir, args.segment_seconds)
+
+    if args.growing_file:
+        path = os.path.join(args.workdir, "growing.ts")
+        publisher = LivePublisher(segments, args.segment_seconds, args.speed, growing_file=path)
+        publisher.start()
+        print(f"📼 Appending to {path} at {args.speed:g}x real time")
+        updates = replay_growing_file(args, path)
+    else:
+        playlist = os.path.join(live_dir, "live.m3u8")
+        publisher = LivePublisher(segments, args.segment_seconds, args.speed, playlist=playlist)
+        video_host, video_base = start_video_host(live_dir)
+        process = None
+        try:
+            if args.target:
+                base = args.target.rstrip("/")
+            else:
+                process, base = start_api(args)
+                print(f"🚀 API started at {base}")
+            publisher.start()
+            print(f"📡 Live playlist at {video_base}/live.m3u8 ({args.speed:g}x real time)")
+            updates = replay_api(args, base, f"{video_base}/live.m3u8")
+        finally:
+            video_host.shutdown()
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    print(f"✅ {updates} verdicts")
+    return 0 if updates else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Deterministic synthetic test videos written with OpenCV's VideoWriter
+"""
+import os
+from dataclasses import dataclass
+from typing import List
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class VideoSpec:
+    name: str
+    width: int
+    height: int
+    seconds: float
+    fps: int = 30
+    motion: str = "medium"   # none | low | medium | high
+    faces: bool = False
+    scene_cuts: int = 0
+    seed: int = 0
+
+
+# Pixels per frame of camera pan for each motion level
+MOTION_SPEED = {"none": 0.0, "low": 0.5, "medium": 2.0, "high": 6.0}
+
+DEFAULT_CORPUS: List[VideoSpec] = [
+    VideoSpec("static_480p", 854, 480, 4, motion="none"),
+    VideoSpec("talking_head_480p", 854, 480, 4, motion="low", faces=True),
+    VideoSpec("pan_720p", 1280, 720, 4, motion="high"),
+    VideoSpec("scenes_480p_30s", 854, 480, 30, motion="medium", scene_cuts=4),
+    VideoSpec("hd_1080p", 1920, 1080, 3, motion="medium", faces=True),
+]
+
+QUICK_CORPUS = [spec for spec in DEFAULT_CORPUS if spec.width <= 854 and spec.seconds <= 4]
+
+
+def _background(spec: VideoSpec, scene: int) -> np.ndarray:
+    """Textured background, wider than the frame so it can be panned"""
+    rng = np.random.default_rng(spec.seed * 100 + scene)
+    h, w = spec.height, spec.width * 2
+    noise = rng.normal(0, 1, (h // 8, w // 8, 3)).astype(np.float32)
+    texture = cv2.resize(noise, (w, h), interpolation=cv2.INTER_CUBIC)
+    base = np.array([60 + 40 * scene, 110, 160 - 25 * scene], np.float32) % 255
+    image = np.clip(base + texture * 35, 0, 255).astype(np.uint8)
+    for _ in range(12):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x, y), (x + spec.width // 10, y + spec.height // 10), color, -1)
+    return image
+
+
+def _draw_face(frame: np.ndarray, t: int, spec: VideoSpec):
+    """Simple frontal face: skin ellipse, blinking eyes, moving mouth"""
+    h, w = frame.shape[:2]
+    cx, cy = w // 2, h // 2
+    fw, fh = w // 8, h // 4
+    cv2.ellipse(frame, (cx, cy), (fw, fh), 0, 0, 360, (150, 180, 225), -1)
+    eye_open = (t % 45) > 3
+    for dx in (-fw // 2, fw // 2):
+        if eye_open:
+            cv2.ellipse(frame, (cx + dx, cy - fh // 4), (fw // 5, fh // 10), 0, 0, 360, (255, 255, 255), -1)
+            cv2.circle(frame, (cx + dx, cy - fh // 4), fh // 14, (40, 30, 20), -1)
+        else:
+            cv2.line(frame, (cx + dx - fw // 5, cy - fh // 4), (cx + dx + fw // 5, cy - fh // 4), (40, 30, 20), 2)
+    mouth_open = int(fh // 12 * (1 + np.sin(t / 3.0)))
+    cv2.ellipse(frame, (cx, cy + fh // 2), (fw // 3, max(1, mouth_open)), 0, 0, 360, (60, 40, 150), -1)
+
+
+def render_frames(spec: VideoSpec):
+    """Yield the BGR frames of `spec` in order"""
+    rng = np.random.default_rng(spec.seed)
+
+    total = int(spec.seconds * spec.fps)
+    scene_length = total // (spec.scene_cuts + 1) or total
+    speed = MOTION_SPEED[spec.motion]
+    backgrounds = {}
+
+    for t in range(total):
+        scene = min(t // scene_length, spec.scene_cuts)
+        if scene not in backgrounds:
+            backgrounds[scene] = _background(spec, scene)
+        offset = int(speed * (t % scene_length)) % spec.width
+        frame = backgrounds[scene][:, offset:offset + spec.width].copy()
+        if spec.motion != "none":
+            # Handheld-style jitter on top of the pan
+            jitter = rng.normal(0, speed / 4 + 0.1, 2)
+            matrix = np.float32([[1, 0, jitter[0]], [0, 1, jitter[1]]])
+            frame = cv2.warpAffine(frame, matrix, (spec.width, spec.height), borderMode=cv2.BORDER_REFLECT)
+        if spec.faces:
+            _draw_face(frame, t, spec)
+        yield frame
+
+
+def write_video(spec: VideoSpec, directory: str) -> str:
+    """Render `spec` to an mp4 file and return its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{spec.name}.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), spec.fps, (spec.width, spec.height))
+    for frame in render_frames(spec):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def write_segments(spec: VideoSpec, directory: str, segment_seconds: float = 2.0) -> List[str]:
+    """
+    Render `spec` as consecutive MPEG-TS segments (for HLS playlists and growing files)
+
+    Returns:
+        Segment paths in order
+    """
+    os.makedirs(directory, exist_ok=True)
+    per_segment = max(1, int(segment_seconds * spec.fps))
+    paths, writer = [], None
+    for t, frame in enumerate(render_frames(spec)):
+        if t % per_segment == 0:
+            if writer is not None:
+                writer.release()
+            paths.append(os.path.join(directory, f"{spec.name}_{len(paths):05d}.ts"))
+            writer = cv2.VideoWriter(paths[-1], cv2.VideoWriter_fourcc(*"mp4v"), spec.fps, (spec.width, spec.height))
+        writer.write(frame)
+    if writer is not None:
+        writer.release()
+    return paths
+
+
+def build_corpus(directory: str, specs: List[VideoSpec] = None) -> List[str]:
+    return [write_video(spec, directory) for spec in (specs or DEFAULT_CORPUS)]
@@ -1,24 +1,85 @@
 # backend/database.py
+import argparse
 import sqlite3
 import os
-from datetime import datetime
+import json
+import threading
+from datetime import datetime, timedelta
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "verifai_results.db")
+# Old results move to an attached archive database (default: next to DB_PATH)
+ARCHIVE_PATH = os.environ.get("VERIFAI_ARCHIVE_DB")
+
+# Results older than this are archived (0 keeps everything in the hot database)
+RETENTION_DAYS = int(os.environ.get("VERIFAI_RETENTION_DAYS", "90"))
+# Job profiles are only useful while a slowdown is being investigated
+PROFILE_RETENTION_DAYS = int(os.environ.get("VERIFAI_PROFILE_RETENTION_DAYS", "14"))
+MAINTENANCE_INTERVAL = int(os.environ.get("VERIFAI_DB_MAINTENANCE_INTERVAL", "3600"))  # seconds
+ARCHIVE_BATCH = 500      # Rows moved per transaction, so writers are never blocked for long
+VACUUM_PAGES = 2000      # Free pages returned to the OS per maintenance pass
+
+RESULT_COLUMNS = '''
+    job_id TEXT PRIMARY KEY,
+    filename TEXT,
+    classification TEXT,
+    confidence REAL,
+    spatial_score REAL,
+    temporal_score REAL,
+    forensic_score REAL,
+    metadata_score REAL,
+    timestamp DATETIME,
+    stage_timings TEXT
+'''
+
+def archive_path():
+    return ARCHIVE_PATH or os.path.splitext(DB_PATH)[0] + "_archive.db"
+
+def _attach_archive(cursor):
+    cursor.execute('ATTACH DATABASE ? AS archive', (archive_path(),))
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS archive.analysis_results ({RESULT_COLUMNS})')
+    cursor.execute('CREATE INDEX IF NOT EXISTS archive.idx_results_timestamp ON analysis_results (timestamp)')
+
+def _results_source(cursor):
+    """
+    FROM clause covering the hot and (when it exists) the archived results
+
+    Rows carry an `archived` column (0 or 1) either way.
+    """
+    if not os.path.exists(archive_path()):
+        return '(SELECT *, 0 AS archived FROM main.analysis_results)'
+    _attach_archive(cursor)
+    return '''(SELECT *, 0 AS archived FROM main.analysis_results
+              UNION ALL
+              SELECT *, 1 AS archived FROM archive.analysis_results)'''
 
 def init_db():
     """Creates the database table if it doesn't exist."""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    # Incremental auto-vacuum lets maintenance return freed pages without a full VACUUM.
+    # A new (empty) database takes the setting directly; an existing one needs a full
+    # VACUUM, which locks it for a long time, so that is left to an explicit command
+    if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        if cursor.execute('PRAGMA page_count').fetchone()[0] == 0:
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        else:
+            print("⚠️ Database does not use incremental auto-vacuum; freed space is only returned after "
+                  "`python database.py --enable-incremental-vacuum` (run it while the server is stopped)")
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS analysis_results ({RESULT_COLUMNS})')
+    # Older databases predate the stage_timings column
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(analysis_results)')]
+    if 'stage_timings' not in columns:
+        cursor.execute('ALTER TABLE analysis_results ADD COLUMN stage_timings TEXT')
+    # History is read newest first and archived oldest first
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_timestamp ON analysis_results (timestamp)')
+    # Sampling profiles (folded stacks) of profiled jobs, see utils/profiling.py
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS analysis_results (
+        CREATE TABLE IF NOT EXISTS job_profiles (
             job_id TEXT PRIMARY KEY,
-            filename TEXT,
-            classification TEXT,
-            confidence REAL,
-            spatial_score REAL,
-            temporal_score REAL,
-            forensic_score REAL,
-            metadata_score REAL,
+            trigger TEXT,
+            samples INTEGER,
+            duration_ms REAL,
+            folded TEXT,
             timestamp DATETIME
         )
     ''')
@@ -32,8 +93,8 @@ def save_analysis_result(job_id, filename, report, breakdown):
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO analysis_results 
-        (job_id, filename, classification, confidence, spatial_score, temporal_score, forensic_score, metadata_score, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        (job_id, filename, classification, confidence, spatial_score, temporal_score, forensic_score, metadata_score, timestamp, stage_timings)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         job_id, 
         filename, 
@@ -43,20 +104,48 @@ def save_analysis_result(job_id, filename, report, breakdown):
         breakdown.get('temporal'),
         breakdown.get('forensic'),
         breakdown.get('metadata'),
-        datetime.now()
+        datetime.now(),
+        json.dumps(report['stage_timings_ms']) if report.get('stage_timings_ms') else None
     ))
     conn.commit()
     conn.close()
 
-def get_analysis_history(limit: int = 50):
-    """Retrieve analysis history"""
+def save_job_profile(job_id, folded, samples, duration_ms, trigger):
+    """Stores a job's profile in collapsed-stack format."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO job_profiles (job_id, trigger, samples, duration_ms, folded, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (job_id, trigger, samples, duration_ms, folded, datetime.now()))
+    conn.commit()
+    conn.close()
+
+def get_job_profile(job_id: str):
+    """Get a job's profile (None if the job was not profiled)"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM job_profiles WHERE job_id = ?', (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    return dict(row) if row else None
+
+def get_analysis_history(limit: int = 50, include_archived: bool = False):
+    """Retrieve analysis history (archived rows too when asked, flagged with archived=1)"""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row  # Return rows as dictionaries
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT * FROM analysis_results 
-        ORDER BY timestamp DESC 
+    if include_archived:
+        source = _results_source(cursor)
+    else:
+        source = '(SELECT *, 0 AS archived FROM main.analysis_results)'
+    cursor.execute(f'''
+        SELECT * FROM {source}
+        ORDER BY timestamp DESC
         LIMIT ?
     ''', (limit,))
     
@@ -66,27 +155,28 @@ def get_analysis_history(limit: int = 50):
     return [dict(row) for row in rows]
 
 def get_statistics():
-    """Get overall statistics"""
+    """Get overall statistics (archived results included)"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    source = _results_source(cursor)
     
     # Total analyses
-    cursor.execute('SELECT COUNT(*) FROM analysis_results')
+    cursor.execute(f'SELECT COUNT(*) FROM {source}')
     total = cursor.fetchone()[0]
     
     # AI vs Real count
-    cursor.execute('SELECT COUNT(*) FROM analysis_results WHERE classification = "AI-Generated"')
+    cursor.execute(f'SELECT COUNT(*) FROM {source} WHERE classification = "AI-Generated"')
     ai_count = cursor.fetchone()[0]
     
-    cursor.execute('SELECT COUNT(*) FROM analysis_results WHERE classification = "Real"')
+    cursor.execute(f'SELECT COUNT(*) FROM {source} WHERE classification = "Real"')
     real_count = cursor.fetchone()[0]
     
     # Average confidence
-    cursor.execute('SELECT AVG(confidence) FROM analysis_results')
+    cursor.execute(f'SELECT AVG(confidence) FROM {source}')
     avg_confidence = cursor.fetchone()[0] or 0.0
     
     # Average scores by engine
-    cursor.execute('SELECT AVG(spatial_score), AVG(temporal_score), AVG(forensic_score), AVG(metadata_score) FROM analysis_results')
+    cursor.execute(f'SELECT AVG(spatial_score), AVG(temporal_score), AVG(forensic_score), AVG(metadata_score) FROM {source}')
     avg_scores = cursor.fetchone()
     
     conn.close()
@@ -106,27 +196,166 @@ def get_statistics():
     }
 
 def get_result_by_id(job_id: str):
-    """Get specific result by job ID"""
+    """Get specific result by job ID (archived ones too, flagged with archived=1)"""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM analysis_results WHERE job_id = ?', (job_id,))
+    cursor.execute(f'SELECT * FROM {_results_source(cursor)} WHERE job_id = ?', (job_id,))
     row = cursor.fetchone()
     conn.close()
     
     return dict(row) if row else None
 
 def clear_history():
-    """Clear all history"""
+    """Clear all history, archived results included"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    cursor.execute('SELECT COUNT(*) FROM analysis_results')
+    cursor.execute(f'SELECT COUNT(*) FROM {_results_source(cursor)}')
     count = cursor.fetchone()[0]
     
-    cursor.execute('DELETE FROM analysis_results')
+    cursor.execute('DELETE FROM main.analysis_results')
+    if os.path.exists(archive_path()):
+        cursor.execute('DELETE FROM archive.analysis_results')
     conn.commit()
     conn.close()
     
-    return count
\ No newline at end of file
+    return count
+
+def update_verdicts(rows):
+    """
+    Overwrites the verdict of stored results, archived ones included
+
+    `rows` are (classification, confidence, job_id) tuples. Returns the
+    number of rows updated.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    tables = ['main.analysis_results']
+    if os.path.exists(archive_path()):
+        _attach_archive(cursor)
+        conn.commit()
+        tables.append('archive.analysis_results')
+    
+    updated = 0
+    # One transaction, so a result being archived meanwhile is updated exactly once
+    with conn:
+        for table in tables:
+            cursor.executemany(f'UPDATE {table} SET classification = ?, confidence = ? WHERE job_id = ?', rows)
+            updated += cursor.rowcount
+    conn.close()
+    return updated
+
+def archive_old_results(days: int = RETENTION_DAYS, batch: int = ARCHIVE_BATCH):
+    """
+    Moves results older than `days` into the archive database, oldest first
+
+    Each batch is copied and deleted in one transaction, so a crash never
+    loses or duplicates rows. Returns the number of rows archived.
+    """
+    if days <= 0:
+        return 0
+    cutoff = datetime.now() - timedelta(days=days)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    _attach_archive(cursor)
+    conn.commit()
+    
+    moved = 0
+    while True:
+        with conn:
+            ids = [row[0] for row in cursor.execute(
+                'SELECT job_id FROM main.analysis_results WHERE timestamp < ? ORDER BY timestamp LIMIT ?',
+                (cutoff, batch))]
+            if not ids:
+                break
+            marks = ','.join('?' * len(ids))
+            cursor.execute(f'INSERT OR REPLACE INTO archive.analysis_results '
+                           f'SELECT * FROM main.analysis_results WHERE job_id IN ({marks})', ids)
+            cursor.execute(f'DELETE FROM main.analysis_results WHERE job_id IN ({marks})', ids)
+        moved += len(ids)
+    conn.close()
+    return moved
+
+def prune_job_profiles(days: int = PROFILE_RETENTION_DAYS):
+    """Deletes job profiles older than `days`. Returns the number deleted."""
+    if days <= 0:
+        return 0
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM job_profiles WHERE timestamp < ?', (datetime.now() - timedelta(days=days),))
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+def incremental_vacuum(pages: int = VACUUM_PAGES):
+    """Returns up to `pages` free pages to the filesystem. Returns the free pages left."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    # executescript steps the pragma to completion (execute frees a single page)
+    cursor.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+    free = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.close()
+    return free
+
+def enable_incremental_vacuum():
+    """
+    Switches an existing database to incremental auto-vacuum
+
+    This needs one full VACUUM, which rewrites the file and blocks writers
+    meanwhile, so run it with the server stopped.
+    Returns the file size in bytes before and after.
+    """
+    before = os.path.getsize(DB_PATH)
+    # VACUUM cannot run inside a transaction
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    conn.close()
+    return before, os.path.getsize(DB_PATH)
+
+def run_maintenance():
+    """One retention pass: archive old results, prune profiles, shrink the file"""
+    archived = archive_old_results()
+    pruned = prune_job_profiles()
+    free = incremental_vacuum()
+    if archived or pruned:
+        print(f"🗄️ Archived {archived} results, pruned {pruned} profiles ({free} free pages left)")
+    return {'archived': archived, 'profiles_pruned': pruned, 'free_pages': free}
+
+def start_maintenance(interval: int = MAINTENANCE_INTERVAL) -> threading.Event:
+    """
+    Run maintenance now and then every `interval` seconds in a daemon thread
+    
+    Returns:
+        Event that stops the thread when set
+    """
+    stop = threading.Event()
+    
+    def loop():
+        while True:
+            try:
+                run_maintenance()
+            except Exception as e:
+                print(f"⚠️ Database maintenance failed: {e}")
+            if stop.wait(interval):
+                return
+    
+    threading.Thread(target=loop, name="db-maintenance", daemon=True).start()
+    return stop
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VerifAI results database maintenance")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Convert an existing database to incremental auto-vacuum (stop the server first)")
+    parser.add_argument("--maintain", action="store_true", help="Run one retention pass now")
+    args = parser.parse_args()
+    if args.enable_incremental_vacuum:
+        before, after = enable_incremental_vacuum()
+        print(f"✅ Incremental auto-vacuum enabled ({before / 1e6:.1f} MB -> {after / 1e6:.1f} MB)")
+    if args.maintain:
+        print(run_maintenance())
+    if not (args.enable_incremental_vacuum or args.maintain):
+        parser.print_help()
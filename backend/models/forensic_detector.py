@@ -3,37 +3,56 @@ Enhanced forensic detector with multiple artifact detection methods
 """
 import numpy as np
 import cv2
-from typing import Dict, List
+from typing import Dict, List, Optional
+from utils.fft_backend import (hermitian_weights, high_pass_weights, rfft2_magnitude,
+                                spectrum_correlation, spectrum_sum)
+from utils.frame_views import as_views
+from utils.parallel import parallel_map
+from utils.tracing import traced
 
 class ForensicDetector:
     """Comprehensive forensic analysis for AI-generated video detection"""
     
-    def detect_all_artifacts(self, frame: np.ndarray) -> Dict:
+    # Frequency statistics are stable well below 4K; analyse at most 720p
+    max_side = 720
+    
+    # Aggregation weights per check (frequency, gan, diffusion, compression)
+    METHOD_WEIGHTS = {'frequency': 0.35, 'gan': 0.35, 'diffusion': 0.20, 'compression': 0.10}
+    
+    def detect_all_artifacts(self, frame: np.ndarray, methods: Optional[List[str]] = None) -> Dict:
         """
         Run all forensic checks on a frame
         
         Args:
-            frame: BGR numpy array
+            frame: BGR numpy array or FrameViews
+            methods: Subset of METHOD_WEIGHTS to run (all when omitted)
         
         Returns:
             Comprehensive forensic analysis results
         """
-        # Run all detection methods
-        fft_result = self.detect_artifacts(frame)
-        gan_result = self.detect_gan_artifacts(frame)
-        diffusion_result = self.detect_diffusion_artifacts(frame)
-        compression_result = self.detect_compression_anomalies(frame)
+        # Share cached gray/float views between the detection methods
+        frame = as_views(frame)
+        methods = [m for m in self.METHOD_WEIGHTS if methods is None or m in methods]
+        if not methods:
+            return {'confidence': 0.0, 'max_confidence': 0.0, 'dominant_artifact': None,
+                    'breakdown': {}, 'details': {}}
+        
+        # Run the selected detection methods
+        results = {}
+        if 'frequency' in methods:
+            results['frequency'] = {'confidence': self.detect_artifacts(frame)}
+        if 'gan' in methods:
+            results['gan'] = self.detect_gan_artifacts(frame)
+        if 'diffusion' in methods:
+            results['diffusion'] = self.detect_diffusion_artifacts(frame)
+        if 'compression' in methods:
+            results['compression'] = self.detect_compression_anomalies(frame)
         
         # Collect scores
-        scores = [
-            fft_result, 
-            gan_result['confidence'], 
-            diffusion_result['confidence'], 
-            compression_result['confidence']
-        ]
+        scores = [results[m]['confidence'] for m in methods]
 
         # Aggregate results with weighted importance
-        weights = [0.35, 0.35, 0.20, 0.10] # frequency, gan, diffusion, compression
+        weights = [self.METHOD_WEIGHTS[m] for m in methods]
         avg_confidence = np.average(scores, weights=weights)
         max_confidence = np.max(scores)
         
@@ -42,52 +61,47 @@ class ForensicDetector:
             avg_confidence *= 0.5 # More aggressive penalty
         
         # Determine dominant artifact type
-        artifact_types = ['frequency', 'gan', 'diffusion', 'compression']
-        dominant_type = artifact_types[np.argmax(scores)]
+        dominant_type = methods[int(np.argmax(scores))]
         
         return {
             'confidence': float(avg_confidence),
             'max_confidence': float(max_confidence),
             'dominant_artifact': dominant_type,
-            'breakdown': {
-                'frequency': float(fft_result),
-                'gan': float(gan_result['confidence']),
-                'diffusion': float(diffusion_result['confidence']),
-                'compression': float(compression_result['confidence'])
-            },
-            'details': {
-                'gan': gan_result.get('details', ''),
-                'diffusion': diffusion_result.get('details', ''),
-                'compression': compression_result.get('details', '')
-            }
+            'breakdown': {m: float(results[m]['confidence']) for m in methods},
+            'details': {m: results[m].get('details', '') for m in methods if m != 'frequency'}
         }
     
+    def detect_frames(self, frames: List[np.ndarray], methods: Optional[List[str]] = None) -> List[Dict]:
+        """
+        detect_all_artifacts for every frame, spread over the frame pool
+        
+        Returns:
+            One result per frame, in the order of `frames`
+        """
+        return parallel_map(lambda frame: self.detect_all_artifacts(frame, methods=methods), frames)
+    
+    @traced("forensic.frequency")
     def detect_artifacts(self, frame: np.ndarray) -> float:
         """
         FFT-based frequency domain analysis (existing method)
         
         Args:
-            frame: BGR numpy array
+            frame: BGR numpy array or FrameViews
         
         Returns:
             Confidence score (0-1)
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255.0
-        f_transform = np.fft.fft2(gray)
-        f_shift = np.fft.fftshift(f_transform)
-        magnitude_spectrum = np.abs(f_shift)
+        gray = as_views(frame).gray_float(self.max_side)
+        # Half spectrum of the real frame; sums over the full spectrum are
+        # recovered with per-shape weights (see utils/fft_backend.py)
+        magnitude_spectrum = rfft2_magnitude(gray)
         
         rows, cols = gray.shape
-        crow, ccol = rows//2, cols//2
         
-        # Mask the center (low frequencies)
-        mask = np.ones((rows, cols), np.uint8)
+        # Mask the center (low frequencies) of the shifted spectrum
         r = 30
-        mask[crow-r:crow+r, ccol-r:ccol+r] = 0
-        
-        f_shift_filtered = f_shift * mask
-        high_freq_mean = np.mean(np.abs(f_shift_filtered))
-        total_mean = np.mean(magnitude_spectrum)
+        high_freq_mean = spectrum_sum(magnitude_spectrum, high_pass_weights(rows, cols, r)) / gray.size
+        total_mean = spectrum_sum(magnitude_spectrum, hermitian_weights(rows, cols)) / gray.size
         
         # Calibration: Real videos with compression often have some high-freq noise.
         # AI content typically has much more pronounced, structured artifacts.
@@ -103,17 +117,18 @@ class ForensicDetector:
         
         return float(min(forensic_score, 1.0))
     
+    @traced("forensic.gan")
     def detect_gan_artifacts(self, frame: np.ndarray) -> Dict:
         """
         Detect GAN-specific artifacts (block patterns, color banding)
         
         Args:
-            frame: BGR numpy array
+            frame: BGR numpy array or FrameViews
         
         Returns:
             Dict with confidence and details
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255.0
+        gray = as_views(frame).gray_float(self.max_side)
         
         # GAN block size detection using DCT
         dct = cv2.dct(gray)
@@ -137,7 +152,7 @@ class ForensicDetector:
         block_artifact_score = min(np.mean(block_strengths) / 100.0, 1.0)
         
         # Color banding detection
-        color_frame = frame.astype(np.float32) / 255.0
+        color_frame = as_views(frame).bgr_float(self.max_side)
         color_variances = [np.var(color_frame[:,:,i]) for i in range(3)]
         variance_uniformity = np.std(color_variances)
         
@@ -160,32 +175,33 @@ class ForensicDetector:
             'details': details
         }
     
+    @traced("forensic.diffusion")
     def detect_diffusion_artifacts(self, frame: np.ndarray) -> Dict:
         """
         Detect artifacts characteristic of diffusion models
         
         Args:
-            frame: BGR numpy array
+            frame: BGR numpy array or FrameViews
         
         Returns:
             Dict with confidence and details
         """
-        frame_float = frame.astype(np.float32) / 255.0
+        frame_float = as_views(frame).bgr_float(self.max_side)
         
-        # Compute FFT for each channel
+        # Compute FFT for each channel (half spectra, weighted back to full-spectrum statistics)
         fft_channels = []
         low_freq_dominance = []
+        h, w = frame_float.shape[:2]
+        weights = hermitian_weights(h, w)
         
         for i in range(3):
-            fft = np.fft.fft2(frame_float[:,:,i])
-            mag = np.abs(fft)
+            mag = rfft2_magnitude(frame_float[:,:,i])
             fft_channels.append(mag)
             
-            # Check low frequency dominance
-            h, w = mag.shape
+            # Check low frequency dominance (w//4 columns all lie in the half spectrum)
             center_region = mag[:h//4, :w//4]
             low_freq = np.mean(center_region)
-            total_freq = np.mean(mag)
+            total_freq = spectrum_sum(mag, weights) / (h * w)
             
             if total_freq > 0:
                 low_freq_dominance.append(low_freq / total_freq)
@@ -195,8 +211,8 @@ class ForensicDetector:
         
         # Channel misalignment (diffusion artifact)
         if len(fft_channels) == 3:
-            corr_rg = np.corrcoef(fft_channels[0].flatten(), fft_channels[1].flatten())[0,1]
-            corr_rb = np.corrcoef(fft_channels[0].flatten(), fft_channels[2].flatten())[0,1]
+            corr_rg = spectrum_correlation(fft_channels[0], fft_channels[1], weights, h * w)
+            corr_rb = spectrum_correlation(fft_channels[0], fft_channels[2], weights, h * w)
             avg_corr = (abs(corr_rg) + abs(corr_rb)) / 2
             
             # Lower correlation = more likely diffusion artifact
@@ -215,18 +231,19 @@ class ForensicDetector:
             'details': details
         }
     
+    @traced("forensic.compression")
     def detect_compression_anomalies(self, frame: np.ndarray) -> Dict:
         """
         Detect unusual compression patterns
         
         Args:
-            frame: BGR numpy array
+            frame: BGR numpy array or FrameViews
         
         Returns:
             Dict with confidence and details
         """
         # Convert to YCbCr for compression analysis
-        yuv = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb)
+        yuv = as_views(frame).ycrcb(self.max_side)
         
         # Analyze Cb and Cr channels (color components)
         cb_variance = np.var(yuv[:,:,1])
@@ -2,18 +2,21 @@
 Complete metadata detector with EXIF and video codec analysis
 """
 import os
-from typing import Dict
+from typing import Dict, Optional
 from datetime import datetime
+from utils.container_probe import MediaInfo, ProbeResult, probe_container
+from utils.tracing import traced
 
 class MetadataDetector:
     """Detect metadata inconsistencies and AI generation markers"""
     
-    def check_metadata(self, video_path: str) -> Dict:
+    def check_metadata(self, video_path: str, probe: Optional[ProbeResult] = None) -> Dict:
         """
         Analyze video metadata for authenticity markers
         
         Args:
             video_path: Path to video file
+            probe: Container probe of the file (probed here, from cache, if omitted)
         
         Returns:
             Dict with confidence score and details
@@ -43,8 +46,11 @@ class MetadataDetector:
         except:
             pass
         
+        # The EXIF check reads the header-only probe of the file
+        probe = probe or probe_container(video_path)
+        
         # 2. Try to extract EXIF data
-        exif_score = self._check_exif(video_path)
+        exif_score = self._check_exif(probe)
         anomaly_score += exif_score
         if exif_score > 0.1: # Only mention if significant
             details.append(f"EXIF anomalies detected")
@@ -72,50 +78,50 @@ class MetadataDetector:
             'file_size': file_size
         }
     
-    def _check_exif(self, video_path: str) -> float:
+    @traced("metadata.exif")
+    def _check_exif(self, probe: ProbeResult) -> float:
         """
         Check EXIF data for anomalies
         
         Returns:
             Anomaly score (0-1)
         """
-        try:
-            import exifread
-            
-            with open(video_path, 'rb') as f:
-                tags = exifread.process_file(f, details=False)
-            
-            # AI-generated videos often lack camera-specific EXIF data
-            camera_tags = ['Image Make', 'Image Model', 'EXIF DateTimeOriginal']
-            found_camera_tags = sum(1 for tag in camera_tags if tag in tags)
-            
-            if found_camera_tags == 0:
-                # No camera metadata = slightly suspicious but very common
-                return 0.05 # Reduced from 0.1
-            elif found_camera_tags < len(camera_tags):
-                # Partial metadata = very low suspicion
-                return 0.02 # Reduced from 0.05
-            else:
-                # Full metadata = likely real
-                return 0.0
-                
-        except ImportError:
+        if probe.exif_tags is None:
             # exifread not installed, skip this check
             return 0.0
-        except Exception:
+        if probe.exif_error:
             # Error reading EXIF = slightly suspicious
             return 0.1 # Reduced from 0.2
+        
+        # AI-generated videos often lack camera-specific EXIF data
+        camera_tags = ['Image Make', 'Image Model', 'EXIF DateTimeOriginal']
+        found_camera_tags = sum(1 for tag in camera_tags if tag in probe.exif_tags)
+        
+        if found_camera_tags == 0:
+            # No camera metadata = slightly suspicious but very common
+            return 0.05 # Reduced from 0.1
+        elif found_camera_tags < len(camera_tags):
+            # Partial metadata = very low suspicion
+            return 0.02 # Reduced from 0.05
+        else:
+            # Full metadata = likely real
+            return 0.0
     
+    @traced("metadata.codec")
     def _check_codec(self, video_path: str) -> float:
         """
         Check video codec and encoding parameters
         
+        The encoder is the video track's encoding library as MediaInfo reads
+        it from the stream, not the container's tags (see ProbeResult.encoder).
+        
         Returns:
             Anomaly score (0-1)
         """
+        if MediaInfo is None:
+            # pymediainfo not installed, skip
+            return 0.0
         try:
-            from pymediainfo import MediaInfo
-            
             media_info = MediaInfo.parse(video_path)
             
             for track in media_info.tracks:
@@ -136,9 +142,6 @@ class MetadataDetector:
                     
             return 0.0
             
-        except ImportError:
-            # pymediainfo not installed, skip
-            return 0.0
         except Exception:
             # Error parsing = minimal suspicion
             return 0.05 # Reduced from 0.15
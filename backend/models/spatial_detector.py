@@ -3,8 +3,14 @@ from transformers import AutoImageProcessor, SiglipForImageClassification
 from PIL import Image
 import numpy as np
 import cv2
+from utils.frame_similarity import gated_scores
+from utils.frame_views import as_views
+from utils.tracing import traced
 
 class SpatialDetector:
+    # The SigLIP processor resizes to 224px, so larger inputs only cost time
+    max_side = 448
+
     def __init__(self):
         self.model_name = "prithivMLmods/deepfake-detector-model-v1"
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -12,9 +18,10 @@ class SpatialDetector:
         self.model = SiglipForImageClassification.from_pretrained(self.model_name).to(self.device)
         self.model.eval()
 
+    @traced("spatial.detect")
     def detect(self, frame_array):
-        # Convert BGR to RGB
-        frame_rgb = cv2.cvtColor(frame_array, cv2.COLOR_BGR2RGB)
+        # Convert BGR to RGB (cached on the shared frame views)
+        frame_rgb = as_views(frame_array).rgb(self.max_side)
         image = Image.fromarray(frame_rgb)
         inputs = self.processor(images=image, return_tensors="pt").to(self.device)
         
@@ -22,4 +29,22 @@ class SpatialDetector:
             outputs = self.model(**inputs)
             probs = torch.nn.functional.softmax(outputs.logits, dim=1).squeeze()
         
-        return float(probs[0].cpu()) # Fake confidence
\ No newline at end of file
+        return float(probs[0].cpu()) # Fake confidence
+
+    @traced("spatial.detect_batch")
+    def detect_batch(self, frames):
+        """Fake confidence of each frame, from one forward pass over all of them"""
+        if not frames:
+            return []
+        images = [Image.fromarray(as_views(frame).rgb(self.max_side)) for frame in frames]
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            probs = torch.nn.functional.softmax(outputs.logits, dim=1)
+        
+        return [float(p) for p in probs[:, 0].cpu()]
+
+    def detect_frames(self, frames, max_inferences=10, stop=None):
+        """Score a frame sequence, skipping inference on near-identical consecutive frames"""
+        return gated_scores(frames, self.detect, max_inferences=max_inferences, stop=stop)
@@ -1,34 +1,119 @@
 """
 Enhanced temporal analyzer with multiple detection methods
 """
+import threading
 import cv2
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
+from utils.frame_views import as_views
+from utils.parallel import parallel_chunks, parallel_map
+from utils.tracing import traced
+
+# Haar classifiers are loaded once per thread; one instance is not shared between threads
+_cascades = threading.local()
+
+def _cascade(name: str) -> cv2.CascadeClassifier:
+    classifier = getattr(_cascades, name, None)
+    if classifier is None:
+        classifier = cv2.CascadeClassifier(cv2.data.haarcascades + f'haarcascade_{name}.xml')
+        setattr(_cascades, name, classifier)
+    return classifier
 
 class TemporalAnalyzer:
     """Temporal consistency analysis for AI-generated video detection"""
     
-    def detect_all_temporal(self, frames: List[np.ndarray]) -> Dict:
+    # Farneback flow is computed on small frames and rescaled to source pixels
+    flow_max_side = 480
+    # Haar cascades only need enough pixels to find faces and eyes
+    detection_max_side = 640
+    
+    METHODS = ('motion', 'lipsync', 'blink')
+    # Frames inspected by the Haar-based checks
+    lipsync_frames = 30
+    blink_frames = 60
+    # Fewest frames the blink check scores (it returns 0 below that)
+    blink_min_frames = 10
+    
+    @staticmethod
+    def _gray_stack(frames: List[np.ndarray], max_side: int) -> np.ndarray:
+        """
+        Gray views of `frames` converted straight into one (N, H, W) uint8 array
+        
+        Frames of a different size (never the case for one decoded video)
+        fall back to a list of arrays, which indexes the same way.
+        """
+        views = [as_views(frame) for frame in frames]
+        if not views:
+            return np.empty((0, 0, 0), dtype=np.uint8)
+        # Resizing to max_side is the expensive part; frames are resized in parallel
+        shapes = set(parallel_map(lambda view: view.bgr(max_side).shape[:2], views))
+        if len(shapes) != 1:
+            return [view.gray(max_side) for view in views]
+        stack = np.empty((len(views),) + shapes.pop(), dtype=np.uint8)
+        for i, view in enumerate(views):
+            view.gray_into(stack[i], max_side)
+        return stack
+    
+    @staticmethod
+    def _flow_magnitudes(pairs) -> List[float]:
+        """
+        Mean Farneback flow magnitude of each (gray stack, index, scale) pair
+        
+        Frame i is compared with frame i + 1; magnitudes are scaled to source
+        pixels. Each chunk (one per worker thread) allocates its own flow and
+        magnitude buffers and reuses them for every pair.
+        """
+        flow = magnitude = None
+        results = []
+        for gray, i, scale in pairs:
+            if flow is None or flow.shape[:2] != gray[i].shape:
+                flow = np.empty(gray[i].shape + (2,), dtype=np.float32)
+                magnitude = np.empty(gray[i].shape, dtype=np.float32)
+            cv2.calcOpticalFlowFarneback(
+                gray[i], gray[i + 1], flow, 0.5, 3, 15, 3, 5, 1.2, 0
+            )
+            cv2.magnitude(flow[..., 0], flow[..., 1], magnitude=magnitude)
+            results.append(cv2.mean(magnitude)[0] * scale)
+        return results
+    
+    def detect_all_temporal(self, frames: List[np.ndarray],
+                            runs: Optional[List[List[np.ndarray]]] = None,
+                            methods: Optional[List[str]] = None,
+                            flow_max_side: Optional[int] = None) -> Dict:
         """
         Run all temporal detection methods
         
         Args:
-            frames: List of BGR frame arrays
+            frames: List of BGR frame arrays (or FrameViews)
+            runs: Optional contiguous sub-sequences of `frames`; optical flow
+                is only computed between neighbours inside the same run
+            methods: Subset of METHODS to run (all when omitted)
+            flow_max_side: Optical flow resolution (defaults to flow_max_side)
         
         Returns:
-            Comprehensive temporal analysis results
+            Comprehensive temporal analysis results; `completed` lists the
+            methods that had enough frames (or faces) to produce a score
         """
         if not frames or len(frames) < 2:
             return {
                 'confidence': 0.0,
                 'has_anomaly': False,
+                'completed': [],
                 'details': 'Insufficient frames for temporal analysis'
             }
         
-        # Run all detection methods
-        motion_result = self.detect_motion_smoothness(frames)
-        lipsync_result = self.detect_lip_sync_errors(frames)
-        blink_result = self.detect_blink_anomalies(frames)
+        # Run the selected detection methods (a skipped one scores 0 and is left out below)
+        methods = self.METHODS if methods is None else methods
+        motion_result = (self.detect_motion_smoothness(frames, runs=runs, max_side=flow_max_side)
+                         if 'motion' in methods else {})
+        # Lip-sync and blink checks share one stack of detection-resolution gray frames
+        detection_gray = None
+        if 'lipsync' in methods or 'blink' in methods:
+            count = max(self.lipsync_frames if 'lipsync' in methods else 0,
+                        self.blink_frames if 'blink' in methods else 0)
+            detection_gray = self._gray_stack(frames[:count], self.detection_max_side)
+        lipsync_result = self.detect_lip_sync_errors(frames, gray=detection_gray) if 'lipsync' in methods else {}
+        blink_result = self.detect_blink_anomalies(frames, gray=detection_gray) if 'blink' in methods else {}
         
         # Aggregate scores
         scores = [
@@ -48,10 +133,15 @@ class TemporalAnalyzer:
         if blink_result.get('has_blink_anomaly', False):
             anomalies.append('blink_pattern')
         
+        # Methods that stopped early (too few frames or faces) carry no raw signal
+        signals = {'motion': (motion_result, 'flow_magnitudes'), 'lipsync': (lipsync_result, 'mouth_changes'),
+                   'blink': (blink_result, 'blink_sequence')}
+        
         return {
             'confidence': float(avg_confidence),
             'has_anomaly': len(anomalies) > 0,
             'anomaly_types': anomalies,
+            'completed': [m for m in self.METHODS if signals[m][1] in signals[m][0]],
             'breakdown': {
                 'motion_smoothness': float(motion_result.get('confidence', 0.0)),
                 'lip_sync': float(lipsync_result.get('confidence', 0.0)),
@@ -61,15 +151,26 @@ class TemporalAnalyzer:
                 'motion': motion_result.get('description', ''),
                 'lipsync': lipsync_result.get('description', ''),
                 'blink': blink_result.get('description', '')
+            },
+            # Raw per-frame signals, kept for offline re-scoring
+            'features': {
+                'flow': motion_result.get('flow_magnitudes', []),
+                'mouth': lipsync_result.get('mouth_changes', []),
+                'blink': blink_result.get('blink_sequence', [])
             }
         }
     
-    def detect_motion_smoothness(self, frames: List[np.ndarray]) -> Dict:
+    @traced("temporal.motion_flow")
+    def detect_motion_smoothness(self, frames: List[np.ndarray],
+                                 runs: Optional[List[List[np.ndarray]]] = None,
+                                 max_side: Optional[int] = None) -> Dict:
         """
         Detect unnaturally smooth motion (characteristic of AI)
         
         Args:
-            frames: List of BGR frames
+            frames: List of BGR frames (arrays or FrameViews)
+            runs: Optional contiguous runs (flow never spans two runs)
+            max_side: Optical flow resolution (defaults to flow_max_side)
         
         Returns:
             Motion smoothness analysis results
@@ -82,19 +183,18 @@ class TemporalAnalyzer:
             }
         
         # Compute optical flow between frames
-        flow_magnitudes = []
-        prev_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        
-        for frame in frames[1:]:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            flow = cv2.calcOpticalFlowFarneback(
-                prev_gray, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0
-            )
-            magnitude = np.sqrt(flow[..., 0]**2 + flow[..., 1]**2).mean()
-            flow_magnitudes.append(magnitude)
-            prev_gray = gray
-        
-        if not flow_magnitudes:
+        max_side = max_side or self.flow_max_side
+        runs = [run for run in (runs or [frames]) if len(run) >= 2]
+        pairs = []
+        for run in runs:
+            gray = self._gray_stack(run, max_side)
+            # Keep magnitudes in source pixels so thresholds don't depend on the view size
+            scale = as_views(run[0]).scale_to_source(max_side)
+            pairs.extend((gray, i, scale) for i in range(len(run) - 1))
+        # Every neighbouring pair is independent; pairs are spread over the frame pool in order
+        flow_magnitudes = np.array(parallel_chunks(self._flow_magnitudes, pairs), dtype=np.float64)
+        
+        if len(flow_magnitudes) == 0:
             return {
                 'has_smooth_motion_anomaly': False,
                 'confidence': 0.0,
@@ -105,10 +205,26 @@ class TemporalAnalyzer:
         # AI video is too smooth (low variance)
         # Increased smoothing factor for variance to reduce sensitivity to minor stability
         motion_variance = np.var(flow_magnitudes)
+        activity_level = np.mean(flow_magnitudes)
+        motion_consistency = self.motion_consistency(motion_variance, activity_level)
+        
+        return {
+            'has_smooth_motion_anomaly': motion_consistency > 0.75,
+            'confidence': float(motion_consistency),
+            'anomaly_frames': [],
+            'flow_magnitudes': flow_magnitudes.tolist(),
+            'description': f'Motion smoothness: {motion_consistency:.2f} (Activity: {activity_level:.3f})'
+        }
+    
+    @staticmethod
+    def motion_consistency(motion_variance: float, activity_level: float) -> float:
+        """
+        Motion smoothness score from the variance and mean of flow magnitudes
         
+        Shared with the streaming analyzer, which keeps both as rolling statistics.
+        """
         # Calibration: If motion is extremely low (static camera/webcam), 
         # reduce the AI confidence score as real static videos look "smooth".
-        activity_level = np.mean(flow_magnitudes)
         # Increased activity floor to 0.8 to be safer
         if activity_level < 0.8: 
             # For static scenes, we can't reliably use motion smoothness as an AI indicator
@@ -119,43 +235,79 @@ class TemporalAnalyzer:
             motion_consistency = 1.0 - (motion_variance / (motion_variance + 25))
             
         # Ensure consistency is within bounds
-        motion_consistency = max(0.0, min(1.0, motion_consistency))
+        return max(0.0, min(1.0, motion_consistency))
+    
+    @staticmethod
+    def mouth_anomalies(mouth_changes: np.ndarray) -> List[int]:
+        """Transitions whose mouth change is more than 2 std from the mean (sudden jumps or flatness)"""
+        mean_change = np.mean(mouth_changes)
+        std_change = np.std(mouth_changes)
+        return np.flatnonzero(np.abs(mouth_changes - mean_change) > 2 * std_change).tolist()
+    
+    @staticmethod
+    def blink_score(blink_changes: int, frame_count: int):
+        """
+        Blink anomaly score from the number of eye open/closed transitions
         
-        return {
-            'has_smooth_motion_anomaly': motion_consistency > 0.75,
-            'confidence': float(motion_consistency),
-            'anomaly_frames': [],
-            'description': f'Motion smoothness: {motion_consistency:.2f} (Activity: {activity_level:.3f})'
-        }
+        Returns:
+            (confidence, has_anomaly, expected_blinks)
+        """
+        # Normal: 1-3 blinks per 30 frames (at 30fps = 1 second)
+        # Calculate expected blinks
+        expected_blinks = frame_count / 30 * 2  # ~2 blinks per second
+        
+        # Ratio of actual vs expected
+        if expected_blinks > 0:
+            blink_ratio = blink_changes / expected_blinks
+        else:
+            blink_ratio = 0.0
+        
+        # Abnormal if too few or too many blinks
+        if blink_ratio < 0.2: # Reduced from 0.3
+            # Too few blinks (characteristic of AI)
+            confidence = (1.0 - (blink_ratio / 0.2)) * 0.8 # Capped at 0.8
+            has_anomaly = True
+        elif blink_ratio > 4.0: # Increased from 3.0
+            # Too many blinks (also suspicious)
+            confidence = min((blink_ratio - 4.0) / 5.0, 0.7) # Capped at 0.7
+            has_anomaly = True
+        else:
+            confidence = 0.0
+            has_anomaly = False
+        return confidence, has_anomaly, expected_blinks
     
-    def detect_lip_sync_errors(self, frames: List[np.ndarray]) -> Dict:
+    @traced("temporal.lip_sync_haar")
+    def detect_lip_sync_errors(self, frames: List[np.ndarray], gray: Optional[np.ndarray] = None) -> Dict:
         """
         Detect lip-sync errors between video frames
         
         Args:
-            frames: List of BGR frames
+            frames: List of BGR frames (arrays or FrameViews)
+            gray: Optional (N, H, W) gray stack of `frames` at detection_max_side
         
         Returns:
             Lip-sync analysis results
         """
+        count = min(len(frames), self.lipsync_frames)  # Analyze first 30 frames
+        if gray is None:
+            gray = self._gray_stack(frames[:count], self.detection_max_side)
+        # Face detection runs per frame on the frame pool
+        detections = parallel_map(lambda image: _cascade('frontalface_default').detectMultiScale(image, 1.1, 5),
+                                  [gray[i] for i in range(count)])
+        
         # Extract mouth region from frames
-        mouth_regions = []
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-        
-        for frame in frames[:min(len(frames), 30)]:  # Analyze first 30 frames
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 5)
-            
+        mouth_regions = np.empty((count, 64, 64, 3), dtype=np.uint8)
+        found = 0
+        for i, faces in enumerate(detections):
             if len(faces) > 0:
                 x, y, w, h = faces[0]
                 # Extract mouth region (lower half of face)
-                mouth = frame[y+h//2:y+h, x:x+w]
+                mouth = as_views(frames[i]).bgr(self.detection_max_side)[y+h//2:y+h, x:x+w]
                 if mouth.size > 0:
-                    mouth_regions.append(cv2.resize(mouth, (64, 64)))
+                    cv2.resize(mouth, (64, 64), dst=mouth_regions[found])
+                    found += 1
         
-        if len(mouth_regions) < 5:
+        if found < 5:
             return {
                 'has_lip_sync_error': False,
                 'confidence': 0.0,
@@ -163,29 +315,12 @@ class TemporalAnalyzer:
                 'description': 'Insufficient face detections for lip-sync analysis'
             }
         
-        # Analyze mouth movement consistency
-        mouth_changes = []
-        for i in range(len(mouth_regions) - 1):
-            diff = cv2.absdiff(mouth_regions[i], mouth_regions[i+1])
-            change_amount = np.mean(diff)
-            mouth_changes.append(change_amount)
-        
-        if not mouth_changes:
-            return {
-                'has_lip_sync_error': False,
-                'confidence': 0.0,
-                'anomaly_frames': [],
-                'description': 'No mouth movements detected'
-            }
+        # Analyze mouth movement consistency: mean absolute change between consecutive regions
+        regions = mouth_regions[:found].astype(np.int16)
+        mouth_changes = np.abs(regions[1:] - regions[:-1]).mean(axis=(1, 2, 3))
         
         # Detect anomalies (sudden jumps or flatness)
-        mean_change = np.mean(mouth_changes)
-        std_change = np.std(mouth_changes)
-        
-        anomaly_frames = []
-        for i, change in enumerate(mouth_changes):
-            if abs(change - mean_change) > 2 * std_change:
-                anomaly_frames.append(i)
+        anomaly_frames = self.mouth_anomalies(mouth_changes)
         
         confidence = min(len(anomaly_frames) / max(len(mouth_changes), 1), 1.0)
         
@@ -193,30 +328,31 @@ class TemporalAnalyzer:
             'has_lip_sync_error': confidence > 0.3,
             'confidence': float(confidence),
             'anomaly_frames': anomaly_frames,
+            'mouth_changes': mouth_changes.tolist(),
             'description': f'Lip-sync inconsistency in {len(anomaly_frames)}/{len(mouth_changes)} transitions'
         }
     
-    def detect_blink_anomalies(self, frames: List[np.ndarray]) -> Dict:
+    @traced("temporal.blink_haar")
+    def detect_blink_anomalies(self, frames: List[np.ndarray], gray: Optional[np.ndarray] = None) -> Dict:
         """
         Detect unnatural blink patterns (AI often has irregular blinking)
         
         Args:
-            frames: List of BGR frames
+            frames: List of BGR frames (arrays or FrameViews)
+            gray: Optional (N, H, W) gray stack of `frames` at detection_max_side
         
         Returns:
             Blink pattern analysis results
         """
-        eye_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_eye.xml'
-        )
-        
-        blink_sequence = []
-        for frame in frames[:min(len(frames), 60)]:  # Analyze first 60 frames
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            eyes = eye_cascade.detectMultiScale(gray, 1.1, 5)
-            blink_sequence.append(len(eyes) >= 2)  # True if both eyes detected
-        
-        if len(blink_sequence) < 10:
+        count = min(len(frames), self.blink_frames)  # Analyze first 60 frames
+        if gray is None:
+            gray = self._gray_stack(frames[:count], self.detection_max_side)
+        # True if both eyes detected; frames are searched in parallel
+        blink_sequence = np.array(parallel_map(
+            lambda image: len(_cascade('eye').detectMultiScale(image, 1.1, 5)) >= 2,
+            [gray[i] for i in range(count)]), dtype=bool)
+        
+        if len(blink_sequence) < self.blink_min_frames:
             return {
                 'has_blink_anomaly': False,
                 'confidence': 0.0,
@@ -225,35 +361,13 @@ class TemporalAnalyzer:
             }
         
         # Count blink transitions (eyes disappearing/reappearing)
-        blink_changes = sum(1 for i in range(len(blink_sequence)-1) 
-                           if blink_sequence[i] != blink_sequence[i+1])
-        
-        # Normal: 1-3 blinks per 30 frames (at 30fps = 1 second)
-        # Calculate expected blinks
-        expected_blinks = len(blink_sequence) / 30 * 2  # ~2 blinks per second
-        
-        # Ratio of actual vs expected
-        if expected_blinks > 0:
-            blink_ratio = blink_changes / expected_blinks
-        else:
-            blink_ratio = 0.0
-        
-        # Abnormal if too few or too many blinks
-        if blink_ratio < 0.2: # Reduced from 0.3
-            # Too few blinks (characteristic of AI)
-            confidence = (1.0 - (blink_ratio / 0.2)) * 0.8 # Capped at 0.8
-            has_anomaly = True
-        elif blink_ratio > 4.0: # Increased from 3.0
-            # Too many blinks (also suspicious)
-            confidence = min((blink_ratio - 4.0) / 5.0, 0.7) # Capped at 0.7
-            has_anomaly = True
-        else:
-            confidence = 0.0
-            has_anomaly = False
+        blink_changes = int(np.count_nonzero(blink_sequence[1:] != blink_sequence[:-1]))
+        confidence, has_anomaly, expected_blinks = self.blink_score(blink_changes, len(blink_sequence))
         
         return {
             'has_blink_anomaly': has_anomaly,
             'confidence': float(confidence),
             'anomaly_frames': [],
+            'blink_sequence': blink_sequence.tolist(),
             'description': f'Blink frequency: {blink_changes} (expected ~{expected_blinks:.1f})'
         }
\ No newline at end of file
@@ -1,10 +1,15 @@
 import os
+import json
 import time
-import shutil
 import uuid
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import TimeoutError as FuturesTimeout
 import numpy as np
 import math
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -13,10 +18,28 @@ from models.spatial_detector import SpatialDetector
 from models.temporal_detector import TemporalAnalyzer
 from models.forensic_detector import ForensicDetector
 from models.metadata_detector import MetadataDetector
-from utils.video_processor import extract_frames
+from utils.video_processor import sample_frames_adaptive
+from utils.container_probe import probe_container
 from utils.reasoning_engine import generate_reasoning
 from utils.video_downloader import download_video
-from database import init_db, save_analysis_result
+from utils.tracing import start_trace, span, current_trace
+from utils import metrics
+from utils import ensemble
+from utils.ensemble import classify
+from utils import planner
+from utils.planner import make_plan, COSTS
+from utils.feature_store import FeatureStore
+from utils import engine_pool
+from utils.shared_frames import SharedFrameBuffer, reap_orphan_segments
+from utils.workspace import job_workspace, start_reaper, QuotaExceeded, WORKSPACE_IN_MEMORY
+from utils.scheduler import create_scheduler, PRIORITIES, DEFAULT_PRIORITY, STREAM, FETCH_MAX_JOBS
+from utils.singleflight import SingleFlight, normalize_video_url
+from utils import segments
+from utils.admission import create_admission, estimate_job_bytes, AdmissionRejected
+from utils.profiling import profile_job
+from utils import streaming
+from utils import frame_capture
+from database import init_db, save_analysis_result, save_job_profile, get_job_profile, start_maintenance
 
 app = FastAPI()
 
@@ -28,23 +51,99 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Use the route template so path parameters don't explode label cardinality
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        metrics.REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(status))
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+
+@app.on_event("startup")
+def start_engine_workers():
+    # Segments from a previous crashed run would otherwise stay in /dev/shm
+    reaped = reap_orphan_segments()
+    if reaped:
+        print(f"🧹 Removed {reaped} orphaned shared-memory frame buffers")
+    engine_pool.start_pool()
+    # Pre-forked workers publish their series so any of them can answer /metrics
+    app.state.metrics_flusher = metrics.start_flusher()
+    # Shared housekeeping runs in one process only (serve.py gives it to worker 0)
+    if os.environ.get("VERIFAI_HOUSEKEEPING", "1") != "0":
+        # Job workspaces left by crashed workers are removed in the background
+        app.state.workspace_reaper = start_reaper()
+        # Old results are archived and freed pages returned in the background
+        app.state.db_maintenance = start_maintenance()
+
+@app.on_event("shutdown")
+def stop_engine_workers():
+    engine_pool.shutdown_pool()
+    for name in ("workspace_reaper", "db_maintenance", "metrics_flusher"):
+        stop = getattr(app.state, name, None)
+        if stop is not None:
+            stop.set()
+
 @app.get("/")
 def read_root():
     return {"status": "Success", "message": "VerifAI Backend is Running"}
 
 # Initialize
 init_db()
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+
+# Analysis runs in worker threads so the event loop (and /metrics) stays responsive
+MAX_CONCURRENT_JOBS = int(os.environ.get("VERIFAI_MAX_JOBS", "2"))
+# Slots are shared between interactive and batch jobs, see utils/scheduler.py
+scheduler = create_scheduler(MAX_CONCURRENT_JOBS)
+# Downloads and upload spools take slots of their own, with the same priorities
+fetches = create_scheduler(FETCH_MAX_JOBS, stage='fetch')
+# Concurrent scans of the same video share one download and analysis
+url_flights = SingleFlight()
+# Jobs reserve their estimated peak memory before decoding, see utils/admission.py
+memory = create_admission()
 
 spatial_engine = SpatialDetector()
 temporal_engine = TemporalAnalyzer()
 forensic_engine = ForensicDetector()
 metadata_engine = MetadataDetector()
+feature_store = FeatureStore()
+
+# Frames are kept at the largest resolution any engine asks for
+FRAME_MAX_SIDE = max(SpatialDetector.max_side, ForensicDetector.max_side,
+                     TemporalAnalyzer.flow_max_side, TemporalAnalyzer.detection_max_side)
 
 class URLRequest(BaseModel):
     url: str
+    trace: bool = False  # Include per-stage timings in the report
+    budget_ms: Optional[float] = None  # Latency budget; work is cut to fit it
+    priority: Optional[str] = None  # "interactive" or "batch"
+    profile: bool = False  # Keep a sampling profile of the job (GET /api/profile/{job_id})
+
+class StreamRequest(BaseModel):
+    url: str  # HLS playlist, RTSP or other live stream URL
+    max_seconds: float = streaming.STREAM_MAX_SECONDS  # Stream time to analyse
+    update_seconds: float = streaming.STREAM_UPDATE_SECONDS  # Stream time between verdicts
+    window_seconds: float = streaming.STREAM_WINDOW_SECONDS  # Stream time the statistics cover
+
+class CapturedFrame(BaseModel):
+    data: str  # Base64 JPEG/WebP/PNG (a data: URL is accepted)
+    timestamp: Optional[float] = None  # Media time of the frame, in seconds
+
+class FramesRequest(BaseModel):
+    frames: List[CapturedFrame]  # Short bursts of consecutive frames from the page's player
+    source: Optional[str] = None  # Page or video URL, for the history
+    width: Optional[int] = None  # Size of the video in the page (defaults to the captured size)
+    height: Optional[int] = None
+    trace: bool = False
+    budget_ms: Optional[float] = None
+    priority: Optional[str] = None
+    profile: bool = False
 
 def safe_float(value):
     try:
@@ -55,8 +154,370 @@ def safe_float(value):
     except:
         return 0.0
 
+def job_origin(http_request: Request, priority: Optional[str] = None):
+    """Priority class and client id of a request (body/query value, then headers)."""
+    priority = priority or http_request.headers.get("X-Priority") or DEFAULT_PRIORITY
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(PRIORITIES)}")
+    client = http_request.headers.get("X-Client-Id") or (http_request.client.host if http_request.client else "anonymous")
+    return priority, client
+
+async def run_job(func, priority=DEFAULT_PRIORITY, client="anonymous"):
+    """Waits for a job slot of the request's class, then runs the blocking job in a worker thread."""
+    async with scheduler.slot(priority, client):
+        return await run_in_threadpool(func)
+
+def profiled(func, job_id, enabled=False):
+    """Wraps a blocking job so it is profiled when requested or when it runs slow (utils/profiling.py)."""
+    def run():
+        with profile_job(job_id, enabled=enabled, save=save_job_profile) as profiler:
+            report = func()
+        if profiler is not None and profiler.trigger:
+            report["profile_url"] = f"/api/profile/{job_id}"
+        return report
+    return run
+
+@contextmanager
+def cpu_engine_jobs(forensic_frames, runs, plan, temporal_methods):
+    """
+    Hands forensic/temporal work to the engine process pool, if one is running.
+
+    Frames are written once to shared memory; workers attach to them by name.
+    Yields a dict of futures (empty when the engines should run in-thread) and
+    always releases the shared segment on exit.
+    """
+    pool = engine_pool.get_pool()
+    unique, positions = [], {}
+    for view in list(forensic_frames) + [v for run in runs for v in run]:
+        if id(view) not in positions:
+            positions[id(view)] = len(unique)
+            unique.append(view)
+    if pool is None or not unique or len({v.shape for v in unique}) != 1:
+        yield {}
+        return
+
+    with SharedFrameBuffer([v.bgr() for v in unique], source_shape=unique[0].source_shape) as shared:
+        futures = {
+            'forensic': pool.submit(engine_pool.forensic_task, shared.handle,
+                                    [positions[id(v)] for v in forensic_frames], plan.forensic_methods),
+        }
+        if temporal_methods:
+            futures['temporal'] = pool.submit(engine_pool.temporal_task, shared.handle,
+                                              [[positions[id(v)] for v in run] for run in runs],
+                                              temporal_methods, plan.flow_max_side)
+        try:
+            yield futures
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+def wait_for(future, plan):
+    """Result of an engine-pool future, or None if the deadline passes first."""
+    try:
+        return future.result(timeout=max(plan.remaining(), 0.0) if plan.budgeted else None)
+    except FuturesTimeout:
+        return None
+
+@asynccontextmanager
+async def admitted(job_id, probe, plan, segment_count=0):
+    """
+    Reserves the job's estimated peak memory, keeping frames smaller or waiting when memory is short.
+
+    Entered before the job queues for a slot: the wait happens on the event loop,
+    holding neither a slot nor a worker thread, and does not count against the budget.
+    Yields the frame side to decode at; raises 503 if the job cannot be admitted.
+    """
+    try:
+        side, needed = memory.choose_side(lambda s: estimate_job_bytes(probe, plan, s, segment_count),
+                                          FRAME_MAX_SIDE)
+        await memory.acquire_async(job_id, needed)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if side != FRAME_MAX_SIDE:
+        print(f"📉 Downscaling frames to {side}px to fit the memory budget")
+    try:
+        yield side
+    finally:
+        memory.release(job_id, needed)
+
+@asynccontextmanager
+async def fetched(job_id, workspace, fetch, size_hint=None, priority=DEFAULT_PRIORITY, client="anonymous"):
+    """
+    Moves the video into the workspace and probes it in a fetch slot; yields (file_path, transfer_ms, probe).
+
+    With the workspace on tmpfs the file is RAM, so before fetching the job reserves
+    `size_hint` (or the whole quota when the size is unknown, as for downloads) and
+    keeps its actual size reserved until the workspace is removed.
+    Raises 503 if that memory cannot be reserved.
+    """
+    held = 0
+    try:
+        async with fetches.slot(priority, client):
+            if WORKSPACE_IN_MEMORY:
+                held = min(size_hint or workspace.quota_bytes, workspace.quota_bytes)
+                try:
+                    await memory.acquire_async(job_id, held)
+                except AdmissionRejected as e:
+                    held = 0
+                    raise HTTPException(status_code=503, detail=str(e))
+            transfer_start = time.perf_counter()
+            file_path = await run_in_threadpool(fetch, workspace)
+            transfer_ms = (time.perf_counter() - transfer_start) * 1000
+            # One header-only probe feeds the estimate, the sampler (fps, frame count) and the metadata engine
+            probe = await run_in_threadpool(probe_container, file_path)
+        if held:
+            # Give back what the file did not use
+            size = os.path.getsize(file_path)
+            if size < held:
+                memory.release(job_id, held - size)
+                held = size
+        yield file_path, transfer_ms, probe
+    finally:
+        if held:
+            memory.release(job_id, held)
+
+async def run_video_job(job_id, filename, start_time, fetch, budget_ms=None, priority=DEFAULT_PRIORITY,
+                        client="anonymous", profile=False, size_hint=None):
+    """
+    Fetches a video into the job's workspace, reserves its memory, then analyses it in a job slot.
+
+    `fetch(workspace)` downloads or spools the video and returns its path; it runs in
+    a fetch slot (see fetched). The probe and plan decide the memory estimate, so
+    both are made before queueing for the job slot.
+    """
+    # Private scratch directory, removed whatever happens
+    with job_workspace(job_id) as workspace:
+        async with fetched(job_id, workspace, fetch, size_hint, priority, client) as (file_path, transfer_ms, probe):
+            plan = make_plan(budget_ms, time.time())
+            segment_list = segments.split_segments(probe) if segments.wants_segments(probe, plan) else []
+            async with admitted(job_id, probe, plan, len(segment_list)) as frame_side:
+                def job():
+                    return run_analysis(job_id, filename, file_path, start_time, plan, probe, segment_list,
+                                        frame_side, transfer_ms=transfer_ms)
+                return await run_job(profiled(job, job_id, profile), priority, client)
+
+def run_analysis(job_id, filename, file_path, start_time, plan, probe, segment_list, frame_side,
+                 transfer_ms=None):
+    """
+    Runs every engine on a saved video file and stores the report.
+
+    The latency budget covers the analysis only: it starts here, after the video
+    was downloaded or spooled and the job waited for memory and a slot. That time
+    is reported apart (`waited_ms`, of which `transfer_ms` moving the video).
+    """
+    # Work was planned against the latency budget (a full analysis without one); its clock starts now
+    analysis_start = time.time()
+    plan.restart(analysis_start)
+    with planner.activate(plan):
+        report = analyze_with_plan(job_id, filename, file_path, start_time, plan, probe, segment_list, frame_side)
+    report["waited_ms"] = round((analysis_start - start_time) * 1000, 2)
+    if transfer_ms is not None:
+        report["transfer_ms"] = round(transfer_ms, 2)
+    return report
+
+def sampled_engines(file_path, probe, plan, frame_side=FRAME_MAX_SIDE):
+    """Engines on frames sampled across the scenes of the video, within the plan."""
+    # Representative frames spread across scenes plus short contiguous runs for motion
+    sample = sample_frames_adaptive(file_path, budget=plan.frames, run_count=plan.run_count,
+                                    run_length=plan.run_length, max_side=frame_side, probe=probe)
+    frames = sample['frames']
+    if not frames:
+        raise HTTPException(status_code=422, detail="Could not extract frames from video.")
+    return dict(frame_engines(frames, sample['runs'], plan), scenes=len(sample['scenes']))
+
+def frame_engines(frames, runs, plan):
+    """Spatial, temporal and forensic engines on decoded frames and motion runs, within the plan."""
+    if plan.budgeted:
+        # Short videos come back fully decoded; keep temporal work to the planned shape
+        runs = [run[:plan.run_length] for run in runs[:plan.run_count]]
+    sequence = [view for run in runs for view in run]
+    plan.set_temporal_units(len(sequence), sum(max(len(run) - 1, 0) for run in runs))
+    forensic_views = frames[::2][:plan.forensic_frames]
+
+    # 2. Run Engines
+    # With an engine process pool, forensic and temporal run there while spatial runs here.
+    # Before each stage the deadline is checked; parts that would overrun are skipped.
+    offloaded_temporal = plan.affordable([(m, plan.temporal_cost(m)) for m in plan.temporal_methods],
+                                         reserve=COSTS.cost('spatial.detect', plan.spatial_inferences))
+    with cpu_engine_jobs(forensic_views, runs, plan, offloaded_temporal) as pending:
+        # Near-identical consecutive frames reuse the previous spatial score
+        with span("spatial"):
+            spatial_res = spatial_engine.detect_frames(
+                frames, max_inferences=plan.spatial_inferences,
+                stop=lambda: not plan.fits(COSTS.cost('spatial.detect')))
+        metrics.SPATIAL_BATCH.observe(spatial_res['inferences'])
+        metrics.CACHE_REQUESTS.inc(spatial_res['skipped'], cache="spatial_similarity", result="hit")
+        metrics.CACHE_REQUESTS.inc(spatial_res['inferences'], cache="spatial_similarity", result="miss")
+        if spatial_res['inferences']:
+            plan.mark('spatial')
+        
+        with span("temporal"):
+            if 'temporal' in pending:
+                temporal_methods = offloaded_temporal
+                avg_temporal_res = wait_for(pending['temporal'], plan)
+            else:
+                temporal_methods = plan.affordable([(m, plan.temporal_cost(m)) for m in plan.temporal_methods])
+                avg_temporal_res = temporal_engine.detect_all_temporal(
+                    sequence, runs=runs, methods=temporal_methods, flow_max_side=plan.flow_max_side
+                ) if temporal_methods else None
+            if avg_temporal_res is not None:
+                plan.mark(*[f'temporal.{m}' for m in temporal_methods])
+            else:
+                avg_temporal_res = {'confidence': 0.0}
+        
+        with span("forensic"):
+            if 'forensic' in pending:
+                forensic_scores = wait_for(pending['forensic'], plan) or []
+                forensic_methods = plan.forensic_methods
+            else:
+                forensic_methods = plan.affordable([(m, plan.forensic_frame_cost([m])) for m in plan.forensic_methods])
+                frame_cost = plan.forensic_frame_cost(forensic_methods)
+                forensic_scores = []
+                if not plan.budgeted:
+                    # No deadline: all frames at once, spread over the frame pool
+                    if forensic_methods:
+                        forensic_scores = forensic_engine.detect_frames(forensic_views, methods=forensic_methods)
+                else:
+                    # Frame by frame, so the deadline is checked before each one
+                    for f in forensic_views:
+                        if not forensic_methods or (forensic_scores and not plan.fits(frame_cost)):
+                            break
+                        forensic_scores.append(forensic_engine.detect_all_artifacts(f, methods=forensic_methods))
+            if forensic_scores:
+                plan.mark(*[f'forensic.{m}' for m in forensic_methods])
+    return {'spatial': spatial_res, 'temporal': avg_temporal_res, 'forensic': forensic_scores}
+
+def segmented_engines(file_path, probe, plan, metadata_score, frame_side=FRAME_MAX_SIDE, segment_list=None):
+    """Engines on every time segment of a long video, see utils/segments.py."""
+    # Cost-model units are per segment, matching the spans recorded by the workers
+    plan.set_temporal_units(segments.SEGMENT_RUN_LENGTH, segments.SEGMENT_RUN_LENGTH - 1)
+    with span("segments"):
+        result = segments.analyze_segments(
+            file_path, probe, spatial_engine.detect_batch, temporal_engine, forensic_engine,
+            metadata_score=metadata_score, max_side=frame_side, flow_max_side=plan.flow_max_side,
+            segments=segment_list)
+    if not result['frames']:
+        raise HTTPException(status_code=422, detail="Could not extract frames from video.")
+    metrics.SPATIAL_BATCH.observe(result['spatial']['inferences'])
+    metrics.CACHE_REQUESTS.inc(result['spatial']['skipped'], cache="spatial_similarity", result="hit")
+    metrics.CACHE_REQUESTS.inc(result['spatial']['inferences'], cache="spatial_similarity", result="miss")
+    # Only temporal methods that had enough frames (or faces) in some segment count as done
+    plan.mark('spatial', *[f'temporal.{m}' for m in result['temporal']['completed']],
+              *[f'forensic.{m}' for m in ForensicDetector.METHOD_WEIGHTS if result['forensic']])
+    return dict(result, scenes=len(result['timeline']))
+
+def analyze_with_plan(job_id, filename, file_path, start_time, plan, probe, segment_list, frame_side):
+    # 1. Process Video
+    avg_metadata = 0.0
+    segmented = bool(segment_list)
+    if segmented:
+        # Long videos: every time segment is scored, giving a timeline of the video
+        with span("metadata"):
+            avg_metadata = safe_float(metadata_engine.check_metadata(file_path, probe=probe)['confidence'])
+        plan.mark('metadata')
+    # Frames are decoded at the side the job's memory reservation allows
+    if segmented:
+        results = segmented_engines(file_path, probe, plan, avg_metadata, frame_side, segment_list)
+    else:
+        # Representative frames across the scenes, cut to the plan
+        results = sampled_engines(file_path, probe, plan, frame_side)
+
+    if not segmented and plan.metadata and plan.fits(COSTS.cost('metadata')):
+        with span("metadata"):
+            avg_metadata_res = metadata_engine.check_metadata(file_path, probe=probe)
+        avg_metadata = safe_float(avg_metadata_res['confidence'] if isinstance(avg_metadata_res, dict) else avg_metadata_res)
+        plan.mark('metadata')
+    return build_report(job_id, filename, start_time, plan, results, avg_metadata)
+
+def build_report(job_id, filename, start_time, plan, results, avg_metadata=0.0):
+    """Ensemble verdict and report from the engine results; saves it with the job's features."""
+    spatial_res, avg_temporal_res, forensic_scores = results['spatial'], results['temporal'], results['forensic']
+    segmented = 'timeline' in results
+
+    avg_spatial = safe_float(spatial_res['scores'])
+    avg_temporal = safe_float(avg_temporal_res['confidence'] if isinstance(avg_temporal_res, dict) else avg_temporal_res)
+    avg_forensic = safe_float([res['confidence'] if isinstance(res, dict) else res for res in forensic_scores])
+
+    # 3. Ensemble Calculation (Refined for Higher Sensitivity)
+    # Weighted average plus "Red Flag" boost, see utils/ensemble.py.
+    # Engines cut by the deadline (or with nothing to check, like metadata for captured
+    # frames) are left out and the remaining weights rescaled.
+    scores = {"spatial": avg_spatial, "temporal": avg_temporal, "forensic": avg_forensic, "metadata": avg_metadata}
+    engines = plan.engines()
+    weights, red_flags = ensemble.renormalized(engines) if len(engines) < len(ensemble.WEIGHTS) else (None, None)
+    final_score = safe_float(ensemble.final_score(**scores, weights=weights, red_flags=red_flags))
+    score_floor = 0.0
+    if segmented and segments.SEGMENT_MAX_RULE:
+        # Opt-in: a spliced AI clip makes the video AI-generated even if the rest is real.
+        # Otherwise the timeline is reported alongside the global verdict.
+        score_floor = max((t['confidence'] for t in results['timeline']), default=0.0)
+        final_score = max(final_score, score_floor)
+    classification = classify(final_score)
+    
+    display_score = final_score
+    evidence = generate_reasoning(avg_spatial, avg_temporal, avg_forensic, avg_metadata)
+    
+    report = {
+        "job_id": job_id,
+        "final_confidence": round(display_score, 4),
+        "classification": classification,
+        "evidence": evidence,
+        "spatial_inferences": spatial_res['inferences'],
+        "spatial_inferences_skipped": spatial_res['skipped'],
+        "scenes_detected": results['scenes'],
+        "processing_time_ms": round((time.time() - start_time) * 1000, 2)
+    }
+
+    if segmented:
+        report["timeline"] = results['timeline']
+        report["suspicious_interval"] = segments.suspicious_interval(results['timeline'])
+
+    if plan.budgeted:
+        # How far the full analysis could move the score, given what was skipped
+        # (captured frames have no container, so their full analysis has no metadata check either)
+        full_weights, full_flags = (None, None) if plan.metadata else \
+            ensemble.renormalized([e for e in ensemble.WEIGHTS if e != 'metadata'])
+        low, high = ensemble.score_range(scores, engines, weights=full_weights, red_flags=full_flags)
+        report["budget"] = dict(
+            plan.summary(),
+            coverage=round(sum((full_weights or ensemble.WEIGHTS)[e] for e in engines), 2),
+            score_range=[round(low, 4), round(high, 4)],
+            verdict_stable=classify(low) == classify(high)
+        )
+
+    trace = current_trace()
+    if trace is not None:
+        report["stage_timings_ms"] = trace.breakdown()
+
+    with span("db_save"):
+        save_analysis_result(job_id, filename, report, {
+            "spatial": avg_spatial, "temporal": avg_temporal, 
+            "forensic": avg_forensic, "metadata": avg_metadata
+        })
+
+    # Per-frame features let us re-score history without re-decoding
+    with span("feature_store"):
+        try:
+            forensic_frames = [res['breakdown'] for res in forensic_scores if isinstance(res, dict)]
+            feature_store.append(
+                job_id, start_time,
+                scores={"spatial": avg_spatial, "temporal": avg_temporal, "forensic": avg_forensic,
+                        "metadata": avg_metadata, "final_confidence": final_score},
+                breakdown=dict(
+                    avg_temporal_res.get('breakdown', {}),
+                    **{k: safe_float([f.get(k, 0.0) for f in forensic_frames]) for k in ('frequency', 'gan', 'diffusion', 'compression')}
+                ),
+                sequences=dict(avg_temporal_res.get('features', {}), spatial=spatial_res['scores']),
+                forensic_frames=forensic_frames,
+                # Re-scoring reuses how this job was scored (partial, no metadata...)
+                engines=engines, weights=weights or ensemble.WEIGHTS, score_floor=score_floor
+            )
+        except Exception as e:
+            print(f"⚠️ Feature store write failed: {e}")
+    return report
+
 @app.post("/api/analyze_url")
-async def analyze_url(request: URLRequest):
+async def analyze_url(request: URLRequest, http_request: Request):
     start_time = time.time()
     job_id = str(uuid.uuid4())
     
@@ -65,155 +526,189 @@ async def analyze_url(request: URLRequest):
     if not video_url:
         raise HTTPException(status_code=400, detail="URL is empty")
 
+    priority, client = job_origin(http_request, request.priority)
+
     print(f"🔍 Analyzing URL: {video_url}")
     
     # Create filename
     filename = f"{job_id}_video.mp4"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    # 2. Download
-    print(f"📥 Downloading video...")
-    success, error_msg = download_video(video_url, file_path)
-    
-    if not success:
-        print(f"❌ Download failed: {error_msg}")
-        raise HTTPException(status_code=400, detail=f"Download failed: {error_msg}")
     
-    try:
-        # 3. Process Video
-        frames = extract_frames(file_path)
-        if not frames:
-            raise HTTPException(status_code=422, detail="Could not extract frames from video.")
-
-        # 4. Run Engines
-        spatial_scores = [spatial_engine.detect(f) for f in frames[:10]]
-        avg_spatial = safe_float([res['fake_confidence'] if isinstance(res, dict) else res for res in spatial_scores])
-        
-        avg_temporal_res = temporal_engine.detect_all_temporal(frames)
-        avg_temporal = safe_float(avg_temporal_res['confidence'] if isinstance(avg_temporal_res, dict) else avg_temporal_res)
-        
-        forensic_scores = [forensic_engine.detect_all_artifacts(f) for f in frames[:5]]
-        avg_forensic = safe_float([res['confidence'] if isinstance(res, dict) else res for res in forensic_scores])
-        
-        avg_metadata_res = metadata_engine.check_metadata(file_path)
-        avg_metadata = safe_float(avg_metadata_res['confidence'] if isinstance(avg_metadata_res, dict) else avg_metadata_res)
-        
-        # 5. Ensemble Calculation (Refined for Higher Sensitivity)
-        # We use a weighted average, but also check for "Red Flags"
-        base_score = (avg_spatial * 0.35 + avg_temporal * 0.30 + avg_forensic * 0.25 + avg_metadata * 0.10)
-        
-        # Red Flag: If Spatial or Forensic is extremely confident, AI detection is likely
-        # even if other engines (like Temporal) are confused by video quality.
-        red_flag_boost = 0
-        if avg_spatial > 0.8: red_flag_boost = max(red_flag_boost, 0.2)
-        if avg_forensic > 0.75: red_flag_boost = max(red_flag_boost, 0.2)
-        
-        final_score = safe_float(base_score + red_flag_boost)
-        
-        # Classification threshold back to 0.50 for better sensitivity
-        classification = "AI-Generated" if final_score > 0.50 else "Real"
-        
-        display_score = final_score
-        evidence = generate_reasoning(avg_spatial, avg_temporal, avg_forensic, avg_metadata)
+    def fetch(workspace):
+        file_path = workspace.file("video.mp4")
+
+        # 2. Download
+        print(f"📥 Downloading video...")
+        # download_video is traced as "download" itself
+        success, error_msg = download_video(video_url, file_path, max_filesize=workspace.quota_bytes)
         
-        report = {
-            "job_id": job_id,
-            "final_confidence": round(display_score, 4),
-            "classification": classification,
-            "evidence": evidence,
-            "processing_time_ms": round((time.time() - start_time) * 1000, 2)
-        }
+        if not success:
+            print(f"❌ Download failed: {error_msg}")
+            raise HTTPException(status_code=400, detail=f"Download failed: {error_msg}")
+        metrics.DOWNLOADED_BYTES.inc(os.path.getsize(file_path))
+        return file_path
+    
+    async def analyze():
+        with start_trace(job_id, enabled=request.trace):
+            return await run_video_job(job_id, filename, start_time, fetch, budget_ms=request.budget_ms,
+                                       priority=priority, client=client, profile=request.profile)
 
-        save_analysis_result(job_id, filename, report, {
-            "spatial": avg_spatial, "temporal": avg_temporal, 
-            "forensic": avg_forensic, "metadata": avg_metadata
-        })
-        return report
+    if request.trace or request.profile:
+        # Timings and profiles belong to one request's own run, so it is never shared
+        return await analyze()
 
-    finally:
-        # Cleanup
-        if os.path.exists(file_path): 
-            try: os.remove(file_path)
-            except: pass
-        if os.path.exists("temp_frames"): 
-            try: shutil.rmtree("temp_frames")
-            except: pass
+    # The budget changes the amount of work done and the priority decides where the
+    # job queues, so both are part of the key
+    video_key = normalize_video_url(video_url)
+    report, shared = await url_flights.do((video_key, request.budget_ms, priority), analyze)
+    metrics.CACHE_REQUESTS.inc(cache="url_singleflight", result="hit" if shared else "miss")
+    if shared:
+        print(f"🔗 Joined in-flight analysis of {video_key}")
+        return dict(report, coalesced=True)
+    return report
 
 @app.post("/api/analyze")
-async def analyze_video(file: UploadFile = File(...)):
+async def analyze_video(http_request: Request, file: UploadFile = File(...), trace: bool = False,
+                        budget_ms: Optional[float] = None, priority: Optional[str] = None,
+                        profile: bool = False):
     start_time = time.time()
     job_id = str(uuid.uuid4())
+    priority, client = job_origin(http_request, priority)
     
     # Create filename and save
     filename = f"{job_id}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
+    def fetch(workspace):
+        with span("upload_spool"):
+            try:
+                file_path = workspace.spool(file.file, file.filename)
+            except QuotaExceeded as e:
+                raise HTTPException(status_code=413, detail=str(e))
+        metrics.UPLOADED_BYTES.inc(os.path.getsize(file_path))
+        return file_path
+    
+    with start_trace(job_id, enabled=trace):
+        # The multipart body is already parsed, so the upload's size is known before spooling
+        return await run_video_job(job_id, filename, start_time, fetch, budget_ms=budget_ms,
+                                   priority=priority, client=client, profile=profile, size_hint=file.size)
+
+def run_captured_analysis(job_id, filename, views, start_time, budget_ms=None):
+    """Engines on frames captured client-side: no download, probe or decode, and no metadata check."""
+    # As for videos, the budget starts once the job has its slot and the frames are decoded
+    analysis_start = time.time()
+    plan = make_plan(budget_ms, analysis_start, metadata=False)
+    with planner.activate(plan):
+        # Bursts of consecutive frames drive the temporal engine; without any it is left out
+        runs = frame_capture.group_runs(views)
+        if not runs:
+            plan.temporal_methods = ()
+        frames = frame_capture.representative(views, plan.frames)
+        results = dict(frame_engines(frames, runs, plan), scenes=len(runs) or 1)
+        report = build_report(job_id, filename, start_time, plan, results)
+    return dict(report, frames_received=len(views), runs_received=len(runs),
+                waited_ms=round((analysis_start - start_time) * 1000, 2))
+
+@app.post("/api/analyze_frames")
+async def analyze_frames(request: FramesRequest, http_request: Request):
+    """Verdict on frames captured from the page's player by the extension, instead of the whole video."""
+    start_time = time.time()
+    job_id = str(uuid.uuid4())
+    priority, client = job_origin(http_request, request.priority)
+    if not request.frames:
+        raise HTTPException(status_code=400, detail="No frames sent")
+    if len(request.frames) > frame_capture.CAPTURE_MAX_FRAMES:
+        raise HTTPException(status_code=413, detail=f"At most {frame_capture.CAPTURE_MAX_FRAMES} frames per request")
+    source_shape = (request.height, request.width) if request.width and request.height else None
+    filename = f"{job_id}_{request.source or 'captured_frames'}"
+
+    def job():
+        with span("frame_decode"):
+            try:
+                views = frame_capture.decode_frames([(f.data, f.timestamp) for f in request.frames],
+                                                    source_shape=source_shape)
+            except frame_capture.CaptureTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        metrics.CAPTURED_BYTES.inc(sum(len(f.data) for f in request.frames))
+        return run_captured_analysis(job_id, filename, views, start_time, budget_ms=request.budget_ms)
+
+    with start_trace(job_id, enabled=request.trace):
+        return await run_job(profiled(job, job_id, request.profile), priority, client)
+
+@app.post("/api/analyze_stream")
+async def analyze_stream(request: StreamRequest, http_request: Request):
+    """Live verdicts on a stream as NDJSON, one line every `update_seconds` of stream time."""
+    job_id = str(uuid.uuid4())
+    source = request.url.strip()
+    if not streaming.is_stream_url(source):
+        raise HTTPException(status_code=400, detail=f"Stream URL must use one of: {', '.join(streaming.STREAM_SCHEMES)}")
+    # Streams have their own slots, so the request's priority class does not apply
+    _, client = job_origin(http_request)
+    max_seconds = min(max(request.max_seconds, 1.0), streaming.STREAM_MAX_SECONDS)
+
+    print(f"📡 Analyzing stream: {source}")
     try:
-        # Process Video (Same logic as analyze_url)
-        frames = extract_frames(file_path)
-        if not frames:
-            raise HTTPException(status_code=422, detail="Could not extract frames from video.")
-
-        # Run Engines
-        spatial_scores = [spatial_engine.detect(f) for f in frames[:10]]
-        avg_spatial = safe_float([res['fake_confidence'] if isinstance(res, dict) else res for res in spatial_scores])
-        
-        avg_temporal_res = temporal_engine.detect_all_temporal(frames)
-        avg_temporal = safe_float(avg_temporal_res['confidence'] if isinstance(avg_temporal_res, dict) else avg_temporal_res)
-        
-        forensic_scores = [forensic_engine.detect_all_artifacts(f) for f in frames[:5]]
-        avg_forensic = safe_float([res['confidence'] if isinstance(res, dict) else res for res in forensic_scores])
-        
-        avg_metadata_res = metadata_engine.check_metadata(file_path)
-        avg_metadata = safe_float(avg_metadata_res['confidence'] if isinstance(avg_metadata_res, dict) else avg_metadata_res)
-        
-        # Ensemble Calculation (Refined for Higher Sensitivity)
-        base_score = (avg_spatial * 0.35 + avg_temporal * 0.30 + avg_forensic * 0.25 + avg_metadata * 0.10)
-        
-        # Red Flag: If Spatial or Forensic is extremely confident, AI detection is likely
-        red_flag_boost = 0
-        if avg_spatial > 0.8: red_flag_boost = max(red_flag_boost, 0.2)
-        if avg_forensic > 0.75: red_flag_boost = max(red_flag_boost, 0.2)
-        
-        final_score = safe_float(base_score + red_flag_boost)
-        classification = "AI-Generated" if final_score > 0.50 else "Real"
-        
-        display_score = final_score
-        evidence = generate_reasoning(avg_spatial, avg_temporal, avg_forensic, avg_metadata)
-        
-        report = {
-            "job_id": job_id,
-            "final_confidence": round(display_score, 4),
-            "classification": classification,
-            "evidence": evidence,
-            "processing_time_ms": round((time.time() - start_time) * 1000, 2)
-        }
+        capture = await run_in_threadpool(streaming.open_stream, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        save_analysis_result(job_id, filename, report, {
-            "spatial": avg_spatial, "temporal": avg_temporal, 
-            "forensic": avg_forensic, "metadata": avg_metadata
-        })
-        return report
+    analyzer = streaming.StreamAnalyzer(spatial_engine.detect_frames, temporal_engine, forensic_engine,
+                                        window_seconds=request.window_seconds, max_side=FRAME_MAX_SIDE)
 
-    finally:
-        # Cleanup
-        if os.path.exists(file_path): 
-            try: os.remove(file_path)
-            except: pass
+    def updates():
+        for update in streaming.analyze_stream(source, analyzer, update_seconds=max(request.update_seconds, 1.0),
+                                               max_seconds=max_seconds, capture=capture):
+            update["job_id"] = job_id
+            if update["final"]:
+                save_analysis_result(job_id, source, update, update["scores"])
+            yield update
+
+    async def body():
+        stream = updates()
+        try:
+            # The stream holds a stream slot (not a job slot) for as long as it is analysed
+            async with scheduler.slot(STREAM, client):
+                async for update in iterate_in_threadpool(stream):
+                    yield json.dumps(update) + "\n"
+        finally:
+            # Client gone (or never admitted): stop reading and free the capture
+            stream.close()
+            capture.release()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 @app.get("/api/history")
-async def get_history():
+async def get_history(limit: int = 50, include_archived: bool = False):
     from database import get_analysis_history
-    return get_analysis_history(limit=50)
+    return get_analysis_history(limit=min(max(limit, 1), 500), include_archived=include_archived)
 
 @app.get("/api/stats")
 async def get_stats():
     from database import get_statistics
     return get_statistics()
 
+@app.get("/api/profile/{job_id}", response_class=PlainTextResponse)
+async def get_profile(job_id: str):
+    """Sampling profile of a job as collapsed stacks (flamegraph.pl, speedscope, inferno)."""
+    profile = get_job_profile(job_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile recorded for this job")
+    return PlainTextResponse(profile["folded"], headers={
+        "X-Profile-Trigger": profile["trigger"] or "",
+        "X-Profile-Samples": str(profile["samples"]),
+        "X-Profile-Duration-Ms": str(round(profile["duration_ms"] or 0.0, 1)),
+    })
+
+@app.get("/api/queue")
+async def get_queue():
+    # Job slots per priority class, and memory reserved against the budget
+    return dict(scheduler.snapshot(), memory=memory.snapshot())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Summed over every serve.py worker when they share VERIFAI_METRICS_DIR
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
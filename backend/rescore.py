@@ -0,0 +1,81 @@
+"""
+Re-score stored jobs from the feature store with new ensemble settings
+
+Examples (from backend/):
+    python rescore.py
+    python rescore.py --weights 0.40,0.25,0.25,0.10 --threshold 0.55
+    python rescore.py --evidence --apply
+"""
+import argparse
+import time
+from collections import Counter
+
+import numpy as np
+
+from database import DB_PATH, update_verdicts
+from utils import ensemble
+from utils.feature_store import FeatureStore, FEATURE_STORE_DIR
+from utils.reasoning_engine import generate_reasoning
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute verdicts for past jobs without re-decoding")
+    parser.add_argument("--store", default=FEATURE_STORE_DIR, help="Feature store directory")
+    parser.add_argument("--weights", help="spatial,temporal,forensic,metadata (default: the weights each job "
+                                           "was scored with)")
+    parser.add_argument("--threshold", type=float, default=ensemble.AI_THRESHOLD)
+    parser.add_argument("--boost", type=float, default=ensemble.RED_FLAG_BOOST, help="Red-flag boost")
+    parser.add_argument("--evidence", action="store_true", help="Also rerun generate_reasoning per job")
+    parser.add_argument("--apply", action="store_true",
+                        help="Write the new verdicts to analysis_results (archived results included)")
+    args = parser.parse_args()
+
+    weights = None
+    if args.weights:
+        values = [float(v) for v in args.weights.split(",")]
+        weights = dict(zip(("spatial", "temporal", "forensic", "metadata"), values))
+
+    start = time.perf_counter()
+    jobs = FeatureStore(args.store).jobs()
+    if len(jobs) == 0:
+        print("No stored jobs found.")
+        return
+
+    # Each job is scored over the engines that actually ran for it (partial, budgeted
+    # and captured-frame jobs had weights renormalised); new weights are renormalised the same way
+    job_weights, red_flags = ensemble.job_weights(jobs['engines'], weights)
+    if weights is None:
+        job_weights = {name: jobs[f'w_{name}'].astype(np.float64) for name in ensemble.ENGINES}
+    scores = ensemble.final_score(jobs['spatial'], jobs['temporal'], jobs['forensic'], jobs['metadata'],
+                                  weights=job_weights, red_flags=red_flags, boost=args.boost)
+    scores = np.maximum(scores, jobs['score_floor'])
+    new_ai = scores > args.threshold
+    old_ai = jobs['final_confidence'] > ensemble.AI_THRESHOLD
+    elapsed = time.perf_counter() - start
+
+    print(f"📊 Re-scored {len(jobs)} jobs in {elapsed * 1000:.1f} ms")
+    print(f"   AI-Generated: {int(old_ai.sum())} -> {int(new_ai.sum())}")
+    print(f"   Real -> AI-Generated: {int((new_ai & ~old_ai).sum())}")
+    print(f"   AI-Generated -> Real: {int((old_ai & ~new_ai).sum())}")
+    print(f"   Mean confidence change: {float(np.mean(scores - jobs['final_confidence'])):+.4f}")
+
+    if args.evidence:
+        counts = Counter()
+        for record in jobs:
+            for item in generate_reasoning(float(record['spatial']), float(record['temporal']),
+                                           float(record['forensic']), float(record['metadata'])):
+                counts[item['type']] += 1
+        print("   Evidence produced:")
+        for name, count in counts.most_common():
+            print(f"     {name}: {count}")
+
+    if args.apply:
+        labels = ensemble.classify(scores, threshold=args.threshold)
+        rows = [(label, round(float(score), 4), job_id.decode())
+                for label, score, job_id in zip(labels, scores, jobs['job_id'])]
+        updated = update_verdicts(rows)
+        print(f"✅ Updated {updated} of {len(rows)} results in {DB_PATH} and its archive")
+
+
+if __name__ == "__main__":
+    main()
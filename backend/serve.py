@@ -0,0 +1,151 @@
+"""
+Multi-process server: loads the models once, then forks workers that share
+the weights copy-on-write and accept on one listening socket
+
+Examples (from backend/):
+    python serve.py                              # one worker per (cores / threads)
+    python serve.py --workers 4 --threads 2 --port 8000
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+# Environment knobs for BLAS/OpenMP pools must be set before numpy/torch/cv2 load
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                   "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+
+def set_thread_env(threads):
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    # Sizes the frame, segment and FFT thread pools of each worker (utils/parallel.py)
+    os.environ["VERIFAI_WORKER_THREADS"] = str(threads)
+
+
+def apply_thread_caps(threads):
+    """Caps torch and OpenCV pools so N workers don't oversubscribe the cores"""
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, threads, log_level):
+    import uvicorn
+    apply_thread_caps(threads)
+    config = uvicorn.Config(app, fd=sock.fileno(), log_level=log_level)
+    uvicorn.Server(config).run()
+
+
+def spawn(app, sock, threads, log_level, index):
+    pid = os.fork()
+    if pid == 0:
+        # Child: default signal handling, serve until told to stop
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # Worker 0 (and its replacement) alone reaps workspaces and maintains the database
+        os.environ["VERIFAI_HOUSEKEEPING"] = "1" if index == 0 else "0"
+        try:
+            run_worker(app, sock, threads, log_level)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run VerifAI with several pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("VERIFAI_WORKER_THREADS", "2")),
+                        help="torch/OpenCV/BLAS threads per worker")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("VERIFAI_WORKERS", "0")),
+                        help="Worker processes (default: cores / threads)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    threads = max(1, args.threads)
+    workers = args.workers or max(1, (os.cpu_count() or 1) // threads)
+    set_thread_env(threads)
+    # Workers write metric snapshots here so /metrics covers all of them
+    metrics_dir = None
+    if not os.environ.get("VERIFAI_METRICS_DIR"):
+        metrics_dir = tempfile.mkdtemp(prefix="verifai_metrics_")
+        os.environ["VERIFAI_METRICS_DIR"] = metrics_dir
+
+    # Load every engine (including the SigLIP weights) once, before forking
+    print(f"🧠 Loading models in supervisor (pid {os.getpid()})...")
+    import pipeline
+    apply_thread_caps(threads)
+
+    if not hasattr(os, "fork"):
+        print("⚠️ os.fork is unavailable on this platform; running a single worker")
+        import uvicorn
+        uvicorn.run(pipeline.app, host=args.host, port=args.port, log_level=args.log_level)
+        return
+
+    sock = bind_socket(args.host, args.port)
+
+    # Move everything loaded so far out of the GC's reach so collections in the
+    # workers don't write to (and un-share) the parent's pages
+    import gc
+    gc.collect()
+    gc.freeze()
+
+    # pid -> worker index
+    children = {}
+    for index in range(workers):
+        children[spawn(pipeline.app, sock, threads, args.log_level, index)] = index
+    print(f"🚀 {workers} workers x {threads} threads serving on {args.host}:{args.port}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Supervise: replace crashed workers until asked to stop
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if not stopping and index is not None:
+            print(f"⚠️ Worker {pid} exited (status {status}); restarting")
+            time.sleep(0.5)
+            children[spawn(pipeline.app, sock, threads, args.log_level, index)] = index
+
+    sock.close()
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Regression tests for utils/admission.py (run from backend/: python -m pytest tests)
+"""
+import asyncio
+import threading
+
+import pytest
+
+from utils.admission import AdmissionRejected, MemoryAdmission
+
+
+def test_async_waiter_is_admitted_when_another_thread_releases():
+    async def scenario():
+        memory = MemoryAdmission(100, timeout=5)
+        memory.acquire('running', 80)
+        # Released from a worker thread, as a finishing job does
+        threading.Timer(0.05, memory.release, ('running', 80)).start()
+        await memory.acquire_async('queued', 50)
+        assert memory.reserved == 50
+        assert memory.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_async_wait_times_out_without_reserving():
+    async def scenario():
+        memory = MemoryAdmission(100, timeout=0.05)
+        memory.acquire('running', 80)
+        with pytest.raises(AdmissionRejected):
+            await memory.acquire_async('queued', 50)
+        assert memory.reserved == 80
+        assert memory.waiting == 0
+        assert 'queued' not in memory.jobs
+
+    asyncio.run(scenario())
@@ -0,0 +1,22 @@
+"""
+Regression tests for utils/frame_similarity.py (run from backend/: python -m pytest tests)
+"""
+import numpy as np
+
+from utils.frame_similarity import gated_scores, gated_selection, selection_scores
+
+
+def _frames():
+    rng = np.random.default_rng(0)
+    still = rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    # Runs of identical frames between distinct ones, so the gate skips some
+    return [still, still.copy(), rng.integers(0, 255, (120, 160, 3), dtype=np.uint8), still.copy()] * 3
+
+
+def test_batched_selection_matches_gated_scores():
+    frames = _frames()
+    score = lambda frame: float(frame.mean())
+    for max_inferences in (1, 3, 10):
+        picked, owners = gated_selection(frames, max_inferences=max_inferences)
+        batched = selection_scores([score(frames[i]) for i in picked], owners)
+        assert batched == gated_scores(frames, score, max_inferences=max_inferences)
@@ -0,0 +1,103 @@
+"""
+Regression tests for utils/scheduler.py (run from backend/: python -m pytest tests)
+"""
+import asyncio
+
+from utils.scheduler import STREAM, JobScheduler
+
+
+async def _hold(scheduler, client, release, entered=None):
+    async with scheduler.slot('interactive', client):
+        if entered is not None:
+            entered.set()
+        await release
+
+
+def test_cancel_just_before_release_does_not_leak_the_slot():
+    async def scenario():
+        scheduler = JobScheduler(1)
+        loop = asyncio.get_running_loop()
+        release_a = loop.create_future()
+        entered_a = asyncio.Event()
+        job_a = asyncio.create_task(_hold(scheduler, 'a', release_a, entered_a))
+        await entered_a.wait()
+        job_b = asyncio.create_task(_hold(scheduler, 'b', loop.create_future()))
+        await asyncio.sleep(0)
+        assert scheduler.queued('interactive') == 1
+
+        # A finishes first, then B is cancelled before its handler can run:
+        # A's release must skip B's cancelled waiter instead of granting it
+        release_a.set_result(None)
+        job_b.cancel()
+        await asyncio.gather(job_a, job_b, return_exceptions=True)
+        assert job_a.exception() is None
+        assert job_b.cancelled()
+        assert scheduler.running['interactive'] == 0
+        assert scheduler.queued('interactive') == 0
+
+        # The slot is still usable
+        release_c = loop.create_future()
+        release_c.set_result(None)
+        await asyncio.wait_for(_hold(scheduler, 'c', release_c), timeout=1)
+        assert scheduler.running['interactive'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_skipped_for_the_next_one():
+    async def scenario():
+        scheduler = JobScheduler(1)
+        loop = asyncio.get_running_loop()
+        release_a, release_c = loop.create_future(), loop.create_future()
+        entered_a, entered_c = asyncio.Event(), asyncio.Event()
+        job_a = asyncio.create_task(_hold(scheduler, 'a', release_a, entered_a))
+        await entered_a.wait()
+        job_b = asyncio.create_task(_hold(scheduler, 'b', loop.create_future()))
+        job_c = asyncio.create_task(_hold(scheduler, 'c', release_c, entered_c))
+        await asyncio.sleep(0)
+
+        release_a.set_result(None)
+        job_b.cancel()
+        await asyncio.wait_for(entered_c.wait(), timeout=1)
+        assert scheduler.running['interactive'] == 1
+        release_c.set_result(None)
+        await asyncio.gather(job_a, job_b, job_c, return_exceptions=True)
+        assert job_a.exception() is None and job_c.exception() is None
+        assert scheduler.running['interactive'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_streams_do_not_take_job_slots():
+    async def scenario():
+        scheduler = JobScheduler(1, stream_slots=1)
+        loop = asyncio.get_running_loop()
+        release_stream, release_job = loop.create_future(), loop.create_future()
+        stream_entered, job_entered = asyncio.Event(), asyncio.Event()
+
+        async def stream(client, release, entered=None):
+            async with scheduler.slot(STREAM, client):
+                if entered is not None:
+                    entered.set()
+                await release
+
+        live = asyncio.create_task(stream('a', release_stream, stream_entered))
+        await stream_entered.wait()
+        # The only job slot is still free while the stream runs
+        job = asyncio.create_task(_hold(scheduler, 'b', release_job, job_entered))
+        await asyncio.wait_for(job_entered.wait(), timeout=1)
+        # A second stream waits for the stream slot, not for the job
+        second = asyncio.create_task(stream('c', loop.create_future()))
+        await asyncio.sleep(0)
+        assert scheduler.queued(STREAM) == 1
+        assert scheduler.running == {'interactive': 1, 'batch': 0, STREAM: 1}
+
+        release_stream.set_result(None)
+        release_job.set_result(None)
+        await asyncio.gather(live, job)
+        assert scheduler.running[STREAM] == 1
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        assert scheduler.running[STREAM] == 0
+
+    asyncio.run(scenario())
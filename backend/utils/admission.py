@@ -0,0 +1,315 @@
+"""
+Memory-aware admission control
+
+Before decoding, each job's peak memory is estimated from the container
+probe (width, height, fps, duration) and the sampling plan: decoder
+buffers at source resolution plus every frame kept in memory with the
+views FrameViews caches on it for each engine, at that engine's side.
+Jobs reserve their estimate against a global budget before they queue
+for a scheduler slot, so a job waiting for memory holds neither a slot
+nor a worker thread. A job that does not fit what is free right now is
+first downscaled (frames kept at a smaller side), then queued until
+running jobs release memory, and rejected if it could never fit or the
+wait times out.
+"""
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+from models.forensic_detector import ForensicDetector
+from models.temporal_detector import TemporalAnalyzer
+from utils import metrics
+from utils.parallel import PARALLEL_WORKERS
+from utils.segments import SEGMENT_FORENSIC_FRAMES, SEGMENT_FRAMES, SEGMENT_RUN_LENGTH, SEGMENT_WORKERS
+
+MB = 1024 * 1024
+
+# Memory all running jobs together may reserve
+MEMORY_BUDGET_MB = float(os.environ.get("VERIFAI_MEMORY_BUDGET_MB", "2048"))
+# Longest a job waits for memory before it is rejected
+ADMISSION_TIMEOUT = float(os.environ.get("VERIFAI_ADMISSION_TIMEOUT", "60"))
+# Frame sides tried, largest first, when a job does not fit at full size
+DOWNSCALE_SIDES = (480, 360, 240)
+
+# Fixed per-job cost: engine temporaries, model activations, report
+JOB_OVERHEAD_MB = 64
+# Reference frames and conversion buffers held by the decoder, in source frames (YUV 4:2:0)
+DECODER_FRAMES = 8
+# Bytes per pixel of each view kind FrameViews caches (utils/frame_views.py)
+VIEW_BYTES = {'bgr': 3, 'gray': 1, 'gray_float': 4, 'bgr_float': 12, 'rgb': 3, 'ycrcb': 3}
+# SpatialDetector.max_side (models/spatial_detector.py loads torch, so it is not imported here)
+SPATIAL_MAX_SIDE = 448
+# (kind, side) views each engine caches on the frames it reads
+SPATIAL_VIEWS = (('bgr', SPATIAL_MAX_SIDE), ('rgb', SPATIAL_MAX_SIDE))
+FORENSIC_VIEWS = tuple((kind, ForensicDetector.max_side) for kind in ('bgr', 'gray_float', 'bgr_float', 'ycrcb'))
+DETECTION_VIEWS = (('bgr', TemporalAnalyzer.detection_max_side),)
+# Farneback flow (2 x float32) plus magnitude (float32) buffers of one frame-pool thread
+FLOW_BUFFER_BYTES = 12
+
+# Sampler shape (utils/video_processor.py): cadence and the full-decode threshold
+SAMPLE_FPS = 5
+SHORT_VIDEO_FRAMES = 48
+
+
+class AdmissionRejected(Exception):
+    """The job cannot be given enough memory"""
+
+
+def frame_pixels(width: int, height: int, max_side: Optional[int]) -> int:
+    """Pixels of one frame kept at most `max_side` on its longest side"""
+    longest = max(width, height, 1)
+    scale = min(1.0, max_side / longest) if max_side else 1.0
+    return int(width * scale) * int(height * scale)
+
+
+def views_bytes(width: int, height: int, stored_side: Optional[int], views) -> int:
+    """
+    Bytes FrameViews caches for `views` on one frame stored at `stored_side`
+
+    A `bgr` view at least as large as the stored frame is the stored frame
+    itself; every other view is built at the smaller of the two sides.
+    """
+    stored_longest = min(max(width, height), stored_side or max(width, height))
+    total = 0
+    for kind, side in views:
+        side = min(side or stored_longest, stored_longest)
+        if kind == 'bgr' and side == stored_longest:
+            continue
+        total += frame_pixels(width, height, side) * VIEW_BYTES[kind]
+    return total
+
+
+def frames_held(probe, plan, segment_count: int = 0) -> int:
+    """
+    Frames a job keeps in memory at once
+
+    Args:
+        probe: Container probe of the video
+        plan: AnalysisPlan of the job
+        segment_count: Number of segments for a segmented analysis (0: sampled)
+    """
+    if segment_count:
+        return segment_count * (SEGMENT_FRAMES + SEGMENT_RUN_LENGTH)
+    hop = int(probe.fps / SAMPLE_FPS) if probe.fps > SAMPLE_FPS else 1
+    sampled = probe.frame_count // hop
+    if sampled <= 0:
+        # Unknown length: the sampler falls back to a full decode
+        return int(max(probe.duration, 60.0) * SAMPLE_FPS)
+    if sampled <= SHORT_VIDEO_FRAMES:
+        # Short videos are decoded completely at the sampling cadence
+        return sampled
+    return plan.frames + plan.run_count * plan.run_length
+
+
+def forensic_frames_held(probe, plan, segment_count: int = 0) -> int:
+    """Frames the forensic engine reads, which carry its float and colour views"""
+    if segment_count:
+        return segment_count * SEGMENT_FORENSIC_FRAMES
+    return min(plan.forensic_frames, frames_held(probe, plan))
+
+
+def estimate_job_bytes(probe, plan, max_side: Optional[int], segment_count: int = 0) -> int:
+    """
+    Expected peak memory of a job
+
+    Every frame held may carry the spatial, flow and detection views; the
+    forensic frames also carry the forensic ones. Gray stacks of the
+    temporal engine and the flow buffers of each frame-pool thread are
+    added on top.
+
+    Args:
+        probe: Container probe (width and height of the source)
+        plan: AnalysisPlan of the job (frame counts and flow resolution)
+        max_side: Side frames are stored at
+        segment_count: Number of segments for a segmented analysis (0: sampled)
+
+    Returns:
+        Estimated bytes
+    """
+    width, height = probe.width or 1920, probe.height or 1080
+    frames = frames_held(probe, plan, segment_count)
+    forensic_frames = forensic_frames_held(probe, plan, segment_count)
+    flow_side = plan.flow_max_side or TemporalAnalyzer.flow_max_side
+    flow_views = (('bgr', flow_side),)
+
+    decoder = int(width * height * 1.5 * DECODER_FRAMES)
+    stored = frame_pixels(width, height, max_side) * VIEW_BYTES['bgr']
+    shared_views = views_bytes(width, height, max_side, SPATIAL_VIEWS + flow_views + DETECTION_VIEWS)
+    forensic_views = views_bytes(width, height, max_side, FORENSIC_VIEWS)
+    gray_stacks = views_bytes(width, height, max_side, (('gray', flow_side),
+                                                        ('gray', TemporalAnalyzer.detection_max_side)))
+    threads = PARALLEL_WORKERS * (SEGMENT_WORKERS if segment_count else 1)
+    flow_buffers = threads * frame_pixels(width, height, min(flow_side, max_side or flow_side)) * FLOW_BUFFER_BYTES
+    return int(JOB_OVERHEAD_MB * MB + decoder + frames * (stored + shared_views + gray_stacks)
+               + forensic_frames * forensic_views + flow_buffers)
+
+
+class MemoryAdmission:
+    """Reserves estimated job memory against a global budget"""
+
+    def __init__(self, budget_bytes: int, timeout: float = ADMISSION_TIMEOUT):
+        self.budget = int(budget_bytes)
+        self.timeout = timeout
+        self.reserved = 0
+        self.jobs: Dict[str, int] = {}
+        self.waiting = 0
+        self._cond = threading.Condition()
+        # (loop, future) of acquire_async callers, woken on every release
+        self._async_waiters = []
+        metrics.MEMORY_BUDGET.set(self.budget)
+        metrics.MEMORY_RESERVED.set(0)
+
+    @property
+    def free(self) -> int:
+        return self.budget - self.reserved
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                'budget_mb': round(self.budget / MB, 1),
+                'reserved_mb': round(self.reserved / MB, 1),
+                'waiting': self.waiting,
+                'jobs': {job_id: round(nbytes / MB, 1) for job_id, nbytes in self.jobs.items()},
+            }
+
+    def choose_side(self, estimate, max_side: int, sides: Sequence[int] = DOWNSCALE_SIDES) -> Tuple[int, int]:
+        """
+        Largest frame side that fits the free memory, else the budget
+
+        Args:
+            estimate: Callable(max_side) -> bytes
+            max_side: Preferred side
+            sides: Smaller sides to fall back to
+
+        Returns:
+            (side, bytes) to reserve
+
+        Raises:
+            AdmissionRejected: if even the smallest side exceeds the whole budget
+        """
+        candidates = [max_side] + [side for side in sides if side < max_side]
+        needs = [(side, estimate(side)) for side in candidates]
+        with self._cond:
+            free = self.free
+        for limit in (free, self.budget):
+            for side, nbytes in needs:
+                if nbytes <= limit:
+                    if side != max_side:
+                        metrics.ADMISSIONS.inc(result="downscaled")
+                    return side, nbytes
+        metrics.ADMISSIONS.inc(result="rejected")
+        smallest = needs[-1][1]
+        raise AdmissionRejected(f"Video needs ~{smallest / MB:.0f} MB, over the "
+                                f"{self.budget / MB:.0f} MB memory budget")
+
+    def _check_budget(self, nbytes: int):
+        if nbytes > self.budget:
+            metrics.ADMISSIONS.inc(result="rejected")
+            raise AdmissionRejected(f"Job needs ~{nbytes / MB:.0f} MB, over the "
+                                    f"{self.budget / MB:.0f} MB memory budget")
+
+    def _take(self, job_id: str, nbytes: int):
+        # Caller holds self._cond
+        self.reserved += nbytes
+        self.jobs[job_id] = self.jobs.get(job_id, 0) + nbytes
+        metrics.MEMORY_RESERVED.set(self.reserved)
+
+    def acquire(self, job_id: str, nbytes: int, timeout: Optional[float] = None):
+        """
+        Reserve `nbytes` of the budget for `job_id`
+
+        Waits (up to `timeout`, default ADMISSION_TIMEOUT) while other jobs
+        hold too much of it.
+
+        Raises:
+            AdmissionRejected: if the job does not fit or the wait times out
+        """
+        self._check_budget(nbytes)
+        timeout = self.timeout if timeout is None else timeout
+        with self._cond:
+            if nbytes > self.free:
+                metrics.ADMISSIONS.inc(result="queued")
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: nbytes <= self.free, timeout=max(timeout, 0.0))
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    metrics.ADMISSIONS.inc(result="rejected")
+                    raise AdmissionRejected(f"Timed out after {timeout:.0f}s waiting for "
+                                            f"{nbytes / MB:.0f} MB of memory")
+            self._take(job_id, nbytes)
+        metrics.ADMISSIONS.inc(result="admitted")
+
+    async def acquire_async(self, job_id: str, nbytes: int, timeout: Optional[float] = None):
+        """
+        acquire() for the event loop: waits without blocking a thread
+
+        Raises:
+            AdmissionRejected: if the job does not fit or the wait times out
+        """
+        self._check_budget(nbytes)
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(timeout, 0.0)
+        queued = False
+        try:
+            while True:
+                with self._cond:
+                    if nbytes <= self.free:
+                        self._take(job_id, nbytes)
+                        break
+                    if not queued:
+                        metrics.ADMISSIONS.inc(result="queued")
+                        self.waiting += 1
+                        queued = True
+                    wake = loop.create_future()
+                    self._async_waiters.append((loop, wake))
+                try:
+                    await asyncio.wait_for(wake, timeout=max(deadline - loop.time(), 0.0))
+                except asyncio.TimeoutError:
+                    metrics.ADMISSIONS.inc(result="rejected")
+                    raise AdmissionRejected(f"Timed out after {timeout:.0f}s waiting for "
+                                            f"{nbytes / MB:.0f} MB of memory")
+        finally:
+            if queued:
+                with self._cond:
+                    self.waiting -= 1
+        metrics.ADMISSIONS.inc(result="admitted")
+
+    def release(self, job_id: str, nbytes: int):
+        with self._cond:
+            self.reserved -= nbytes
+            self.jobs[job_id] = self.jobs.get(job_id, 0) - nbytes
+            if self.jobs[job_id] <= 0:
+                del self.jobs[job_id]
+            metrics.MEMORY_RESERVED.set(self.reserved)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, wake in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, wake)
+            except RuntimeError:
+                # That caller's event loop has closed
+                pass
+
+    @contextmanager
+    def reserve(self, job_id: str, nbytes: int, timeout: Optional[float] = None):
+        """acquire() for the duration of the block"""
+        self.acquire(job_id, nbytes, timeout)
+        try:
+            yield
+        finally:
+            self.release(job_id, nbytes)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def create_admission() -> MemoryAdmission:
+    """Admission controller configured from the environment"""
+    return MemoryAdmission(int(MEMORY_BUDGET_MB * MB), timeout=ADMISSION_TIMEOUT)
@@ -0,0 +1,264 @@
+"""
+Header-only container probe shared by the decoder and the metadata engine
+
+For MP4/MOV files only the top-level box headers and the `moov` box are
+read (the media data is skipped with seeks), which yields codec, fps, frame
+count, duration, dimensions and encoder tags. Other containers fall back to
+pymediainfo (if installed) and OpenCV. Each job probes its file once and
+passes the result to the sampler and the metadata engine; nothing is
+cached across jobs, since every job has its own copy of the video.
+"""
+import io
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import cv2
+
+from utils.tracing import traced
+
+try:
+    import exifread
+except ImportError:
+    exifread = None
+
+try:
+    from pymediainfo import MediaInfo
+except ImportError:
+    MediaInfo = None
+
+HASH_CHUNK = 64 * 1024      # Bytes read from the file head (EXIF)
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+MP4_EPOCH_OFFSET = 2082844800  # Seconds between 1904-01-01 and 1970-01-01
+ENCODER_TAGS = ('©too', '©enc', '©swr', 'encoder')
+
+
+@dataclass
+class ProbeResult:
+    """What the container says about the video stream"""
+    container: str = 'unknown'
+    source: str = 'none'            # mp4 | mediainfo | opencv
+    codec: Optional[str] = None     # Sample entry fourcc, e.g. avc1, hvc1, mp4v
+    fps: float = 0.0
+    frame_count: int = 0
+    duration: float = 0.0           # Seconds
+    width: int = 0
+    height: int = 0
+    encoder: Optional[str] = None   # Container tags (©too...); not the video track's encoding library
+    creation_time: Optional[float] = None  # Unix time
+    tags: Dict[str, str] = field(default_factory=dict)
+    # EXIF tag names found in the file header (None when exifread is missing)
+    exif_tags: Optional[List[str]] = None
+    exif_error: bool = False
+    error: Optional[str] = None
+
+
+def _box_headers(read, start: int, end: int):
+    """Yields (type, content_start, box_end) for the boxes in [start, end)"""
+    pos = start
+    while pos + 8 <= end:
+        header = read(pos, 16)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack('>I4s', header[:8])
+        offset = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack('>Q', header[8:16])[0]
+            offset = 16
+        elif size == 0:
+            size = end - pos
+        if size < offset:
+            return
+        yield kind.decode('latin-1'), pos + offset, min(pos + size, end)
+        pos += size
+
+
+def _children(data: bytes, start: int, end: int):
+    return _box_headers(lambda pos, n: data[pos:pos + n], start, end)
+
+
+def _find(data: bytes, start: int, end: int, path: List[str]):
+    """Content range of the first box at `path` below [start, end), or None"""
+    for kind, content, box_end in _children(data, start, end):
+        if kind == path[0]:
+            return (content, box_end) if len(path) == 1 else _find(data, content, box_end, path[1:])
+    return None
+
+
+def _times(data: bytes, content: int):
+    """(timescale, duration, creation) from an mvhd/mdhd full box"""
+    if data[content] == 1:
+        creation, _, timescale, duration = struct.unpack('>QQIQ', data[content + 4:content + 32])
+    else:
+        creation, _, timescale, duration = struct.unpack('>IIII', data[content + 4:content + 20])
+    return timescale, duration, creation
+
+
+def _text_tags(data: bytes, start: int, end: int) -> Dict[str, str]:
+    """iTunes-style (meta/ilst) and QuickTime (©xyz) text tags under udta"""
+    tags = {}
+    for kind, content, box_end in _children(data, start, end):
+        if kind == 'meta':
+            # ISO meta is a full box; QuickTime's has no version/flags
+            first = content if data[content + 4:content + 8] == b'hdlr' else content + 4
+            found = _find(data, first, box_end, ['ilst'])
+            if found:
+                for item, item_start, item_end in _children(data, *found):
+                    value = _find(data, item_start, item_end, ['data'])
+                    if value:
+                        tags[item] = data[value[0] + 8:value[1]].decode('utf-8', 'replace').strip('\x00 ')
+        elif kind.startswith('©') and box_end - content > 4:
+            length = struct.unpack('>H', data[content:content + 2])[0]
+            tags[kind] = data[content + 4:content + 4 + length].decode('utf-8', 'replace').strip('\x00 ')
+    return tags
+
+
+def _parse_moov(data: bytes, result: ProbeResult):
+    movie = _find(data, 0, len(data), ['mvhd'])
+    if movie:
+        timescale, duration, creation = _times(data, movie[0])
+        if timescale:
+            result.duration = duration / timescale
+        if creation > MP4_EPOCH_OFFSET:
+            result.creation_time = float(creation - MP4_EPOCH_OFFSET)
+
+    for kind, content, end in _children(data, 0, len(data)):
+        if kind == 'udta':
+            result.tags.update(_text_tags(data, content, end))
+        elif kind == 'meta':
+            result.tags.update(_text_tags(data, content - 8, end))
+        if kind != 'trak':
+            continue
+        handler = _find(data, content, end, ['mdia', 'hdlr'])
+        if not handler or data[handler[0] + 8:handler[0] + 12] != b'vide' or result.codec:
+            continue
+
+        header = _find(data, content, end, ['tkhd'])
+        if header:
+            offset = header[0] + (88 if data[header[0]] == 1 else 76)
+            width, height = struct.unpack('>II', data[offset:offset + 8])
+            result.width, result.height = width >> 16, height >> 16
+
+        media = _find(data, content, end, ['mdia', 'mdhd'])
+        timescale = _times(data, media[0])[0] if media else 0
+
+        table = _find(data, content, end, ['mdia', 'minf', 'stbl'])
+        if not table:
+            continue
+        sample_desc = _find(data, table[0], table[1], ['stsd'])
+        if sample_desc:
+            entry = sample_desc[0] + 8
+            result.codec = data[entry + 4:entry + 8].decode('latin-1')
+            name_length = data[entry + 50] if entry + 50 < sample_desc[1] else 0
+            compressor = data[entry + 51:entry + 51 + min(name_length, 31)].decode('latin-1').strip('\x00 ')
+            if compressor:
+                result.tags.setdefault('compressor', compressor)
+        time_to_sample = _find(data, table[0], table[1], ['stts'])
+        if time_to_sample:
+            count = struct.unpack('>I', data[time_to_sample[0] + 4:time_to_sample[0] + 8])[0]
+            entries = struct.unpack(f'>{count * 2}I', data[time_to_sample[0] + 8:time_to_sample[0] + 8 + count * 8])
+            samples = sum(entries[0::2])
+            ticks = sum(n * delta for n, delta in zip(entries[0::2], entries[1::2]))
+            result.frame_count = samples
+            if ticks and timescale:
+                result.fps = samples * timescale / ticks
+
+
+def _probe_mp4(handle, size: int) -> Optional[ProbeResult]:
+    def read(pos, n):
+        handle.seek(pos)
+        return handle.read(n)
+
+    boxes = list(_box_headers(read, 0, size))
+    if not boxes or boxes[0][0] not in ('ftyp', 'moov', 'mdat', 'free', 'wide', 'skip'):
+        return None
+    result = ProbeResult(container='mp4', source='mp4')
+    for kind, content, end in boxes:
+        if kind == 'ftyp':
+            result.tags['major_brand'] = read(content, 4).decode('latin-1')
+        elif kind == 'moov':
+            if end - content > MAX_MOOV_SIZE:
+                result.error = 'moov box too large'
+                return result
+            _parse_moov(read(content, end - content), result)
+    if not result.codec:
+        result.error = 'no video track in moov'
+    return result
+
+
+def _probe_fallback(video_path: str) -> ProbeResult:
+    """Non-MP4 containers: MediaInfo for tags when available, OpenCV for stream info"""
+    result = ProbeResult(source='opencv')
+    if MediaInfo is not None:
+        try:
+            for track in MediaInfo.parse(video_path).tracks:
+                if track.track_type == 'General':
+                    result.container = str(track.format or 'unknown').lower()
+                    result.tags.update({k: str(v) for k, v in (('writing_application', track.writing_application),
+                                                               ('encoded_library_name', track.encoded_library_name))
+                                        if v})
+                elif track.track_type == 'Video' and result.codec is None:
+                    result.source = 'mediainfo'
+                    result.codec = str(track.codec_id or track.format or '') or None
+                    if track.encoded_library_name:
+                        result.tags['encoder'] = str(track.encoded_library_name)
+        except Exception as e:
+            result.error = str(e)
+
+    cap = cv2.VideoCapture(video_path)
+    if cap.isOpened():
+        result.fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+        result.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        result.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        result.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if result.fps:
+            result.duration = result.frame_count / result.fps
+        if result.codec is None:
+            fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+            result.codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00') or None
+    elif result.error is None:
+        result.error = 'unreadable container'
+    cap.release()
+    return result
+
+
+def _exif(result: ProbeResult, head: bytes):
+    if exifread is None:
+        return
+    try:
+        tags = exifread.process_file(io.BytesIO(head), details=False)
+        result.exif_tags = sorted(tags)
+    except Exception:
+        result.exif_error = True
+
+
+@traced("probe")
+def probe_container(video_path: str) -> ProbeResult:
+    """
+    Probe a video file once, reading only headers
+
+    Args:
+        video_path: Path to the video file
+
+    Returns:
+        ProbeResult; `error` is set when the container could not be parsed
+    """
+    with open(video_path, 'rb') as handle:
+        size = os.fstat(handle.fileno()).st_size
+        head = handle.read(HASH_CHUNK)
+        try:
+            result = _probe_mp4(handle, size)
+        except (struct.error, IndexError, ValueError) as e:
+            result = ProbeResult(container='mp4', source='mp4', error=f'malformed mp4: {e}')
+
+    if result is None or result.error:
+        fallback = _probe_fallback(video_path)
+        if result is not None:
+            fallback.tags = dict(result.tags, **fallback.tags)
+        result = fallback
+    result.encoder = next((result.tags[t] for t in ENCODER_TAGS if result.tags.get(t)), None)
+    _exif(result, head)
+    return result
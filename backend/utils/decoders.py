@@ -0,0 +1,180 @@
+"""
+Pluggable video decode backends
+
+PyAV (FFmpeg) decodes with codec threads, can skip every non-key frame when
+only a few well-spread frames are needed, and converts straight to the
+requested size and pixel format in swscale. OpenCV is the fallback when
+PyAV is not installed; it decodes exact frames and resizes afterwards.
+Both return frames as 'bgr24' (H, W, 3) or 'gray' (H, W) uint8 arrays.
+"""
+import os
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from utils.frame_views import fit_max_side
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# auto | pyav | opencv
+DECODE_BACKEND = os.environ.get("VERIFAI_DECODE_BACKEND", "auto")
+# Codec threads per decoder (0: let the backend choose)
+DECODE_THREADS = int(os.environ.get("VERIFAI_DECODE_THREADS", "0"))
+# Representative frames may be snapped to the nearest preceding key frame
+KEYFRAME_SAMPLING = os.environ.get("VERIFAI_KEYFRAME_SAMPLING", "1") == "1"
+
+
+def target_size(width: int, height: int, max_side: Optional[int]) -> Tuple[int, int]:
+    """(width, height) after fit_max_side's downscale (never upscales)"""
+    longest = max(width, height)
+    if not max_side or longest <= max_side:
+        return width, height
+    scale = max_side / longest
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+class OpenCVDecoder:
+    """cv2.VideoCapture decoding; seeks always land on the exact frame"""
+    name = 'opencv'
+    keyframe_seek = False
+
+    def __init__(self, threads: int = DECODE_THREADS):
+        self.threads = threads
+
+    def open(self, video_path: str) -> cv2.VideoCapture:
+        if self.threads > 0:
+            return cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_N_THREADS, self.threads])
+        return cv2.VideoCapture(video_path)
+
+    @staticmethod
+    def _convert(frame: np.ndarray, max_side: Optional[int], pix_fmt: str) -> np.ndarray:
+        frame = fit_max_side(frame, max_side)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if pix_fmt == 'gray' else frame
+
+    def frames(self, video_path: str, hop: int = 1, max_side: Optional[int] = None,
+               pix_fmt: str = 'bgr24') -> Iterator[np.ndarray]:
+        """Every `hop`-th frame; skipped frames are grabbed but never converted to BGR"""
+        cap = self.open(video_path)
+        try:
+            count = 0
+            while cap.grab():
+                if count % hop == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    yield self._convert(frame, max_side, pix_fmt)
+                count += 1
+        finally:
+            cap.release()
+
+    def keyframes(self, video_path: str, positions: Sequence[int], max_side: Optional[int] = None,
+                  pix_fmt: str = 'bgr24') -> List[Tuple[int, np.ndarray]]:
+        """
+        Frames at `positions` (OpenCV cannot restrict decoding to key frames,
+        so these are the exact frames)
+
+        Returns:
+            (frame position, frame) pairs for the positions that could be read
+        """
+        cap = self.open(video_path)
+        decoded = []
+        try:
+            for position in positions:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+                ret, frame = cap.read()
+                if ret:
+                    decoded.append((int(position), self._convert(frame, max_side, pix_fmt)))
+        finally:
+            cap.release()
+        return decoded
+
+
+class PyAVDecoder:
+    """FFmpeg through PyAV: threaded decoding, key-frame-only seeks, swscale output"""
+    name = 'pyav'
+    keyframe_seek = True
+
+    def __init__(self, threads: int = DECODE_THREADS):
+        self.threads = threads
+
+    def open(self, video_path: str):
+        container = av.open(video_path)
+        stream = container.streams.video[0]
+        # Frame and slice threads inside the codec
+        stream.thread_type = 'AUTO'
+        if self.threads > 0:
+            stream.codec_context.thread_count = self.threads
+        return container, stream
+
+    @staticmethod
+    def _convert(frame, max_side: Optional[int], pix_fmt: str) -> np.ndarray:
+        width, height = target_size(frame.width, frame.height, max_side)
+        return frame.to_ndarray(width=width, height=height, format=pix_fmt, interpolation='AREA')
+
+    def frames(self, video_path: str, hop: int = 1, max_side: Optional[int] = None,
+               pix_fmt: str = 'bgr24') -> Iterator[np.ndarray]:
+        """Every `hop`-th frame, scaled and converted during the colourspace conversion"""
+        container, stream = self.open(video_path)
+        try:
+            for count, frame in enumerate(container.decode(stream)):
+                if count % hop == 0:
+                    yield self._convert(frame, max_side, pix_fmt)
+        finally:
+            container.close()
+
+    def keyframes(self, video_path: str, positions: Sequence[int], max_side: Optional[int] = None,
+                  pix_fmt: str = 'bgr24') -> List[Tuple[int, np.ndarray]]:
+        """
+        The key frame at or before each of `positions`
+
+        Only key frames are decoded (the codec skips everything else), so each
+        read costs one intra frame however far it is from the previous one.
+
+        Returns:
+            (frame position, frame) pairs in order, without duplicates
+        """
+        container, stream = self.open(video_path)
+        stream.codec_context.skip_frame = 'NONKEY'
+        rate = float(stream.average_rate or stream.guessed_rate or 0) or 25.0
+        start = stream.start_time or 0
+        decoded, seen = [], set()
+        try:
+            for position in positions:
+                container.seek(start + int(position / rate / stream.time_base), stream=stream,
+                               backward=True, any_frame=False)
+                frame = next(container.decode(stream), None)
+                if frame is None or frame.pts is None:
+                    continue
+                actual = int(round((frame.pts - start) * stream.time_base * rate))
+                if actual not in seen:
+                    seen.add(actual)
+                    decoded.append((actual, self._convert(frame, max_side, pix_fmt)))
+        finally:
+            container.close()
+        return decoded
+
+
+_decoders = {}
+
+
+def get_decoder(name: str = DECODE_BACKEND):
+    """
+    Decode backend by name (one shared, stateless instance per name)
+
+    Args:
+        name: 'pyav', 'opencv' or 'auto' (PyAV when installed)
+    """
+    decoder = _decoders.get(name)
+    if decoder is None:
+        if name in ('auto', 'pyav') and av is not None:
+            decoder = PyAVDecoder()
+        else:
+            if name == 'pyav':
+                print("⚠️ PyAV is not installed, decoding with OpenCV")
+            decoder = OpenCVDecoder()
+        _decoders[name] = decoder
+    return decoder
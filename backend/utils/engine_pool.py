@@ -0,0 +1,86 @@
+"""
+Process pool for the CPU-heavy forensic and temporal engines
+
+Frames reach the workers through a SharedFrameBuffer, so only a small
+handle and a few indices are pickled per task. The worker processes are
+the parallelism: inside a task, frame-level work (utils/parallel.py) and
+FFTs run in the worker's own thread, so workers x threads never
+oversubscribes the cores.
+"""
+import multiprocessing
+import os
+from multiprocessing import resource_tracker
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from models.forensic_detector import ForensicDetector
+from models.temporal_detector import TemporalAnalyzer
+from utils.frame_views import FrameViews
+from utils.parallel import inline
+from utils.shared_frames import SharedFrameHandle, run_on_shared_frames
+
+# 0 keeps every engine in the request thread
+ENGINE_PROCESSES = int(os.environ.get("VERIFAI_ENGINE_PROCESSES", "0"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def start_pool(processes: int = ENGINE_PROCESSES) -> Optional[ProcessPoolExecutor]:
+    """
+    Start the pool (call early, before request threads exist)
+
+    Workers are forked so they inherit the already-imported engine modules;
+    a spawned worker would re-import `pipeline.py` and reload the model.
+    """
+    global _pool
+    if processes <= 0 or _pool is not None:
+        return _pool
+    # Workers must share our resource tracker; one of their own would unlink
+    # attached frame buffers when the worker exits
+    resource_tracker.ensure_running()
+    _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("fork"))
+    # Fork every worker now rather than on the first request
+    for future in [_pool.submit(os.getpid) for _ in range(processes)]:
+        future.result()
+    print(f"⚙️ Engine process pool started ({processes} workers)")
+    return _pool
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _views(frames, indices, source_shape):
+    return [FrameViews(frames[i], source_shape=source_shape) for i in indices]
+
+
+def _forensic(frames, indices, source_shape, methods):
+    detector = ForensicDetector()
+    with inline():
+        return detector.detect_frames(_views(frames, indices, source_shape), methods=methods)
+
+
+def _temporal(frames, run_indices, source_shape, methods, flow_max_side):
+    runs = [_views(frames, indices, source_shape) for indices in run_indices]
+    sequence = [view for run in runs for view in run]
+    with inline():
+        return TemporalAnalyzer().detect_all_temporal(sequence, runs=runs, methods=methods,
+                                                      flow_max_side=flow_max_side)
+
+
+def forensic_task(handle: SharedFrameHandle, indices: List[int], methods: Optional[List[str]] = None):
+    """Forensic analysis of frames[indices] inside a worker process"""
+    return run_on_shared_frames(handle, _forensic, indices, handle.source_shape, methods)
+
+
+def temporal_task(handle: SharedFrameHandle, run_indices: List[List[int]],
+                  methods: Optional[List[str]] = None, flow_max_side: Optional[int] = None):
+    """Temporal analysis of contiguous runs (lists of frame indices) inside a worker"""
+    return run_on_shared_frames(handle, _temporal, run_indices, handle.source_shape, methods, flow_max_side)
@@ -0,0 +1,105 @@
+"""
+Ensemble scoring shared by the live pipeline and offline re-scoring
+"""
+import numpy as np
+
+# Engine weights for the base score (spatial, temporal, forensic, metadata)
+WEIGHTS = {'spatial': 0.35, 'temporal': 0.30, 'forensic': 0.25, 'metadata': 0.10}
+# Bit order of the engine masks stored per job (utils/feature_store.py)
+ENGINES = ('spatial', 'temporal', 'forensic', 'metadata')
+
+# Red Flag: if Spatial or Forensic is extremely confident, AI detection is likely
+# even if other engines (like Temporal) are confused by video quality.
+RED_FLAGS = {'spatial': 0.8, 'forensic': 0.75}
+RED_FLAG_BOOST = 0.2
+
+# Classification threshold back to 0.50 for better sensitivity
+AI_THRESHOLD = 0.50
+
+
+def final_score(spatial, temporal, forensic, metadata, weights=None, red_flags=None,
+                boost=RED_FLAG_BOOST):
+    """
+    Weighted ensemble plus red-flag boost
+
+    Works on plain floats or on NumPy arrays (one element per job), so the
+    same code scores a single request or millions of stored jobs.
+    """
+    weights = WEIGHTS if weights is None else weights
+    red_flags = RED_FLAGS if red_flags is None else red_flags
+    scores = {'spatial': spatial, 'temporal': temporal, 'forensic': forensic, 'metadata': metadata}
+
+    base = sum(np.asarray(scores[name], dtype=np.float64) * w for name, w in weights.items())
+
+    flagged = np.zeros_like(base, dtype=bool)
+    for name, threshold in red_flags.items():
+        flagged |= np.asarray(scores[name]) > threshold
+    result = base + np.where(flagged, boost, 0.0)
+    result = np.where(np.isfinite(result), result, 0.0)
+    return float(result) if np.ndim(result) == 0 else result
+
+
+def renormalized(engines, weights=None, red_flags=None):
+    """
+    Weights and red flags restricted to the engines that actually ran
+
+    Used for partial (deadline-limited) analyses: the remaining weights are
+    rescaled to sum to 1 so the score stays on the same 0-1 scale.
+
+    Returns:
+        (weights, red_flags) to pass to final_score
+    """
+    weights = WEIGHTS if weights is None else weights
+    red_flags = RED_FLAGS if red_flags is None else red_flags
+    kept = {name: w for name, w in weights.items() if name in engines}
+    total = sum(kept.values())
+    kept = {name: w / total for name, w in kept.items()} if total > 0 else {}
+    return kept, {name: t for name, t in red_flags.items() if name in engines}
+
+
+def engine_mask(engines) -> int:
+    """Bitmask of the engines that ran (bit i is ENGINES[i])"""
+    return sum(1 << i for i, name in enumerate(ENGINES) if name in engines)
+
+
+def job_weights(masks, weights=None, red_flags=None):
+    """
+    Vectorised `renormalized` over many jobs
+
+    Args:
+        masks: Engine bitmask per job (see engine_mask)
+
+    Returns:
+        (weights, red_flags) for final_score: per-job weight arrays, and red
+        flag thresholds that are infinite for jobs whose engine didn't run
+    """
+    weights = WEIGHTS if weights is None else weights
+    red_flags = RED_FLAGS if red_flags is None else red_flags
+    masks = np.asarray(masks, dtype=np.int64)
+    ran = {name: (masks >> i) & 1 == 1 for i, name in enumerate(ENGINES)}
+    kept = {name: np.where(ran[name], w, 0.0) for name, w in weights.items()}
+    total = sum(kept.values())
+    scale = np.divide(1.0, total, out=np.zeros_like(total), where=total > 0)
+    return ({name: w * scale for name, w in kept.items()},
+            {name: np.where(ran[name], t, np.inf) for name, t in red_flags.items()})
+
+
+def score_range(scores, engines, weights=None, red_flags=None, boost=RED_FLAG_BOOST):
+    """
+    Lowest and highest full-ensemble score when only `engines` were measured
+
+    Engines that did not run are set to 0 and 1 respectively, which bounds
+    what the complete analysis could have returned.
+    """
+    low, high = dict(scores), dict(scores)
+    for name in WEIGHTS:
+        if name not in engines:
+            low[name], high[name] = 0.0, 1.0
+    return (final_score(**low, weights=weights, red_flags=red_flags, boost=boost),
+            final_score(**high, weights=weights, red_flags=red_flags, boost=boost))
+
+
+def classify(score, threshold=AI_THRESHOLD):
+    if np.ndim(score) == 0:
+        return "AI-Generated" if score > threshold else "Real"
+    return np.where(np.asarray(score) > threshold, "AI-Generated", "Real")
@@ -0,0 +1,137 @@
+"""
+Append-only, memory-mapped store of per-job and per-frame features
+
+Layout (one directory):
+    jobs.bin    fixed-width records (JOB_DTYPE), one per job, memory-mappable
+    frames.bin  float32 blocks of per-frame features referenced by offset
+
+Re-scoring reads `jobs.bin` as a single NumPy structured array, so new
+ensemble weights or thresholds can be evaluated over millions of jobs
+without touching the videos again. Each record also keeps how its job was
+scored (engines that ran, effective weights, score floor).
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from utils import ensemble
+
+try:
+    import fcntl  # Serialises appends across worker processes (POSIX only)
+except ImportError:
+    fcntl = None
+
+FEATURE_STORE_DIR = os.environ.get(
+    "VERIFAI_FEATURE_STORE", os.path.join(os.path.dirname(os.path.dirname(__file__)), "feature_store"))
+
+JOB_DTYPE = np.dtype([
+    ('job_id', 'S36'),
+    ('timestamp', '<f8'),
+    # Engine scores used by the ensemble
+    ('spatial', '<f4'), ('temporal', '<f4'), ('forensic', '<f4'), ('metadata', '<f4'),
+    ('final_confidence', '<f4'),
+    # Sub-detector breakdown
+    ('motion_smoothness', '<f4'), ('lip_sync', '<f4'), ('blink_pattern', '<f4'),
+    ('frequency', '<f4'), ('gan', '<f4'), ('diffusion', '<f4'), ('compression', '<f4'),
+    # Per-frame block in frames.bin: spatial | flow | mouth | blink | forensic (N x 4)
+    ('frames_offset', '<i8'),
+    ('n_spatial', '<i4'), ('n_flow', '<i4'), ('n_mouth', '<i4'), ('n_blink', '<i4'), ('n_forensic', '<i4'),
+    # How the job was scored: engines that ran (ensemble.ENGINES bitmask), the
+    # effective (renormalised) weights and any floor applied to the ensemble
+    ('engines', 'u1'),
+    ('w_spatial', '<f4'), ('w_temporal', '<f4'), ('w_forensic', '<f4'), ('w_metadata', '<f4'),
+    ('score_floor', '<f4'),
+])
+
+FORENSIC_COLUMNS = ('frequency', 'gan', 'diffusion', 'compression')
+SEQUENCES = ('spatial', 'flow', 'mouth', 'blink')
+
+
+class FeatureStore:
+    """Writes and reads job features under `root`"""
+
+    def __init__(self, root: str = FEATURE_STORE_DIR):
+        self.root = root
+        self.jobs_path = os.path.join(root, "jobs.bin")
+        self.frames_path = os.path.join(root, "frames.bin")
+        self._lock = threading.Lock()
+
+    def append(self, job_id: str, timestamp: float, scores: Dict[str, float],
+               breakdown: Dict[str, float], sequences: Dict[str, list], forensic_frames: list,
+               engines=ensemble.ENGINES, weights: Optional[Dict[str, float]] = None, score_floor: float = 0.0):
+        """
+        Store one job
+
+        Args:
+            job_id: Analysis job id
+            timestamp: Unix time of the analysis
+            scores: spatial/temporal/forensic/metadata/final_confidence
+            breakdown: Sub-detector scores (temporal and mean forensic breakdown)
+            sequences: Per-frame 'spatial', 'flow', 'mouth' and 'blink' values
+            forensic_frames: Per-frame forensic breakdown dicts
+            engines: Engines that contributed to the verdict
+            weights: Ensemble weights actually used (default: ensemble.WEIGHTS)
+            score_floor: Lower bound applied to the ensemble score, if any
+        """
+        arrays = [np.asarray(sequences.get(name) or [], dtype=np.float32).ravel() for name in SEQUENCES]
+        forensic = np.asarray([[f.get(c, 0.0) for c in FORENSIC_COLUMNS] for f in forensic_frames],
+                              dtype=np.float32).reshape(-1, len(FORENSIC_COLUMNS))
+        block = np.concatenate(arrays + [forensic.ravel()])
+
+        record = np.zeros(1, dtype=JOB_DTYPE)
+        record['job_id'] = job_id.encode()[:36]
+        record['timestamp'] = timestamp
+        for name, value in list(scores.items()) + list(breakdown.items()):
+            if name in JOB_DTYPE.names:
+                record[name] = value
+        record['n_spatial'], record['n_flow'], record['n_mouth'], record['n_blink'] = [len(a) for a in arrays]
+        record['n_forensic'] = len(forensic)
+        record['engines'] = ensemble.engine_mask(engines)
+        for name, w in (weights or ensemble.WEIGHTS).items():
+            record[f'w_{name}'] = w
+        record['score_floor'] = score_floor
+
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(self.frames_path, "ab") as frames_file, open(self.jobs_path, "ab") as jobs_file:
+            if fcntl is not None:
+                fcntl.flock(jobs_file, fcntl.LOCK_EX)
+            try:
+                # Frames are written first so a job record never points past the data
+                frames_file.seek(0, os.SEEK_END)
+                record['frames_offset'] = frames_file.tell() // 4
+                frames_file.write(block.tobytes())
+                frames_file.flush()
+                jobs_file.write(record.tobytes())
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(jobs_file, fcntl.LOCK_UN)
+
+    def jobs(self) -> np.ndarray:
+        """All job records as a read-only memory-mapped structured array"""
+        if not os.path.exists(self.jobs_path) or os.path.getsize(self.jobs_path) < JOB_DTYPE.itemsize:
+            return np.zeros(0, dtype=JOB_DTYPE)
+        count = os.path.getsize(self.jobs_path) // JOB_DTYPE.itemsize
+        return np.memmap(self.jobs_path, dtype=JOB_DTYPE, mode='r', shape=(count,))
+
+    def frame_features(self, job_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """Per-frame features of one job (latest record wins if stored twice)"""
+        jobs = self.jobs()
+        matches = np.nonzero(jobs['job_id'] == job_id.encode())[0]
+        if len(matches) == 0:
+            return None
+        record = jobs[matches[-1]]
+
+        frames = np.memmap(self.frames_path, dtype='<f4', mode='r')
+        offset = int(record['frames_offset'])
+        features = {}
+        for name in SEQUENCES:
+            length = int(record[f'n_{name}'])
+            features[name] = np.array(frames[offset:offset + length])
+            offset += length
+        n_forensic = int(record['n_forensic'])
+        block = np.array(frames[offset:offset + n_forensic * len(FORENSIC_COLUMNS)])
+        features['forensic'] = block.reshape(n_forensic, len(FORENSIC_COLUMNS))
+        features['blink'] = features['blink'].astype(bool)
+        return features
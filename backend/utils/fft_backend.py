@@ -0,0 +1,133 @@
+"""
+Real-input FFT layer for the forensic engine
+
+Frames are real, so their spectrum is Hermitian: |F[u, v]| == |F[-u, -v]|.
+`rfft2` computes only the non-negative column frequencies (about half the
+work and half the memory of `fft2`), and any sum over the full spectrum is
+recovered exactly by weighting each half-spectrum column by how many
+full-spectrum columns it stands for. Masks are built once per frame shape
+and folded into half-spectrum weights, so detectors never materialise the
+full or shifted spectrum.
+
+scipy.fft is used when installed (multithreaded with `workers`, cached
+plans); otherwise numpy.fft, which also caches its plans. Transforms run
+single-threaded inside the frame pool, whose threads already fill the cores.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from utils import parallel
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+# auto | scipy | numpy
+FFT_BACKEND = os.environ.get("VERIFAI_FFT_BACKEND", "auto")
+# Threads per transform with scipy outside the frame pool (-1: all cores)
+FFT_WORKERS = int(os.environ.get("VERIFAI_FFT_WORKERS", str(parallel.THREAD_BUDGET)))
+
+
+def _use_scipy() -> bool:
+    return scipy_fft is not None and FFT_BACKEND in ("auto", "scipy")
+
+
+def rfft2(x: np.ndarray) -> np.ndarray:
+    """
+    2D FFT of a real (rows, cols) array: (rows, cols//2 + 1) non-negative column frequencies
+
+    Precision follows the input like np.fft.fft2 (float32 -> complex64).
+    Transform channels one at a time: contiguous planes are faster than a
+    strided transform over interleaved BGR.
+    """
+    if _use_scipy():
+        return scipy_fft.rfft2(x, workers=1 if parallel.nested() else FFT_WORKERS)
+    return np.fft.rfft2(x)
+
+
+def rfft2_magnitude(x: np.ndarray) -> np.ndarray:
+    """|rfft2(x)|"""
+    return np.abs(rfft2(x))
+
+
+@lru_cache(maxsize=32)
+def hermitian_weights(rows: int, cols: int) -> np.ndarray:
+    """
+    (rows, cols//2 + 1) multiplicities of half-spectrum columns
+
+    Column 0 (and cols/2 for even widths) map to themselves; every other
+    column also stands for its mirrored column, so it counts twice.
+    """
+    weights = np.full(cols // 2 + 1, 2.0)
+    weights[0] = 1.0
+    if cols % 2 == 0:
+        weights[-1] = 1.0
+    weights = np.broadcast_to(weights, (rows, cols // 2 + 1))
+    weights.flags.writeable = False
+    return weights
+
+
+def fold_mask(mask: np.ndarray) -> np.ndarray:
+    """
+    Half-spectrum weights equivalent to a full-spectrum (unshifted) mask
+
+    sum(|F| * mask) == sum(|R| * fold_mask(mask)) for the rfft2 R of any
+    real input: each half-spectrum bin adds the mask at its own position
+    and, for doubled columns, at its conjugate (-u, -v).
+    """
+    rows, cols = mask.shape
+    half = cols // 2 + 1
+    mask = mask.astype(np.float64)
+    folded = mask[:, :half].copy()
+    # Conjugate positions of columns 1 .. (cols-1)//2: rows -u, columns cols - v
+    doubled = np.arange(1, (cols + 1) // 2)
+    conj_rows = (-np.arange(rows)) % rows
+    folded[:, doubled] += mask[np.ix_(conj_rows, cols - doubled)]
+    return folded
+
+
+@lru_cache(maxsize=32)
+def high_pass_weights(rows: int, cols: int, radius: int) -> np.ndarray:
+    """
+    Half-spectrum weights of the square low-frequency block mask
+
+    The mask zeroes `[c - radius, c + radius)` around the centre of the
+    fftshift-ed spectrum (same slicing as before, including its behaviour on
+    tiny frames) and is moved back to unshifted order with ifftshift.
+    """
+    mask = np.ones((rows, cols), np.uint8)
+    crow, ccol = rows // 2, cols // 2
+    mask[crow - radius:crow + radius, ccol - radius:ccol + radius] = 0
+    weights = fold_mask(np.fft.ifftshift(mask))
+    weights.flags.writeable = False
+    return weights
+
+
+def spectrum_sum(magnitude: np.ndarray, weights: np.ndarray) -> float:
+    """Full-spectrum sum of a half-spectrum magnitude"""
+    return float(np.einsum('ij,ij->', weights, magnitude, dtype=np.float64))
+
+
+def spectrum_correlation(a: np.ndarray, b: np.ndarray, weights: np.ndarray, size: int) -> float:
+    """
+    Pearson correlation of two full-spectrum magnitudes from their halves
+
+    Equal to np.corrcoef(full_a.ravel(), full_b.ravel())[0, 1].
+
+    Args:
+        a, b: Half-spectrum magnitudes
+        weights: hermitian_weights for their shape
+        size: Number of full-spectrum bins (rows * cols)
+    """
+    a = a.astype(np.float64, copy=False)
+    b = b.astype(np.float64, copy=False)
+    mean_a = spectrum_sum(a, weights) / size
+    mean_b = spectrum_sum(b, weights) / size
+    da, db = a - mean_a, b - mean_b
+    cov = np.einsum('ij,ij,ij->', weights, da, db)
+    var_a = np.einsum('ij,ij,ij->', weights, da, da)
+    var_b = np.einsum('ij,ij,ij->', weights, db, db)
+    return float(cov / np.sqrt(var_a * var_b))
@@ -0,0 +1,163 @@
+"""
+Frames captured client-side from a playing <video> element
+
+Instead of uploading the file (or having us re-download it), the browser
+extension draws a few short bursts of consecutive frames from the page's
+player onto a canvas and sends them as base64 JPEG/WebP images with their
+media timestamps. Here they are decoded straight into FrameViews - no video
+download, container probe or seek-and-decode - and the bursts are recovered
+from the timestamps so the temporal engine still sees contiguous runs.
+Image sizes are read from the headers first, so an oversized frame or batch
+is rejected before any pixel is decoded.
+"""
+import base64
+import binascii
+import io
+import os
+import warnings
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.frame_views import FrameViews
+from utils.parallel import parallel_map
+
+# Most frames one request may carry
+CAPTURE_MAX_FRAMES = int(os.environ.get("VERIFAI_CAPTURE_MAX_FRAMES", "48"))
+# Largest encoded frame accepted, in KB
+CAPTURE_MAX_FRAME_KB = int(os.environ.get("VERIFAI_CAPTURE_MAX_FRAME_KB", "512"))
+# Largest decoded frame side accepted, in pixels
+CAPTURE_MAX_SIDE = int(os.environ.get("VERIFAI_CAPTURE_MAX_SIDE", "1024"))
+# Largest decoded (BGR) size of a whole batch, in MB
+CAPTURE_MAX_BATCH_MB = int(os.environ.get("VERIFAI_CAPTURE_MAX_BATCH_MB", "64"))
+# Frames closer than this (seconds of media time) belong to the same burst. The extension
+# captures bursts at the 5 fps the video sampler uses (0.2 s apart), with longer pauses between bursts
+CAPTURE_RUN_GAP = float(os.environ.get("VERIFAI_CAPTURE_RUN_GAP", "0.4"))
+# Formats cv2.imdecode is given, as named by PIL
+CAPTURE_FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+class CaptureTooLarge(Exception):
+    """A captured frame batch is over the size limits"""
+
+
+def read_frame(data: str) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    Base64-decode one image (optionally a data: URL) and read its size from the header
+
+    No pixel is decoded: PIL only parses the JPEG/PNG/WebP header here.
+
+    Returns:
+        (encoded image, (width, height))
+
+    Raises:
+        CaptureTooLarge: Encoded frame or its dimensions over the limits
+        ValueError: Not a JPEG/WebP/PNG image
+    """
+    if data.startswith("data:"):
+        data = data.partition(",")[2]
+    # Base64 is 4/3 of the payload; check before decoding anything
+    if len(data) * 3 // 4 > CAPTURE_MAX_FRAME_KB * 1024:
+        raise CaptureTooLarge(f"Frames must be at most {CAPTURE_MAX_FRAME_KB} KB each")
+    try:
+        encoded = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Frame is not valid base64")
+    try:
+        # Oversized images are rejected just below; PIL need not warn about them
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(encoded)) as image:
+                image_format, size = image.format, image.size
+    except Image.DecompressionBombError:
+        raise CaptureTooLarge(f"Frames must be at most {CAPTURE_MAX_SIDE}px on their longest side")
+    except Exception:
+        raise ValueError("Frame is not a decodable JPEG/WebP/PNG image")
+    if image_format not in CAPTURE_FORMATS:
+        raise ValueError("Frame is not a decodable JPEG/WebP/PNG image")
+    if max(size) > CAPTURE_MAX_SIDE:
+        raise CaptureTooLarge(f"Frames must be at most {CAPTURE_MAX_SIDE}px on their longest side")
+    return encoded, size
+
+
+def _decode(encoded: bytes) -> np.ndarray:
+    frame = cv2.imdecode(np.frombuffer(encoded, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Frame is not a decodable JPEG/WebP/PNG image")
+    # The header said otherwise (EXIF rotation keeps the longest side)
+    if max(frame.shape[:2]) > CAPTURE_MAX_SIDE:
+        raise CaptureTooLarge(f"Frames must be at most {CAPTURE_MAX_SIDE}px on their longest side")
+    return frame
+
+
+def decode_frame(data: str) -> np.ndarray:
+    """
+    Decode one base64 image (optionally a data: URL) into a BGR array
+
+    Raises:
+        CaptureTooLarge: Encoded or decoded frame over the limits
+        ValueError: Not a decodable image
+    """
+    return _decode(read_frame(data)[0])
+
+
+def decode_frames(frames: Sequence[Tuple[str, Optional[float]]],
+                  source_shape: Optional[Tuple[int, int]] = None) -> List[FrameViews]:
+    """
+    Decode a captured batch into FrameViews ordered by media time
+
+    Args:
+        frames: (base64 image, timestamp in seconds or None) pairs
+        source_shape: (height, width) of the video in the page, so motion is
+            measured in source pixels; defaults to the captured size
+
+    Returns:
+        One FrameViews per frame; frames without a timestamp keep their order
+    """
+    if len(frames) > CAPTURE_MAX_FRAMES:
+        raise CaptureTooLarge(f"At most {CAPTURE_MAX_FRAMES} frames per request")
+    # Every header is checked, and the batch's decoded size added up, before anything is decoded
+    encoded = [read_frame(data) for data, _ in frames]
+    decoded_bytes = sum(width * height * 3 for _, (width, height) in encoded)
+    if decoded_bytes > CAPTURE_MAX_BATCH_MB * 1024 * 1024:
+        raise CaptureTooLarge(f"Frames decode to {decoded_bytes / 1024 / 1024:.0f} MB, over the "
+                              f"{CAPTURE_MAX_BATCH_MB} MB per request")
+    # imdecode releases the GIL, so the batch is spread over the frame pool
+    images = parallel_map(_decode, [image for image, _ in encoded])
+    views = [FrameViews(image, source_shape=source_shape, timestamp=timestamp)
+             for image, (_, timestamp) in zip(images, frames)]
+    if all(view.timestamp is not None for view in views):
+        views.sort(key=lambda view: view.timestamp)
+    return views
+
+
+def group_runs(views: Sequence[FrameViews], max_gap: float = CAPTURE_RUN_GAP) -> List[List[FrameViews]]:
+    """
+    Split frames into bursts of consecutive frames (runs of two or more)
+
+    A batch sent without timestamps is treated as one burst, in the order
+    sent. Frames on their own (a paused video, a single still) form no run.
+    """
+    if all(view.timestamp is None for view in views):
+        runs = [list(views)]
+    else:
+        runs, current = [], []
+        for view in views:
+            consecutive = (current and view.timestamp is not None and current[-1].timestamp is not None
+                           and 0 < view.timestamp - current[-1].timestamp <= max_gap)
+            if current and not consecutive:
+                runs.append(current)
+                current = []
+            current.append(view)
+        runs.append(current)
+    return [run for run in runs if len(run) >= 2]
+
+
+def representative(views: Sequence[FrameViews], count: int) -> List[FrameViews]:
+    """Up to `count` frames spread evenly over the batch (first and last included)"""
+    if len(views) <= count:
+        return list(views)
+    positions = np.unique(np.linspace(0, len(views) - 1, count).round().astype(int))
+    return [views[i] for i in positions]
@@ -0,0 +1,124 @@
+"""
+Cheap frame-similarity gate used to skip redundant model inference
+"""
+import cv2
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.frame_views import as_views
+
+
+class FrameSimilarityGate:
+    """Decides whether a frame is close enough to the last scored frame to reuse its score"""
+
+    def __init__(self, threshold: float = 2.0, size: int = 32):
+        """
+        Args:
+            threshold: Mean absolute difference (0-255 scale) on the downsampled
+                grayscale thumbnail below which two frames count as identical
+            size: Side length of the thumbnail used for the comparison
+        """
+        self.threshold = threshold
+        self.size = size
+        self._reference = None
+
+    def thumbnail(self, frame) -> np.ndarray:
+        gray = as_views(frame).gray(self.size * 8)
+        return cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA)
+
+    def is_similar(self, frame: np.ndarray) -> bool:
+        """Compare against the last frame passed to `update`"""
+        if self._reference is None:
+            return False
+        diff = cv2.absdiff(self.thumbnail(frame), self._reference)
+        return float(np.mean(diff)) < self.threshold
+
+    def update(self, frame: np.ndarray):
+        self._reference = self.thumbnail(frame)
+
+    def reset(self):
+        self._reference = None
+
+
+def gated_scores(frames: List[np.ndarray], score_fn: Callable[[np.ndarray], float],
+                 max_inferences: int = 10, max_candidates: int = 30,
+                 gate: Optional[FrameSimilarityGate] = None,
+                 stop: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Score frames with `score_fn`, reusing the previous score for near-duplicates
+
+    Skipped frames do not count against `max_inferences`, so static videos
+    spend the freed budget on frames further into the video.
+
+    Args:
+        frames: List of BGR frames in temporal order
+        score_fn: Expensive per-frame scorer (e.g. a model forward pass)
+        max_inferences: Maximum number of calls to `score_fn`
+        max_candidates: Maximum number of frames inspected by the gate
+        gate: Similarity gate, a default one is created when omitted
+        stop: Called before every inference after the first; returning True
+            ends scoring early (at least one frame is always scored)
+
+    Returns:
+        Dict with per-frame scores, inference count and skipped count
+    """
+    gate = gate or FrameSimilarityGate()
+    gate.reset()
+
+    scores = []
+    inferences = 0
+    skipped = 0
+    last_score = None
+
+    for frame in frames[:max_candidates]:
+        if last_score is not None and gate.is_similar(frame):
+            scores.append(last_score)
+            skipped += 1
+            continue
+        if inferences >= max_inferences or (inferences and stop is not None and stop()):
+            break
+        last_score = score_fn(frame)
+        gate.update(frame)
+        scores.append(last_score)
+        inferences += 1
+
+    return {
+        'scores': scores,
+        'inferences': inferences,
+        'skipped': skipped
+    }
+
+
+def gated_selection(frames: List[np.ndarray], max_inferences: int = 10, max_candidates: int = 30,
+                    gate: Optional[FrameSimilarityGate] = None) -> Tuple[List[int], List[int]]:
+    """
+    The frames gated_scores would score, chosen without scoring them
+
+    Lets callers score the picks of several sequences in one batched call.
+
+    Returns:
+        (picked, owners): indices of the frames to score, and for every frame
+        kept the position in `picked` of the frame whose score it takes
+    """
+    gate = gate or FrameSimilarityGate()
+    gate.reset()
+
+    picked, owners = [], []
+    for i, frame in enumerate(frames[:max_candidates]):
+        if picked and gate.is_similar(frame):
+            owners.append(len(picked) - 1)
+            continue
+        if len(picked) >= max_inferences:
+            break
+        gate.update(frame)
+        picked.append(i)
+        owners.append(len(picked) - 1)
+    return picked, owners
+
+
+def selection_scores(picked_scores: List[float], owners: List[int]) -> Dict:
+    """gated_scores-shaped result from the scores of a gated_selection's picks"""
+    return {
+        'scores': [picked_scores[o] for o in owners],
+        'inferences': len(picked_scores),
+        'skipped': len(owners) - len(picked_scores)
+    }
@@ -0,0 +1,128 @@
+"""
+Decoded frame container with cached, reduced-resolution views for the engines
+"""
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+def fit_max_side(image: np.ndarray, max_side: Optional[int]) -> np.ndarray:
+    """Downscale so the longest side is at most `max_side` (never upscales)"""
+    if not max_side:
+        return image
+    h, w = image.shape[:2]
+    longest = max(h, w)
+    if longest <= max_side:
+        return image
+    scale = max_side / longest
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+class FrameViews:
+    """
+    One decoded BGR frame plus memoized derived views
+
+    Engines ask for the representation they need at their own maximum
+    resolution (`bgr`, `gray`, `gray_float`, `bgr_float`, `rgb`, `ycrcb`);
+    each (kind, max_side) pair is computed once and shared by every engine.
+    """
+
+    def __init__(self, bgr: np.ndarray, source_shape: Optional[Tuple[int, int]] = None,
+                 timestamp: Optional[float] = None):
+        """
+        Args:
+            bgr: Decoded BGR frame (possibly already downscaled by the decoder)
+            source_shape: (height, width) of the original video frame
+            timestamp: Position of the frame in the video, in seconds
+        """
+        self._bgr = bgr
+        self.source_shape = tuple(source_shape or bgr.shape[:2])
+        self.timestamp = timestamp
+        self._cache = {}
+
+    @property
+    def shape(self):
+        return self._bgr.shape
+
+    def scale_to_source(self, max_side: Optional[int] = None) -> float:
+        """Factor converting pixel distances in a view back to source pixels"""
+        view_h, view_w = self.bgr(max_side).shape[:2]
+        return max(self.source_shape) / max(view_h, view_w)
+
+    def _view(self, kind: str, max_side: Optional[int]):
+        key = (kind, max_side)
+        view = self._cache.get(key)
+        if view is None:
+            view = self._build(kind, max_side)
+            self._cache[key] = view
+        return view
+
+    def _build(self, kind: str, max_side: Optional[int]):
+        if kind == 'bgr':
+            return fit_max_side(self._bgr, max_side)
+        if kind == 'gray':
+            return cv2.cvtColor(self.bgr(max_side), cv2.COLOR_BGR2GRAY)
+        if kind == 'gray_float':
+            return self.gray(max_side).astype(np.float32) / 255.0
+        if kind == 'bgr_float':
+            return self.bgr(max_side).astype(np.float32) / 255.0
+        if kind == 'rgb':
+            return cv2.cvtColor(self.bgr(max_side), cv2.COLOR_BGR2RGB)
+        if kind == 'ycrcb':
+            return cv2.cvtColor(self.bgr(max_side), cv2.COLOR_BGR2YCrCb)
+        raise ValueError(f"Unknown frame view: {kind}")
+
+    def bgr(self, max_side: Optional[int] = None) -> np.ndarray:
+        return self._view('bgr', max_side)
+
+    def gray(self, max_side: Optional[int] = None) -> np.ndarray:
+        return self._view('gray', max_side)
+
+    def gray_into(self, out: np.ndarray, max_side: Optional[int] = None) -> np.ndarray:
+        """Write the gray view into `out` (e.g. a slot of a stacked array) without caching it"""
+        cached = self._cache.get(('gray', max_side))
+        if cached is not None:
+            np.copyto(out, cached)
+            return out
+        return cv2.cvtColor(self.bgr(max_side), cv2.COLOR_BGR2GRAY, dst=out)
+
+    def gray_float(self, max_side: Optional[int] = None) -> np.ndarray:
+        return self._view('gray_float', max_side)
+
+    def bgr_float(self, max_side: Optional[int] = None) -> np.ndarray:
+        return self._view('bgr_float', max_side)
+
+    def rgb(self, max_side: Optional[int] = None) -> np.ndarray:
+        return self._view('rgb', max_side)
+
+    def ycrcb(self, max_side: Optional[int] = None) -> np.ndarray:
+        return self._view('ycrcb', max_side)
+
+
+def as_views(frame) -> FrameViews:
+    """Accept either a raw BGR array or an existing FrameViews"""
+    return frame if isinstance(frame, FrameViews) else FrameViews(frame)
+
+
+def wrap_frames(frames: List[np.ndarray], max_side: Optional[int] = None,
+                timestamps: Optional[List[float]] = None,
+                source_shape: Optional[Tuple[int, int]] = None) -> List[FrameViews]:
+    """
+    Wrap decoded frames, keeping at most `max_side` resolution in memory
+
+    Args:
+        frames: Raw BGR frames
+        max_side: Largest resolution any engine will request
+        timestamps: Optional per-frame timestamps in seconds
+        source_shape: Original (height, width) when frames were decoded downscaled
+    """
+    wrapped = []
+    for i, frame in enumerate(frames):
+        if isinstance(frame, FrameViews):
+            wrapped.append(frame)
+            continue
+        ts = timestamps[i] if timestamps and i < len(timestamps) else None
+        shape = source_shape if source_shape and all(source_shape) else frame.shape[:2]
+        wrapped.append(FrameViews(fit_max_side(frame, max_side), source_shape=shape, timestamp=ts))
+    return wrapped
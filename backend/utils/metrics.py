@@ -0,0 +1,362 @@
+"""
+In-process metrics registry rendered in the Prometheus text exposition format
+
+Under serve.py every pre-forked worker has its own registry. When the workers
+share VERIFAI_METRICS_DIR (serve.py sets it), each one writes a snapshot of
+its series there and /metrics, whichever worker answers it, sums them all.
+Resident memory is exported per worker (pid label), since the model pages
+shared since the fork would otherwise be counted once per worker; the
+proportional set size is the one memory series that sums correctly.
+"""
+import copy
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from utils.tracing import add_span_observer
+
+# Seconds between snapshots when workers share VERIFAI_METRICS_DIR
+METRICS_FLUSH_SECONDS = float(os.environ.get("VERIFAI_METRICS_FLUSH_SECONDS", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames, values, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def snapshot(self) -> List:
+        """[[label values], value] pairs, JSON-serialisable"""
+        with self._lock:
+            return [[list(key), copy.deepcopy(value)] for key, value in self._values.items()]
+
+    def empty(self):
+        """A metric with the same name, labels and buckets but no series"""
+        clone = copy.copy(self)
+        clone._lock = threading.Lock()
+        clone._values = {}
+        return clone
+
+    def add_series(self, key: Tuple[str, ...], value):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def clear(self):
+        """Drop every series"""
+        with self._lock:
+            self._values = {}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            if not self._values and not self.labelnames:
+                lines.append(f"{self.name} 0.0")
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def add_series(self, key: Tuple[str, ...], value):
+        counts, total, count = value
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0] = [a + b for a, b in zip(state[0], counts)]
+            state[1] += total
+            state[2] += count
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, {'le': repr(float(bound))})
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.labelnames, key, {'le': '+Inf'})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                plain = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{plain} {total}")
+                lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        _update_process_metrics()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, List]:
+        _update_process_metrics()
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render_merged(self, snapshots: List[Tuple[Dict[str, List], bool]]) -> str:
+        """
+        Text exposition of several processes' snapshots, summed per series
+
+        Args:
+            snapshots: (snapshot, live) pairs; gauges of processes that have
+                exited are left out, their counters and histograms are kept
+        """
+        lines = []
+        for metric in self._metrics:
+            merged = metric.empty()
+            for snapshot, live in snapshots:
+                if metric.kind == 'gauge' and not live:
+                    continue
+                for key, value in snapshot.get(metric.name, []):
+                    merged.add_series(tuple(key), value)
+            lines.extend(merged.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'verifai_requests_total', 'HTTP requests by endpoint and outcome', ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = REGISTRY.histogram(
+    'verifai_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint',))
+STAGE_LATENCY = REGISTRY.histogram(
+    'verifai_stage_duration_seconds', 'Latency of pipeline stages and engine methods', ('stage',))
+QUEUE_DEPTH = REGISTRY.gauge(
+    'verifai_queue_depth', 'Jobs waiting for a slot, by stage (fetch/job)', ('stage', 'priority'))
+IN_FLIGHT = REGISTRY.gauge(
+    'verifai_jobs_in_flight', 'Jobs holding a slot, by stage (fetch/job)', ('stage', 'priority'))
+QUEUE_WAIT = REGISTRY.histogram(
+    'verifai_queue_wait_seconds', 'Time jobs spent waiting for a slot, by stage (fetch/job)', ('stage', 'priority'))
+SPATIAL_BATCH = REGISTRY.histogram(
+    'verifai_spatial_batch_size', 'Spatial model forward passes per job',
+    buckets=(1, 2, 4, 6, 8, 10, 16, 32))
+CACHE_REQUESTS = REGISTRY.counter(
+    'verifai_cache_requests_total', 'Cache lookups by cache and result (hit/miss)', ('cache', 'result'))
+DOWNLOADED_BYTES = REGISTRY.counter(
+    'verifai_downloaded_bytes_total', 'Bytes of video fetched from URLs')
+UPLOADED_BYTES = REGISTRY.counter(
+    'verifai_uploaded_bytes_total', 'Bytes of video received as uploads')
+CAPTURED_BYTES = REGISTRY.counter(
+    'verifai_captured_frame_bytes_total', 'Bytes of client-captured frames received (base64)')
+MEMORY_BUDGET = REGISTRY.gauge(
+    'verifai_memory_budget_bytes', 'Memory analysis jobs may reserve in total')
+MEMORY_RESERVED = REGISTRY.gauge(
+    'verifai_memory_reserved_bytes', 'Estimated peak memory reserved by running jobs')
+ADMISSIONS = REGISTRY.counter(
+    'verifai_admissions_total', 'Memory admission decisions (admitted/queued/downscaled/rejected)', ('result',))
+PROCESS_RSS = REGISTRY.gauge(
+    'process_resident_memory_bytes',
+    'Resident set size of each worker process (pages shared since the pre-fork count in every worker)', ('pid',))
+PROCESS_PSS = REGISTRY.gauge(
+    'verifai_proportional_memory_bytes',
+    'Proportional set size: shared pages split between the processes sharing them, so the sum over workers is '
+    'their actual memory')
+PROCESS_CPU = REGISTRY.gauge(
+    'process_cpu_seconds_total', 'User and system CPU time of the process')
+
+
+def _resident_memory_bytes() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return float(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Peak RSS is the best portable fallback (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(peak if os.uname().sysname == 'Darwin' else peak * 1024)
+
+
+def _proportional_memory_bytes() -> float:
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return float(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    # No smaps_rollup (Linux < 4.14, macOS): RSS, which overcounts shared pages
+    return _resident_memory_bytes()
+
+
+def _update_process_metrics():
+    # One series per live process: a forked worker must not re-export its parent's
+    PROCESS_RSS.clear()
+    PROCESS_RSS.set(_resident_memory_bytes(), pid=str(os.getpid()))
+    PROCESS_PSS.set(_proportional_memory_bytes())
+    times = os.times()
+    PROCESS_CPU.set(times.user + times.system)
+
+
+# Every span (pipeline stage or engine method) feeds the latency histogram
+add_span_observer(lambda name, seconds: STAGE_LATENCY.observe(seconds, stage=name))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot(directory: str):
+    """Publish this process's series for the other workers' /metrics"""
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    temporary = path + ".tmp"
+    with open(temporary, 'w') as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(temporary, path)
+
+
+def render() -> str:
+    """Metrics of this process, or of every worker sharing VERIFAI_METRICS_DIR"""
+    directory = os.environ.get("VERIFAI_METRICS_DIR")
+    if not directory:
+        return REGISTRY.render()
+    write_snapshot(directory)
+    snapshots = []
+    for entry in os.listdir(directory):
+        if not entry.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, entry)) as f:
+                snapshots.append((json.load(f), _pid_alive(int(entry[:-5]))))
+        except (OSError, ValueError):
+            continue
+    return REGISTRY.render_merged(snapshots)
+
+
+def start_flusher(interval: float = METRICS_FLUSH_SECONDS) -> Optional[threading.Event]:
+    """
+    Writes this worker's snapshot every `interval` seconds, when workers share a metrics directory
+
+    Returns:
+        Event that stops the thread when set (None when there is nothing to share)
+    """
+    directory = os.environ.get("VERIFAI_METRICS_DIR")
+    if not directory:
+        return None
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                write_snapshot(directory)
+            except OSError as e:
+                print(f"⚠️ Metrics snapshot failed: {e}")
+        # Final values, so counters of a worker that exits aren't lost
+        try:
+            write_snapshot(directory)
+        except OSError:
+            pass
+
+    threading.Thread(target=run, name="verifai-metrics", daemon=True).start()
+    return stop
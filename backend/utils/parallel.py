@@ -0,0 +1,118 @@
+"""
+Frame-level parallelism inside the engines
+
+Optical flow pairs, Haar detections and forensic frames are independent and
+spend their time in OpenCV/NumPy code that releases the GIL, so a single job
+can spread them over every core. All engines share one size-capped thread
+pool. Items are split into contiguous chunks, one per thread, and results
+come back in input order, so scores never depend on scheduling. Calls made
+from a pool thread, or inside `inline()` (segment workers, which already run
+one segment per core), run in the calling thread instead of nesting.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence
+
+from utils.profiling import profiled_thread
+
+# Threads one process may keep busy: the per-worker budget serve.py exports, else every core
+THREAD_BUDGET = max(1, int(os.environ.get("VERIFAI_WORKER_THREADS") or os.cpu_count() or 1))
+# Threads shared by all frame-parallel work (1 runs everything inline)
+PARALLEL_WORKERS = int(os.environ.get("VERIFAI_PARALLEL_WORKERS", str(THREAD_BUDGET)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def _mark_inline():
+    _local.inline = True
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        # A forked engine-pool worker inherits the executor object but none of its threads
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=PARALLEL_WORKERS, thread_name_prefix="verifai-frame",
+                                           initializer=_mark_inline)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+@contextmanager
+def inline():
+    """Run the parallel helpers called inside the block in the calling thread"""
+    previous = getattr(_local, "inline", False)
+    _local.inline = True
+    try:
+        yield
+    finally:
+        _local.inline = previous
+
+
+def nested() -> bool:
+    """True in a frame-pool thread or an `inline()` block, where other threads share the cores"""
+    return getattr(_local, "inline", False)
+
+
+def workers() -> int:
+    """Threads a parallel call made from here may use"""
+    return 1 if nested() else max(1, PARALLEL_WORKERS)
+
+
+def split(items: Sequence, parts: int) -> List[Sequence]:
+    """`items` cut into `parts` contiguous chunks of nearly equal length"""
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def _run_chunk(func: Callable, chunk: Sequence) -> List:
+    # Sampled into the job's profile, if one is running
+    with profiled_thread():
+        return list(func(chunk))
+
+
+def parallel_chunks(func: Callable[[Sequence], List], items: Sequence) -> List:
+    """
+    Apply a chunk function over contiguous chunks of `items` on the shared pool
+
+    Use this when each thread needs its own setup (buffers, classifiers)
+    that is reused for every item of its chunk.
+
+    Args:
+        func: Callable(chunk) -> list with one result per item of the chunk
+        items: Work items (frames, frame pairs...)
+
+    Returns:
+        The concatenated results, in the order of `items`
+    """
+    parts = min(workers(), len(items))
+    if parts <= 1:
+        return list(func(items))
+    executor = _get_executor()
+    # Each chunk runs in a copy of the caller's context, so spans reach the job's trace
+    futures = [executor.submit(contextvars.copy_context().run, _run_chunk, func, chunk)
+               for chunk in split(items, parts)]
+    results = []
+    try:
+        for future in futures:
+            results.extend(future.result())
+    finally:
+        for future in futures:
+            future.cancel()
+    return results
+
+
+def parallel_map(func: Callable, items: Sequence) -> List:
+    """[func(item) for item in items], spread over the shared pool, in order"""
+    return parallel_chunks(lambda chunk: [func(item) for item in chunk], items)
@@ -0,0 +1,249 @@
+"""
+Latency-budget ("anytime") analysis planning
+
+A request may carry `budget_ms`. Before decoding, the planner picks the
+richest analysis level whose estimated cost fits the time left, using
+per-unit stage costs learned from span timings. While the job runs, the
+pipeline checks the deadline before each optional stage and skips whatever
+would overrun, so a verdict is always returned close to the deadline.
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.tracing import add_span_observer
+
+# Seconds per unit before anything has been measured (see units below)
+DEFAULT_COSTS = {
+    'decode': 0.15,                   # per video
+    'spatial.detect': 0.2,            # per model inference
+    'forensic.frequency': 0.006,      # per frame
+    'forensic.gan': 0.012,
+    'forensic.diffusion': 0.02,
+    'forensic.compression': 0.005,
+    'temporal.motion_flow': 0.04,     # per frame pair at REFERENCE_FLOW_SIDE
+    'temporal.lip_sync_haar': 0.012,  # per analysed frame
+    'temporal.blink_haar': 0.01,      # per analysed frame
+    'metadata': 0.03,                 # per file
+}
+EWMA_ALPHA = 0.2
+REFERENCE_FLOW_SIDE = 480
+# Plan against this share of the remaining time to absorb estimation error
+SAFETY = 0.85
+
+FORENSIC_STAGES = {'frequency': 'forensic.frequency', 'gan': 'forensic.gan',
+                   'diffusion': 'forensic.diffusion', 'compression': 'forensic.compression'}
+TEMPORAL_STAGES = {'motion': 'temporal.motion_flow', 'lipsync': 'temporal.lip_sync_haar',
+                   'blink': 'temporal.blink_haar'}
+# Frame limits of TemporalAnalyzer.detect_lip_sync_errors / detect_blink_anomalies
+TEMPORAL_FRAME_LIMITS = {'lipsync': 30, 'blink': 60}
+
+# Every part of the analysis that can be skipped, as reported back to clients
+PARTS = (['spatial'] + [f'temporal.{m}' for m in TEMPORAL_STAGES]
+         + [f'forensic.{m}' for m in FORENSIC_STAGES] + ['metadata'])
+
+# Analysis levels from cheapest to the full default analysis
+LEVELS = [
+    dict(level='glance', frames=3, run_count=0, run_length=6, flow_max_side=240, spatial_inferences=2,
+         forensic_frames=1, forensic_methods=('frequency', 'compression'), temporal_methods=()),
+    dict(level='quick', frames=4, run_count=1, run_length=6, flow_max_side=240, spatial_inferences=3,
+         forensic_frames=2, forensic_methods=('frequency', 'gan', 'compression'), temporal_methods=('motion',)),
+    dict(level='standard', frames=6, run_count=2, run_length=6, flow_max_side=320, spatial_inferences=5,
+         forensic_frames=3, temporal_methods=('motion', 'blink')),
+    dict(level='thorough', frames=8, run_count=3, run_length=8, spatial_inferences=8, forensic_frames=4),
+    dict(level='full'),
+]
+
+
+def temporal_units(frames: int, pairs: int, flow_max_side: int) -> Dict[str, float]:
+    """Units of work per temporal stage for a decoded sequence"""
+    units = {TEMPORAL_STAGES['motion']: pairs * (flow_max_side / REFERENCE_FLOW_SIDE) ** 2}
+    for method, limit in TEMPORAL_FRAME_LIMITS.items():
+        units[TEMPORAL_STAGES[method]] = min(frames, limit)
+    return units
+
+
+class CostModel:
+    """Exponentially weighted per-unit cost of each stage, in seconds"""
+
+    def __init__(self, defaults: Dict[str, float] = DEFAULT_COSTS, alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self._costs = dict(defaults)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, units: float = 1.0):
+        if units <= 0:
+            return
+        with self._lock:
+            previous = self._costs.get(stage)
+            sample = seconds / units
+            self._costs[stage] = sample if previous is None else previous + self.alpha * (sample - previous)
+
+    def cost(self, stage: str, units: float = 1.0) -> float:
+        return self._costs.get(stage, 0.0) * units
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._costs)
+
+
+COSTS = CostModel()
+
+
+@dataclass
+class AnalysisPlan:
+    """How much work one job does, and what it actually completed"""
+    level: str = 'full'
+    frames: int = 10
+    run_count: int = 3
+    run_length: int = 8
+    flow_max_side: int = REFERENCE_FLOW_SIDE
+    spatial_inferences: int = 10
+    forensic_frames: int = 5
+    forensic_methods: Tuple[str, ...] = tuple(FORENSIC_STAGES)
+    temporal_methods: Tuple[str, ...] = tuple(TEMPORAL_STAGES)
+    metadata: bool = True
+    budget_ms: Optional[float] = None
+    deadline: Optional[float] = None  # time.time() value
+    estimated_ms: float = 0.0
+    completed: List[str] = field(default_factory=list)
+    # Units of work per stage for this job, used to normalise measured costs
+    units: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def budgeted(self) -> bool:
+        return self.deadline is not None
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (infinite without a budget)"""
+        return math.inf if self.deadline is None else self.deadline - time.time()
+
+    def restart(self, start_time: float):
+        """Start the budget over from `start_time` (the plan was made before the job queued)"""
+        if self.budget_ms is not None:
+            self.deadline = start_time + self.budget_ms / 1000
+
+    def fits(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def affordable(self, items: List[Tuple[str, float]], reserve: float = 0.0) -> List[str]:
+        """
+        Greedily keep the (name, seconds) items, in order, that fit in the time left
+
+        Args:
+            items: Candidate parts with their estimated cost
+            reserve: Seconds to keep free for later stages
+        """
+        left = self.remaining() * SAFETY - reserve
+        chosen = []
+        for name, seconds in items:
+            if seconds <= left:
+                chosen.append(name)
+                left -= seconds
+        return chosen
+
+    def set_temporal_units(self, frames: int, pairs: int):
+        """Records the sequence actually decoded for the temporal engine"""
+        self.units.update(temporal_units(frames, pairs, self.flow_max_side))
+
+    def temporal_cost(self, method: str, costs: CostModel = COSTS) -> float:
+        stage = TEMPORAL_STAGES[method]
+        return costs.cost(stage, self.units.get(stage, 0.0))
+
+    def forensic_frame_cost(self, methods, costs: CostModel = COSTS) -> float:
+        return sum(costs.cost(FORENSIC_STAGES[m]) for m in methods)
+
+    def mark(self, *parts: str):
+        self.completed.extend(p for p in parts if p not in self.completed)
+
+    def planned_parts(self) -> List[str]:
+        parts = ['spatial'] + [f'temporal.{m}' for m in self.temporal_methods if self.run_count > 0]
+        parts += [f'forensic.{m}' for m in self.forensic_methods]
+        return parts + (['metadata'] if self.metadata else [])
+
+    def engines(self) -> List[str]:
+        """Engines with at least one completed part"""
+        return sorted({part.split('.')[0] for part in self.completed})
+
+    def summary(self) -> Dict:
+        return {
+            'budget_ms': self.budget_ms,
+            'level': self.level,
+            'estimated_ms': round(self.estimated_ms, 1),
+            'completed': [p for p in PARTS if p in self.completed],
+            'skipped': [p for p in PARTS if p not in self.completed],
+            # Parts the plan intended to run but the deadline cut off
+            'deadline_hit': any(p not in self.completed for p in self.planned_parts()),
+        }
+
+
+def estimate(plan: AnalysisPlan, costs: CostModel = COSTS) -> float:
+    """Expected seconds for a plan, assuming the sampler returns the planned shape"""
+    seconds = costs.cost('decode') + costs.cost('spatial.detect', plan.spatial_inferences)
+    seconds += plan.forensic_frames * plan.forensic_frame_cost(plan.forensic_methods, costs)
+    if plan.run_count > 0:
+        units = temporal_units(plan.run_count * plan.run_length, plan.run_count * (plan.run_length - 1),
+                               plan.flow_max_side)
+        seconds += sum(costs.cost(TEMPORAL_STAGES[m], units[TEMPORAL_STAGES[m]]) for m in plan.temporal_methods)
+    if plan.metadata:
+        seconds += costs.cost('metadata')
+    return seconds
+
+
+def make_plan(budget_ms: Optional[float], start_time: float, costs: CostModel = COSTS,
+              metadata: bool = True) -> AnalysisPlan:
+    """
+    Choose the richest level whose estimate fits the remaining budget
+
+    Args:
+        budget_ms: Latency budget for the whole request (None: full analysis)
+        start_time: time.time() when the request arrived
+        costs: Stage cost model
+        metadata: Whether the job has a container to check (not for captured frames)
+
+    Returns:
+        AnalysisPlan (the cheapest level if even that does not fit)
+    """
+    if budget_ms is None:
+        plan = AnalysisPlan(metadata=metadata)
+        plan.estimated_ms = estimate(plan, costs) * 1000
+        return plan
+
+    deadline = start_time + budget_ms / 1000
+    available = (deadline - time.time()) * SAFETY
+    plan = None
+    for overrides in LEVELS:
+        candidate = AnalysisPlan(budget_ms=budget_ms, deadline=deadline, metadata=metadata, **overrides)
+        candidate.estimated_ms = estimate(candidate, costs) * 1000
+        if plan is not None and candidate.estimated_ms > available * 1000:
+            break
+        plan = candidate
+    return plan
+
+
+_current_plan = contextvars.ContextVar("verifai_plan", default=None)
+
+
+@contextmanager
+def activate(plan: AnalysisPlan):
+    """Make `plan` the one whose spans feed the cost model"""
+    token = _current_plan.set(plan)
+    try:
+        yield plan
+    finally:
+        _current_plan.reset(token)
+
+
+def _observe_span(name: str, seconds: float):
+    # Only spans from planned jobs are used, since only they know their units
+    plan = _current_plan.get()
+    if plan is None or name not in DEFAULT_COSTS:
+        return
+    COSTS.observe(name, seconds, plan.units.get(name, 1.0))
+
+
+add_span_observer(_observe_span)
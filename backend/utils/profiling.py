@@ -0,0 +1,147 @@
+"""
+On-demand sampling profiler for slow jobs
+
+A background thread samples the Python stack of the job's threads every few
+milliseconds (`sys._current_frames`), so the overhead is low enough to
+leave on for every job when automatic capture is configured. Stacks are
+aggregated in the folded ("collapsed") format read by flamegraph.pl,
+speedscope and inferno: one `frame;frame;frame count` line per stack.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# Seconds between samples
+PROFILE_INTERVAL = float(os.environ.get("VERIFAI_PROFILE_INTERVAL_MS", "5")) / 1000
+# Jobs slower than this are profiled automatically (0 turns automatic capture off)
+PROFILE_SLOW_MS = float(os.environ.get("VERIFAI_PROFILE_SLOW_MS", "0"))
+MAX_STACK_DEPTH = 128
+
+_current_profiler = contextvars.ContextVar("verifai_profiler", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace(os.sep, "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _fold(frame) -> str:
+    """Root-first `a;b;c` stack of a frame"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Samples the stacks of a set of threads from a background thread"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.started = None
+        self.duration = 0.0
+        self.trigger = None  # 'request' or 'slow' once the profile is kept
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_thread(self, ident: Optional[int] = None, name: Optional[str] = None):
+        ident = ident or threading.get_ident()
+        with self._lock:
+            self._threads[ident] = name or threading.current_thread().name
+
+    def remove_thread(self, ident: Optional[int] = None):
+        with self._lock:
+            self._threads.pop(ident or threading.get_ident(), None)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="verifai-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+            for ident, name in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    # Threads are root frames so worker stacks stay apart in the graph
+                    self.counts[f"{name};{_fold(frame)}"] += 1
+            self.samples += 1
+            del frames
+
+    def folded(self) -> str:
+        """Collapsed stacks, heaviest first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common()) + "\n"
+
+
+@contextmanager
+def profile_job(job_id: str, enabled: bool = False, slow_ms: float = PROFILE_SLOW_MS,
+                save: Optional[Callable] = None):
+    """
+    Profile the code inside the block when requested or when it runs slow
+
+    Args:
+        job_id: Job the profile belongs to
+        enabled: Profile was requested explicitly (always kept)
+        slow_ms: Keep the profile if the block takes at least this long (0: never)
+        save: Called as save(job_id, folded, samples, duration_ms, trigger) when kept
+
+    Yields:
+        The SamplingProfiler, or None when profiling is off
+    """
+    if not enabled and not slow_ms:
+        yield None
+        return
+
+    profiler = SamplingProfiler()
+    profiler.add_thread()
+    token = _current_profiler.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _current_profiler.reset(token)
+        duration_ms = profiler.duration * 1000
+        if enabled or duration_ms >= slow_ms:
+            profiler.trigger = "request" if enabled else "slow"
+            print(f"🔬 Profiled job {job_id}: {profiler.samples} samples over {duration_ms:.0f} ms "
+                  f"({profiler.trigger})")
+            if save is not None:
+                try:
+                    save(job_id, profiler.folded(), profiler.samples, duration_ms, profiler.trigger)
+                except Exception as e:
+                    print(f"⚠️ Profile save failed: {e}")
+
+
+@contextmanager
+def profiled_thread():
+    """Include the current (worker) thread in the job's profile, if one is running"""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield
+        return
+    profiler.add_thread()
+    try:
+        yield
+    finally:
+        profiler.remove_thread()
@@ -0,0 +1,191 @@
+"""
+Priority scheduling of analysis jobs
+
+Jobs belong to a priority class ("interactive" or "batch") and a client.
+Free slots go to the classes by stride scheduling on their share (so batch
+keeps moving but interactive jobs jump ahead), and within a class clients
+are served round-robin so one bulk submitter cannot starve the others.
+Each class can also be capped below the total capacity, which keeps a slot
+free for interactive work while a batch screen is running. Live streams
+are paced by their source and stay open for minutes, so they have a class
+of their own with dedicated slots, outside the capacity shared by jobs.
+Downloads and uploads go through a second, smaller scheduler of their own
+(the "fetch" stage), so the same priorities and fairness bound how many
+videos are moved into memory at once.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from utils import metrics
+
+PRIORITIES = ('interactive', 'batch')
+DEFAULT_PRIORITY = os.environ.get("VERIFAI_DEFAULT_PRIORITY", "interactive")
+# Class of /api/analyze_stream requests; not a priority clients can ask for
+STREAM = 'stream'
+CLASSES = PRIORITIES + (STREAM,)
+
+
+def _parse_shares(value: str) -> Dict[str, float]:
+    """'interactive=4,batch=1' -> {'interactive': 4.0, 'batch': 1.0}"""
+    shares = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, share = item.split("=", 1)
+            shares[name.strip()] = float(share)
+    return shares
+
+
+# Relative share of freed slots when both classes have jobs waiting
+SHARES = _parse_shares(os.environ.get("VERIFAI_SCHEDULER_SHARES", "interactive=4,batch=1"))
+# Most slots batch jobs may hold at once (default: all but one)
+BATCH_MAX_JOBS = os.environ.get("VERIFAI_BATCH_MAX_JOBS")
+# Streams analysed at once, on top of the job slots
+STREAM_MAX_JOBS = int(os.environ.get("VERIFAI_MAX_STREAMS", "1"))
+# Videos downloaded or spooled at once
+FETCH_MAX_JOBS = int(os.environ.get("VERIFAI_MAX_FETCHES", "2"))
+
+
+class JobScheduler:
+    """Grants `capacity` concurrent job slots across priority classes and clients"""
+
+    def __init__(self, capacity: int, shares: Optional[Dict[str, float]] = None,
+                 limits: Optional[Dict[str, int]] = None, stream_slots: int = STREAM_MAX_JOBS,
+                 stage: str = 'job'):
+        """
+        Args:
+            capacity: Total concurrent jobs
+            shares: Weight of each class when slots are contended
+            limits: Maximum concurrent jobs per class (defaults to capacity)
+            stream_slots: Concurrent streams, not counted against `capacity`
+            stage: Label of the scheduler's queue metrics ("job" or "fetch")
+        """
+        self.capacity = max(1, capacity)
+        self.stage = stage
+        shares = shares or SHARES
+        self.shares = {name: max(float(shares.get(name, 1.0)), 1e-3) for name in PRIORITIES}
+        self.limits = {name: min(self.capacity, (limits or {}).get(name, self.capacity)) for name in PRIORITIES}
+        self.limits[STREAM] = max(1, stream_slots)
+        self.running = {name: 0 for name in CLASSES}
+        # Per class: client -> queue of waiting futures, rotated for round-robin
+        self.queues = {name: OrderedDict() for name in CLASSES}
+        # Stride scheduling state: the class with the lowest pass value goes next
+        self._pass = {name: 0.0 for name in PRIORITIES}
+        for name in CLASSES:
+            metrics.QUEUE_DEPTH.set(0, stage=stage, priority=name)
+            metrics.IN_FLIGHT.set(0, stage=stage, priority=name)
+
+    def queued(self, priority: str) -> int:
+        return sum(len(waiters) for waiters in self.queues[priority].values())
+
+    def snapshot(self) -> Dict:
+        return {
+            'capacity': self.capacity,
+            'classes': {name: {'running': self.running[name], 'queued': self.queued(name),
+                               'limit': self.limits[name], 'share': self.shares.get(name)}
+                        for name in CLASSES}
+        }
+
+    def _next_waiter(self, priority: str) -> Optional[asyncio.Future]:
+        """
+        Next live waiter of the class, clients taken round-robin
+
+        Waiters cancelled before their own handler could forget them are
+        dropped on the way; None if only such waiters were queued.
+        """
+        clients = self.queues[priority]
+        while clients:
+            client, waiters = next(iter(clients.items()))
+            waiter = waiters.popleft()
+            if not waiters:
+                del clients[client]
+            elif not waiter.done():
+                # Move the client to the back so the next slot goes to someone else
+                clients.move_to_end(client)
+            if not waiter.done():
+                return waiter
+        return None
+
+    def _dispatch(self):
+        # Streams only wait for each other, on their own slots
+        while self.queues[STREAM] and self.running[STREAM] < self.limits[STREAM]:
+            waiter = self._next_waiter(STREAM)
+            if waiter is not None:
+                self.running[STREAM] += 1
+                waiter.set_result(None)
+        while sum(self.running[name] for name in PRIORITIES) < self.capacity:
+            ready = [name for name in PRIORITIES
+                     if self.queues[name] and self.running[name] < self.limits[name]]
+            if not ready:
+                return
+            priority = min(ready, key=lambda name: self._pass[name])
+            waiter = self._next_waiter(priority)
+            if waiter is None:
+                continue
+            # Only a slot actually granted counts against the class
+            self._pass[priority] += 1.0 / self.shares[priority]
+            self.running[priority] += 1
+            waiter.set_result(None)
+
+    def _forget(self, priority: str, client: str, waiter: asyncio.Future):
+        waiters = self.queues[priority].get(client)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self.queues[priority][client]
+
+    def _release(self, priority: str):
+        self.running[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = DEFAULT_PRIORITY, client: str = "anonymous"):
+        """
+        Wait for a job slot of the given class, on behalf of `client`
+
+        Raises:
+            ValueError: for an unknown priority class
+        """
+        if priority not in CLASSES:
+            raise ValueError(f"Unknown priority '{priority}' (expected one of {', '.join(CLASSES)})")
+
+        # A class that was idle restarts at the current virtual time instead of
+        # cashing in the turns it did not use
+        if priority in PRIORITIES and not self.queues[priority] and not self.running[priority]:
+            busy = [self._pass[name] for name in PRIORITIES if self.queues[name] or self.running[name]]
+            if busy:
+                self._pass[priority] = max(self._pass[priority], min(busy))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues[priority].setdefault(client, deque()).append(waiter)
+        metrics.QUEUE_DEPTH.inc(stage=self.stage, priority=priority)
+        queued_at = time.perf_counter()
+        try:
+            self._dispatch()
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just as the request went away
+                self._release(priority)
+            else:
+                self._forget(priority, client, waiter)
+            raise
+        finally:
+            metrics.QUEUE_DEPTH.dec(stage=self.stage, priority=priority)
+            metrics.QUEUE_WAIT.observe(time.perf_counter() - queued_at, stage=self.stage, priority=priority)
+
+        metrics.IN_FLIGHT.inc(stage=self.stage, priority=priority)
+        try:
+            yield
+        finally:
+            metrics.IN_FLIGHT.dec(stage=self.stage, priority=priority)
+            self._release(priority)
+
+
+def create_scheduler(capacity: int, stage: str = 'job') -> JobScheduler:
+    """Scheduler configured from the environment"""
+    batch_limit = int(BATCH_MAX_JOBS) if BATCH_MAX_JOBS else max(1, capacity - 1)
+    return JobScheduler(capacity, shares=SHARES, limits={'batch': batch_limit}, stage=stage)
@@ -0,0 +1,124 @@
+"""
+Zero-copy frame handoff to worker processes through POSIX shared memory
+"""
+import os
+import uuid
+import weakref
+from multiprocessing import shared_memory
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+SEGMENT_PREFIX = "verifai_"
+SHM_DIR = "/dev/shm"
+
+
+class SharedFrameHandle(NamedTuple):
+    """Picklable description of a shared frame buffer (a few bytes, not the pixels)"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+    source_shape: Tuple[int, int]
+
+
+def _release(shm: shared_memory.SharedMemory):
+    try:
+        shm.close()
+    except BufferError:
+        # A NumPy view is still alive; the mapping goes away with the process
+        pass
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class SharedFrameBuffer:
+    """
+    N same-shaped frames stored once in a shared memory segment
+
+    The owner writes the frames and hands `handle` to workers, which
+    `attach_frames` to get NumPy views without copying. The segment is
+    unlinked when the buffer is closed (use it as a context manager), when
+    it is garbage collected, at interpreter exit, and by Python's resource
+    tracker if the owning process dies.
+    """
+
+    def __init__(self, frames: List[np.ndarray], source_shape: Tuple[int, int] = None):
+        if not frames:
+            raise ValueError("SharedFrameBuffer needs at least one frame")
+        shape = (len(frames),) + frames[0].shape
+        dtype = frames[0].dtype
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        name = f"{SEGMENT_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:12]}"
+
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        self._finalizer = weakref.finalize(self, _release, self._shm)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+        for i, frame in enumerate(frames):
+            self.array[i] = frame
+        self.handle = SharedFrameHandle(name, shape, dtype.str, tuple(source_shape or frames[0].shape[:2]))
+
+    def close(self):
+        self.array = None
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Older versions register the segment again; multiprocessing children
+        # share the owner's resource tracker, so that is a harmless duplicate
+        return shared_memory.SharedMemory(name=name)
+
+
+def run_on_shared_frames(handle: SharedFrameHandle, func, *args):
+    """
+    Attach to a shared buffer, call `func(frames, *args)` and detach
+
+    `frames` is a read-only (N, H, W, C) view; no pixel data is copied. The
+    view must not escape `func`, so the mapping can be closed afterwards.
+    """
+    shm = _attach(handle.name)
+    try:
+        frames = np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=shm.buf)
+        frames.flags.writeable = False
+        result = func(frames, *args)
+        del frames
+        return result
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+def reap_orphan_segments() -> int:
+    """Unlink segments left behind by processes that no longer exist"""
+    if not os.path.isdir(SHM_DIR):
+        return 0
+    removed = 0
+    for entry in os.listdir(SHM_DIR):
+        if not entry.startswith(SEGMENT_PREFIX):
+            continue
+        try:
+            pid = int(entry[len(SEGMENT_PREFIX):].split("_", 1)[0])
+            os.kill(pid, 0)
+        except ValueError:
+            continue
+        except ProcessLookupError:
+            try:
+                os.unlink(os.path.join(SHM_DIR, entry))
+                removed += 1
+            except OSError:
+                pass
+        except PermissionError:
+            continue
+    return removed
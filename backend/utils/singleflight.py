@@ -0,0 +1,87 @@
+"""
+Single-flight deduplication of identical in-flight work
+
+Concurrent callers with the same key share one execution: the first caller
+starts it, later callers await the same result (or exception).
+"""
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that never change which video a URL points to
+TRACKING_PARAMS = {'fbclid', 'gclid', 'igshid', 'igsh', 'si', 'feature', 'ref', 'ref_src', 'ref_url',
+                   'mc_cid', 'mc_eid', 'pp', 'ab_channel'}
+
+_YOUTUBE_HOSTS = {'youtube.com', 'youtu.be', 'youtube-nocookie.com', 'music.youtube.com'}
+_YOUTUBE_PATH = re.compile(r'^/(?:shorts|embed|live|v)/([A-Za-z0-9_-]{11})')
+_YOUTUBE_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def normalize_video_url(url: str) -> str:
+    """
+    Canonical key for a video URL
+
+    YouTube links of any form (watch, youtu.be, shorts, embed, mobile) map to
+    `youtube:<id>`. Other URLs get a lowercase host without `www.`/`m.`, no
+    fragment, no tracking parameters and sorted query parameters.
+    """
+    url = url.strip()
+    parts = urlsplit(url if '://' in url else f'https://{url}')
+    host = (parts.hostname or '').lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith('utm_')]
+
+    if host in _YOUTUBE_HOSTS:
+        video_id = None
+        if host == 'youtu.be':
+            video_id = parts.path.strip('/').split('/')[0]
+        elif parts.path == '/watch':
+            video_id = dict(query).get('v')
+        else:
+            match = _YOUTUBE_PATH.match(parts.path)
+            video_id = match.group(1) if match else None
+        if video_id and _YOUTUBE_ID.match(video_id):
+            return f'youtube:{video_id}'
+
+    netloc = host if parts.port in (None, 80, 443) else f'{host}:{parts.port}'
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower() or 'https', netloc, path, urlencode(sorted(query)), ''))
+
+
+class SingleFlight:
+    """Shares one in-progress asyncio task per key between concurrent callers"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller went away
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `func()` unless a call with the same key is already running
+
+        The shared task is shielded, so one caller disconnecting does not
+        cancel the work for the others.
+
+        Returns:
+            (result, shared) where `shared` is True for callers that joined
+            an existing call
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task), shared
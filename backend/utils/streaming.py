@@ -0,0 +1,341 @@
+"""
+Streaming analysis of live streams, long broadcasts and growing files
+
+Frames are decoded as they arrive (HLS, RTSP and other FFmpeg network
+sources, or a local file that is still being written), sampled at a fixed
+cadence and pushed through the engines one at a time. Every signal is kept
+as a rolling-window online statistic - Welford mean/variance for optical
+flow magnitudes, mouth changes and the spatial/forensic scores, and an
+incremental transition counter for blinks - so memory stays bounded by the
+window however long the stream runs. A fresh verdict is emitted every few
+seconds of stream time.
+"""
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils import ensemble
+from utils.frame_views import FrameViews, fit_max_side
+
+# Frames analysed per second of stream
+STREAM_SAMPLE_FPS = float(os.environ.get("VERIFAI_STREAM_FPS", "5"))
+# Seconds of stream the rolling statistics cover
+STREAM_WINDOW_SECONDS = float(os.environ.get("VERIFAI_STREAM_WINDOW_SECONDS", "30"))
+# Seconds of stream between two verdicts
+STREAM_UPDATE_SECONDS = float(os.environ.get("VERIFAI_STREAM_UPDATE_SECONDS", "5"))
+# Longest stream one request may analyse
+STREAM_MAX_SECONDS = float(os.environ.get("VERIFAI_STREAM_MAX_SECONDS", "600"))
+# The stream has ended once no new frame arrived for this long
+STREAM_IDLE_TIMEOUT = float(os.environ.get("VERIFAI_STREAM_IDLE_TIMEOUT", "10"))
+# Sources the API accepts (local files are only read through analyze_stream)
+STREAM_SCHEMES = ("http", "https", "rtsp", "rtsps", "rtmp", "srt", "udp")
+
+# Sampled frames between two spatial inferences and two forensic checks
+SPATIAL_EVERY = 5
+FORENSIC_EVERY = 10
+# Sampled frames between two full-frame face searches; in between the last
+# face is tracked with a size-constrained search (a few ms instead of ~300)
+FACE_SEARCH_EVERY = 5
+# Haar checks need this many samples in the window, like the file analysis
+MIN_MOUTH_CHANGES = 4
+MIN_BLINK_FRAMES = 10
+# Recovery from a dropped connection or the end of a growing file
+RECONNECT_DELAY = 0.5
+
+
+class RollingStats:
+    """
+    Mean and variance of the last `window` values
+
+    Welford's update, with the matching downdate when a value leaves the
+    window. The sums are rebuilt from the window once per `window` pushes
+    so rounding errors never accumulate.
+    """
+
+    def __init__(self, window: int):
+        self.window = max(1, int(window))
+        self.values = deque()
+        self.total = 0  # Values pushed over the lifetime of the stream
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def variance(self) -> float:
+        """Population variance (np.var) of the window"""
+        return max(self._m2 / len(self.values), 0.0) if self.values else 0.0
+
+    def push(self, value: float):
+        value = float(value)
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        delta = value - self.mean
+        self.mean += delta / len(self.values)
+        self._m2 += delta * (value - self.mean)
+        self.total += 1
+        if self.total % self.window == 0:
+            values = np.fromiter(self.values, dtype=np.float64)
+            self.mean, self._m2 = float(values.mean()), float(((values - values.mean()) ** 2).sum())
+
+    def _remove(self, value: float):
+        n = len(self.values) + 1  # Count before `value` was popped
+        if n == 1:
+            self.mean, self._m2 = 0.0, 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / (n - 1)
+        self._m2 -= delta * (value - self.mean)
+
+
+class RollingTransitions:
+    """Number of state changes between consecutive values of the last `window`"""
+
+    def __init__(self, window: int):
+        self.window = max(1, int(window))
+        self.states = deque()
+        self.changes = 0
+
+    def __len__(self):
+        return len(self.states)
+
+    def push(self, state: bool):
+        if len(self.states) == self.window:
+            oldest = self.states.popleft()
+            if self.states and self.states[0] != oldest:
+                self.changes -= 1
+        if self.states and self.states[-1] != state:
+            self.changes += 1
+        self.states.append(state)
+
+
+class StreamAnalyzer:
+    """Runs the engines frame by frame and keeps their signals as rolling statistics"""
+
+    def __init__(self, spatial_detect: Callable, temporal_engine, forensic_engine,
+                 window_seconds: float = STREAM_WINDOW_SECONDS, sample_fps: float = STREAM_SAMPLE_FPS,
+                 max_side: Optional[int] = None):
+        """
+        Args:
+            spatial_detect: Spatial engine's detect_frames
+            temporal_engine: TemporalAnalyzer (flow/Haar settings and scoring rules)
+            forensic_engine: ForensicDetector
+            window_seconds: Stream time covered by the statistics
+            sample_fps: Cadence frames are pushed at
+            max_side: Largest resolution kept for the engines
+        """
+        self.spatial_detect = spatial_detect
+        self.temporal = temporal_engine
+        self.forensic_engine = forensic_engine
+        self.max_side = max_side
+        self.sample_fps = sample_fps
+        window = max(2, int(round(window_seconds * sample_fps)))
+        self.flow = RollingStats(window)
+        self.mouth = RollingStats(window)
+        self.blinks = RollingTransitions(window)
+        self.spatial = RollingStats(max(1, window // SPATIAL_EVERY))
+        self.forensic = RollingStats(max(1, window // FORENSIC_EVERY))
+        self.frames = 0
+        # Only the previous frame's gray view and mouth region are kept between pushes
+        self._previous_gray = None
+        self._previous_mouth = None
+        self._flow = None
+        self._face = None
+        self._face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self._eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+
+    def push(self, frame: np.ndarray):
+        """Analyse the next sampled BGR frame"""
+        view = FrameViews(fit_max_side(frame, self.max_side), source_shape=frame.shape[:2])
+        self._push_flow(view)
+        self._push_haar(view)
+        if self.frames % SPATIAL_EVERY == 0:
+            for score in self.spatial_detect([view], max_inferences=1)['scores']:
+                self.spatial.push(score)
+        if self.frames % FORENSIC_EVERY == 0:
+            self.forensic.push(self.forensic_engine.detect_all_artifacts(view)['confidence'])
+        self.frames += 1
+
+    def _push_flow(self, view: FrameViews):
+        max_side = self.temporal.flow_max_side
+        gray = view.gray(max_side)
+        previous, self._previous_gray = self._previous_gray, gray
+        if previous is None or previous.shape != gray.shape:
+            self._flow = None
+            return
+        self._flow = cv2.calcOpticalFlowFarneback(previous, gray, self._flow, 0.5, 3, 15, 3, 5, 1.2, 0)
+        magnitude = cv2.magnitude(self._flow[..., 0], self._flow[..., 1])
+        # Source pixels, like TemporalAnalyzer.detect_motion_smoothness
+        self.flow.push(cv2.mean(magnitude)[0] * view.scale_to_source(max_side))
+
+    def _track_face(self, gray: np.ndarray):
+        """Face box in `gray`, or None (full searches are periodic, otherwise the last face is followed)"""
+        if self.frames % FACE_SEARCH_EVERY == 0:
+            faces = self._face_cascade.detectMultiScale(gray, 1.1, 5)
+        elif self._face is not None:
+            w, h = self._face[2:]
+            faces = self._face_cascade.detectMultiScale(gray, 1.1, 5, minSize=(w * 2 // 3, h * 2 // 3),
+                                                        maxSize=(w * 3 // 2, h * 3 // 2))
+        else:
+            faces = ()
+        self._face = tuple(int(v) for v in faces[0]) if len(faces) > 0 else None
+        return self._face
+
+    def _push_haar(self, view: FrameViews):
+        max_side = self.temporal.detection_max_side
+        gray = view.gray(max_side)
+        # Eyes are searched over the whole frame, like TemporalAnalyzer.detect_blink_anomalies,
+        # so stream and file blink scores stay comparable
+        eyes = self._eye_cascade.detectMultiScale(gray, 1.1, 5)
+        self.blinks.push(len(eyes) >= 2)
+        face = self._track_face(gray)
+        if face is not None:
+            x, y, w, h = face
+            mouth = view.bgr(max_side)[y + h // 2:y + h, x:x + w]
+            if mouth.size > 0:
+                mouth = cv2.resize(mouth, (64, 64)).astype(np.int16)
+                if self._previous_mouth is not None:
+                    self.mouth.push(np.abs(mouth - self._previous_mouth).mean())
+                self._previous_mouth = mouth
+
+    def verdict(self) -> Dict:
+        """Current scores and classification over the window"""
+        breakdown = {'motion_smoothness': 0.0, 'lip_sync': 0.0, 'blink_pattern': 0.0}
+        if len(self.flow):
+            breakdown['motion_smoothness'] = self.temporal.motion_consistency(self.flow.variance, self.flow.mean)
+        if len(self.mouth) >= MIN_MOUTH_CHANGES:
+            changes = np.fromiter(self.mouth.values, dtype=np.float64)
+            breakdown['lip_sync'] = min(len(self.temporal.mouth_anomalies(changes)) / len(changes), 1.0)
+        if len(self.blinks) >= MIN_BLINK_FRAMES:
+            breakdown['blink_pattern'] = self.temporal.blink_score(self.blinks.changes, len(self.blinks))[0]
+        valid = [score for score in breakdown.values() if score > 0]
+
+        scores = {
+            'spatial': self.spatial.mean,
+            'temporal': float(np.mean(valid)) if valid else 0.0,
+            'forensic': self.forensic.mean,
+            'metadata': 0.0,
+        }
+        # A stream has no container metadata; weights are spread over the engines with data
+        engines = [name for name, stats in (('spatial', self.spatial), ('temporal', self.flow),
+                                            ('forensic', self.forensic)) if len(stats)]
+        weights, red_flags = ensemble.renormalized(engines)
+        confidence = ensemble.final_score(**scores, weights=weights, red_flags=red_flags) if engines else 0.0
+        return {
+            'final_confidence': round(confidence, 4),
+            'classification': ensemble.classify(confidence),
+            'scores': {name: round(value, 4) for name, value in scores.items() if name != 'metadata'},
+            'breakdown': {name: round(float(value), 4) for name, value in breakdown.items()},
+            'frames_analyzed': self.frames,
+            'window': {
+                'frames': min(self.frames, self.flow.window),
+                'blink_frames': len(self.blinks),
+                'flow_mean': round(self.flow.mean, 4),
+                'flow_variance': round(self.flow.variance, 4),
+                'blink_changes': self.blinks.changes,
+                'spatial_samples': len(self.spatial),
+                'forensic_samples': len(self.forensic),
+            },
+        }
+
+
+def is_stream_url(source: str) -> bool:
+    return source.split("://", 1)[0].lower() in STREAM_SCHEMES if "://" in source else False
+
+
+def open_stream(source: str) -> cv2.VideoCapture:
+    """
+    Capture on a stream URL or (growing) local file
+
+    Raises:
+        ValueError: if the source cannot be opened
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        capture.release()
+        raise ValueError(f"Could not open stream: {source}")
+    return capture
+
+
+def read_stream(source: str, sample_fps: float = STREAM_SAMPLE_FPS, max_seconds: float = STREAM_MAX_SECONDS,
+                idle_timeout: float = STREAM_IDLE_TIMEOUT, stop: Optional[Callable[[], bool]] = None,
+                capture: Optional[cv2.VideoCapture] = None) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Frames of a stream at `sample_fps`, as they arrive
+
+    When reading stops (end of a growing file, dropped connection) the
+    source is reopened - a local file at the frame it stopped at - until
+    nothing new arrives for `idle_timeout` seconds.
+
+    Args:
+        source: Stream URL or local file path
+        sample_fps: Cadence to sample frames at
+        max_seconds: Stop after this much stream time
+        idle_timeout: Give up after this long without a new frame
+        stop: Polled between frames; reading ends when it returns True
+        capture: Already opened capture on `source`
+
+    Yields:
+        (stream time in seconds, BGR frame)
+    """
+    capture = capture or open_stream(source)
+    growing_file = os.path.exists(source)
+    position = 0
+    last_frame = time.monotonic()
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        fps = fps if 0 < fps < 240 else 25.0
+        hop = max(1, int(round(fps / sample_fps)))
+        while not (stop and stop()) and position / fps < max_seconds:
+            if capture.grab():
+                last_frame = time.monotonic()
+                if position % hop == 0:
+                    ok, frame = capture.retrieve()
+                    if ok:
+                        yield position / fps, frame
+                position += 1
+                continue
+            if time.monotonic() - last_frame > idle_timeout:
+                return
+            time.sleep(RECONNECT_DELAY)
+            capture.release()
+            capture = cv2.VideoCapture(source)
+            if growing_file and capture.isOpened():
+                capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+    finally:
+        capture.release()
+
+
+def analyze_stream(source: str, analyzer: StreamAnalyzer, update_seconds: float = STREAM_UPDATE_SECONDS,
+                   max_seconds: float = STREAM_MAX_SECONDS, idle_timeout: float = STREAM_IDLE_TIMEOUT,
+                   stop: Optional[Callable[[], bool]] = None,
+                   capture: Optional[cv2.VideoCapture] = None) -> Iterator[Dict]:
+    """
+    Verdicts on a stream every `update_seconds` of stream time
+
+    Args:
+        source: Stream URL or local file path
+        analyzer: StreamAnalyzer holding the rolling statistics
+        update_seconds: Stream time between verdicts
+        max_seconds: Longest stream time analysed
+        idle_timeout: The stream has ended after this long without a frame
+        stop: Polled between frames; analysis ends when it returns True
+        capture: Already opened capture on `source`
+
+    Yields:
+        Verdict dicts with the stream time they cover; the last one has final=True
+    """
+    stream_time, next_update = 0.0, update_seconds
+    for stream_time, frame in read_stream(source, sample_fps=analyzer.sample_fps, max_seconds=max_seconds,
+                                          idle_timeout=idle_timeout, stop=stop, capture=capture):
+        analyzer.push(frame)
+        if stream_time >= next_update:
+            next_update = stream_time + update_seconds
+            yield dict(analyzer.verdict(), stream_time=round(stream_time, 3), final=False)
+    yield dict(analyzer.verdict(), stream_time=round(stream_time, 3), final=True)
@@ -0,0 +1,137 @@
+"""
+Lightweight per-job stage timing (spans) with structured log output
+
+Spans are timed even for jobs that are not traced: the metrics module and
+the planner's cost model register observers at import time, and both need
+every job. An untraced span therefore still costs two perf_counter calls
+and the observers (a locked histogram update, a cost-model update for
+planned stages): a few microseconds per span, well under a millisecond for
+a whole job. Only without observers is a span a no-op.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Tracing for every job can be forced on with VERIFAI_TRACE=1;
+# otherwise it is enabled per request.
+TRACE_ENABLED = os.environ.get("VERIFAI_TRACE", "0") == "1"
+
+logger = logging.getLogger("verifai.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_trace = contextvars.ContextVar("verifai_trace", default=None)
+
+# Callbacks(name, seconds) fed by every span, traced or not (metrics, cost model).
+# While any is registered, spans are timed for every job (see the module docstring)
+_span_observers = []
+
+
+def add_span_observer(observer):
+    _span_observers.append(observer)
+
+
+def _finish(trace: Optional["Trace"], name: str, start: float):
+    elapsed = time.perf_counter() - start
+    if trace is not None:
+        trace.record(name, elapsed * 1000)
+    for observer in _span_observers:
+        observer(name, elapsed)
+
+
+class Trace:
+    """Collects span durations for one job"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        # Spans are recorded from worker threads too (segments, frame pool)
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_ms: float):
+        # Repeated spans (e.g. one per frame) are summed
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+            self.calls[name] = calls = self.calls.get(name, 0) + 1
+        logger.debug(json.dumps({
+            "event": "span", "job_id": self.job_id, "stage": name,
+            "ms": round(duration_ms, 3), "calls": calls
+        }))
+
+    def breakdown(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(ms, 2) for name, ms in self.stages.items()}
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(job_id: str, enabled: bool = False):
+    """
+    Activate tracing for the code running inside the block
+
+    Yields the Trace, or None when tracing is off (spans then only feed
+    the span observers, if any).
+    """
+    if not (enabled or TRACE_ENABLED):
+        yield None
+        return
+
+    trace = Trace(job_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        logger.info(json.dumps({
+            "event": "job_timing", "job_id": job_id,
+            "total_ms": round(trace.total_ms(), 2), "stages": trace.breakdown()
+        }))
+
+
+@contextmanager
+def span(name: str):
+    """Time a block under `name` if the current job is traced or span observers are registered"""
+    trace = _current_trace.get()
+    if trace is None and not _span_observers:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _finish(trace, name, start)
+
+
+def traced(name: str):
+    """Decorator version of `span`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None and not _span_observers:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _finish(trace, name, start)
+        return wrapper
+    return decorator
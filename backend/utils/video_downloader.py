@@ -1,10 +1,13 @@
 import yt_dlp
 import os
+from utils.tracing import traced
 
-def download_video(url, output_path):
+@traced("download")
+def download_video(url, output_path, max_filesize=None):
     """
     Downloads a video from a URL (YouTube, etc.) using yt-dlp.
     Includes headers to bypass bot detection.
+    Downloads larger than max_filesize bytes (if given) are aborted.
     """
     ydl_opts = {
         # Select best mp4 format available
@@ -20,6 +23,8 @@ def download_video(url, output_path):
             'Sec-Fetch-Mode': 'navigate',
         },
     }
+    if max_filesize:
+        ydl_opts['max_filesize'] = max_filesize
 
     try:
         # If output file already exists (from a failed run), remove it
@@ -42,6 +47,8 @@ def download_video(url, output_path):
             else:
                 return False, "The downloaded file is 0 bytes (empty)."
         
+        if max_filesize:
+            return False, f"Video is larger than the {max_filesize // (1024 * 1024)} MB limit."
         return False, "File was not saved to disk."
 
     except Exception as e:
@@ -1,18 +1,230 @@
 import cv2
 import os
+import numpy as np
+from utils.decoders import KEYFRAME_SAMPLING, get_decoder
+from utils.frame_views import wrap_frames
+from utils.tracing import span, traced
 
-def extract_frames(video_path, fps=5):
-    frames = []
-    cap = cv2.VideoCapture(video_path)
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
+@traced("decode.full_scan")
+def extract_frames(video_path, fps=5, max_side=None, probe=None):
+    # A container probe (utils/container_probe.py) already knows the frame rate
+    if probe is not None and probe.fps:
+        video_fps = probe.fps
+    else:
+        cap = cv2.VideoCapture(video_path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
     hop = int(video_fps / fps) if video_fps > fps else 1
-    
+    # The decode backend (utils/decoders.py) scales frames down as they are converted
+    return list(get_decoder().frames(video_path, hop=hop, max_side=max_side))
+
+def _spread(items, count):
+    """Pick `count` items evenly spread across a list (keeps order)."""
+    if len(items) <= count:
+        return list(items)
+    idx = np.linspace(0, len(items) - 1, count).round().astype(int)
+    return [items[i] for i in idx]
+
+def _signature(frame, size):
+    """Low-resolution HSV histogram used for shot boundary detection."""
+    small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+def _read_at(cap, position):
+    cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+    ret, frame = cap.read()
+    return frame if ret else None
+
+def _read_positions(cap, video_path, positions, max_side=None):
+    """
+    (position, frame) pairs for frames that only need to be well spread
+
+    A backend that can seek to key frames decodes only the intra frame at
+    or before each position; otherwise the exact frames are read from `cap`.
+    """
+    decoder = get_decoder()
+    if KEYFRAME_SAMPLING and decoder.keyframe_seek:
+        return decoder.keyframes(video_path, positions, max_side=max_side)
+    decoded = []
+    for pos in positions:
+        frame = _read_at(cap, pos)
+        if frame is not None:
+            decoded.append((int(pos), frame))
+    return decoded
+
+def _read_run(cap, position, length, hop, max_side=None):
+    """Reads `length` frames spaced `hop` apart, matching extract_frames' cadence."""
+    cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+    run = []
     count = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret: break
+    while len(run) < length:
         if count % hop == 0:
-            frames.append(frame)
+            ret, frame = cap.read()
+            if not ret: break
+            run.extend(wrap_frames([frame], max_side))
+        elif not cap.grab():
+            break
         count += 1
+    return run
+
+def _find_scenes(signatures, threshold):
+    """Splits probe indices into scenes at large histogram jumps."""
+    scenes = []
+    start = 0
+    for i in range(1, len(signatures)):
+        distance = cv2.compareHist(signatures[i - 1], signatures[i], cv2.HISTCMP_BHATTACHARYYA)
+        if distance > threshold:
+            scenes.append((start, i))
+            start = i
+    scenes.append((start, len(signatures)))
+    return scenes
+
+@traced("decode")
+def sample_frames_adaptive(video_path, budget=10, run_count=3, run_length=8, fps=5,
+                           probe_points=48, probe_size=64, scene_threshold=0.35, max_side=None,
+                           probe=None):
+    """
+    Scene-aware frame sampling with a cost that does not grow with duration
+
+    Short videos are decoded exactly like `extract_frames`. Longer ones are
+    probed at `probe_points` evenly spaced positions on low-resolution
+    histograms to find shot boundaries; `budget` representative frames are
+    then spread across the scenes and `run_count` short contiguous runs
+    (at the `fps` cadence) are read for the motion-based engines.
+
+    Args:
+        video_path: Path to video file
+        budget: Number of representative frames for per-frame engines
+        run_count: Number of contiguous runs for temporal engines
+        run_length: Frames per run
+        fps: Sampling cadence inside runs (same as extract_frames)
+        probe_points: Number of positions probed for scene detection
+        probe_size: Side of the thumbnail used for histograms
+        scene_threshold: Bhattacharyya distance marking a shot boundary
+        max_side: Largest resolution kept in memory for the engines
+        probe: Container probe of the file, used for fps and frame count
+
+    Returns:
+        Dict with representative `frames`, contiguous `runs`, the flattened
+        run `sequence` (all as FrameViews), the representative `timestamps`
+        and the detected `scenes`
+    """
+    cap = cv2.VideoCapture(video_path)
+    if probe is not None and probe.fps and probe.frame_count:
+        video_fps, frame_count = probe.fps, probe.frame_count
+    else:
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    hop = int(video_fps / fps) if video_fps > fps else 1
+
+    # Short (or unseekable) videos: a full sampled decode is already cheap
+    if frame_count <= 0 or frame_count // hop <= probe_points:
+        source_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        cap.release()
+        frames = extract_frames(video_path, fps=fps, max_side=max_side, probe=probe)
+        all_timestamps = [round(i * hop / video_fps, 3) if video_fps else 0.0 for i in range(len(frames))]
+        frames = wrap_frames(frames, timestamps=all_timestamps, source_shape=source_shape)
+        picks = _spread(list(range(len(frames))), budget)
+        return {
+            'frames': [frames[i] for i in picks],
+            'runs': [frames] if frames else [],
+            'sequence': frames,
+            'timestamps': [all_timestamps[i] for i in picks],
+            'scenes': [(0, frame_count)] if frames else []
+        }
+
+    source_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+
+    # 1. Probe evenly spaced positions on low-resolution signatures
+    positions = np.linspace(0, frame_count - 1, probe_points).astype(int)
+    probed, signatures = [], []
+    with span("decode.scene_probe"):
+        for pos, frame in _read_positions(cap, video_path, positions):
+            probed.append(pos)
+            signatures.append(_signature(frame, probe_size))
+
+    if not probed:
+        cap.release()
+        return {'frames': [], 'runs': [], 'sequence': [], 'timestamps': [], 'scenes': []}
+
+    scenes = _find_scenes(signatures, scene_threshold)
+
+    # 2. Spread the representative budget across scenes (longest scenes first)
+    ranked = sorted(scenes, key=lambda s: s[1] - s[0], reverse=True)[:budget]
+    total = sum(end - start for start, end in ranked)
+    picks = []
+    for start, end in ranked:
+        share = max(1, int(round(budget * (end - start) / total)))
+        picks.extend(_spread(probed[start:end], share))
+    picks = sorted(set(_spread(sorted(set(picks)), budget)))
+
+    frames, timestamps = [], []
+    for pos, frame in _read_positions(cap, video_path, picks, max_side):
+        timestamps.append(round(pos / video_fps, 3) if video_fps else 0.0)
+        frames.extend(wrap_frames([frame], max_side, timestamps[-1:], source_shape))
+
+    # 3. Contiguous runs from the middle of the longest scenes
+    runs = []
+    for start, end in ranked[:run_count]:
+        mid = probed[(start + end - 1) // 2]
+        run = _read_run(cap, mid, run_length, hop, max_side)
+        if len(run) >= 2:
+            runs.append(run)
+    cap.release()
+
+    return {
+        'frames': frames,
+        'runs': runs,
+        'sequence': [f for run in runs for f in run],
+        'timestamps': timestamps,
+        'scenes': [(probed[start], probed[end - 1]) for start, end in scenes]
+    }
+
+@traced("decode.segment")
+def sample_segment(video_path, start_frame, end_frame, budget=4, run_length=8, fps=5,
+                   max_side=None, video_fps=None):
+    """
+    Frames from one time segment, decoded with a capture of its own
+
+    Each call opens and seeks its own `VideoCapture`, so segments of the
+    same file can be decoded concurrently from different threads.
+
+    Args:
+        video_path: Path to video file
+        start_frame: First frame of the segment
+        end_frame: Frame after the last one of the segment
+        budget: Number of representative frames spread over the segment
+        run_length: Frames of the contiguous run read from its middle
+        fps: Sampling cadence inside the run (same as extract_frames)
+        max_side: Largest resolution kept in memory for the engines
+        video_fps: Frame rate of the video (read from the file if omitted)
+
+    Returns:
+        Dict with `frames`, `runs`, `sequence` and `timestamps` shaped like
+        sample_frames_adaptive's result
+    """
+    cap = cv2.VideoCapture(video_path)
+    video_fps = video_fps or cap.get(cv2.CAP_PROP_FPS) or 0.0
+    hop = int(video_fps / fps) if video_fps > fps else 1
+    source_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+
+    frames, timestamps = [], []
+    positions = np.linspace(start_frame, end_frame - 1, budget).astype(int)
+    for pos, frame in _read_positions(cap, video_path, positions, max_side):
+        timestamps.append(round(pos / video_fps, 3) if video_fps else 0.0)
+        frames.extend(wrap_frames([frame], max_side, timestamps[-1:], source_shape))
+
+    # Start the run so that it ends inside the segment when possible
+    run_start = max(start_frame, (start_frame + end_frame) // 2 - (run_length * hop) // 2)
+    run = _read_run(cap, run_start, run_length, hop, max_side)
     cap.release()
-    return frames
\ No newline at end of file
+
+    runs = [run] if len(run) >= 2 else []
+    return {
+        'frames': frames,
+        'runs': runs,
+        'sequence': [f for r in runs for f in r],
+        'timestamps': timestamps
+    }
@@ -0,0 +1,221 @@
+"""
+Per-job scratch directories
+
+Every job gets its own directory under WORKSPACE_ROOT (tmpfs by default), so
+concurrent jobs never share or delete each other's files. Directories are
+named `<pid>_<job_id>`. A job holds an exclusive flock on the directory's
+lock file for as long as it runs (the kernel drops it if the process dies),
+so the background reaper only removes workspaces nobody holds: those left
+by crashed processes, or unreleased ones older than WORKSPACE_MAX_AGE.
+"""
+import fcntl
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _default_root():
+    # tmpfs keeps scratch I/O in memory; fall back to the system temp dir
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm/verifai"
+    return os.path.join(tempfile.gettempdir(), "verifai")
+
+
+def in_memory(path: str) -> bool:
+    """Whether `path` is on a tmpfs, where files take RAM (longest matching mount in /proc/mounts)"""
+    path = os.path.realpath(path)
+    fstype, longest = None, -1
+    try:
+        with open("/proc/mounts") as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace("\\040", " ")
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > longest:
+                    fstype, longest = fields[2], len(mount)
+    except OSError:
+        # No /proc (macOS): only the default tmpfs location counts
+        return path.startswith("/dev/shm")
+    return fstype in ("tmpfs", "ramfs")
+
+
+WORKSPACE_ROOT = os.environ.get("VERIFAI_WORKSPACE_ROOT") or _default_root()
+# Job files count against the memory budget when the workspaces live in RAM
+WORKSPACE_IN_MEMORY = in_memory(WORKSPACE_ROOT)
+WORKSPACE_QUOTA_MB = int(os.environ.get("VERIFAI_WORKSPACE_QUOTA_MB", "512"))
+WORKSPACE_MAX_AGE = int(os.environ.get("VERIFAI_WORKSPACE_MAX_AGE", "3600"))  # seconds
+REAP_INTERVAL = 300  # seconds
+LOCK_NAME = ".lock"  # Held by the job while it runs; client file names can't start with "."
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class QuotaExceeded(Exception):
+    """A job tried to write more than its workspace quota"""
+
+
+class Workspace:
+    """A private scratch directory with a byte quota"""
+
+    def __init__(self, job_id: str, root: str = WORKSPACE_ROOT, quota_mb: int = WORKSPACE_QUOTA_MB):
+        self.job_id = job_id
+        self.quota_bytes = quota_mb * 1024 * 1024
+        self.path = os.path.join(root, f"{os.getpid()}_{job_id}")
+        os.makedirs(self.path, exist_ok=True)
+        # Marks the workspace as live for the reaper until cleanup (or process death)
+        self._lock_fd = os.open(os.path.join(self.path, LOCK_NAME), os.O_CREAT | os.O_RDWR, 0o600)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def file(self, name: str) -> str:
+        """Path for `name` inside the workspace (client-supplied names are sanitised)"""
+        name = _UNSAFE_CHARS.sub("_", os.path.basename(name or "")).lstrip(".") or "file"
+        return os.path.join(self.path, name[-128:])
+
+    def used_bytes(self) -> int:
+        total = 0
+        for folder, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(folder, name))
+                except OSError:
+                    pass
+        return total
+
+    def spool(self, source, name: str, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Copy a file-like object into the workspace, enforcing the quota
+
+        Args:
+            source: Readable binary file object
+            name: Target file name
+            chunk_size: Bytes per read
+
+        Returns:
+            Path of the written file
+
+        Raises:
+            QuotaExceeded: if the workspace would grow past its quota
+        """
+        path = self.file(name)
+        remaining = self.quota_bytes - self.used_bytes()
+        with open(path, "wb") as target:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if remaining < 0:
+                    raise QuotaExceeded(f"Upload exceeds the {self.quota_bytes // (1024 * 1024)} MB job quota")
+                target.write(chunk)
+        return path
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+@contextmanager
+def job_workspace(job_id: str, root: str = WORKSPACE_ROOT, quota_mb: int = WORKSPACE_QUOTA_MB):
+    """Yields a Workspace and removes it however the job ends"""
+    workspace = Workspace(job_id, root=root, quota_mb=quota_mb)
+    try:
+        yield workspace
+    finally:
+        workspace.cleanup()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _claim(path: str):
+    """
+    Lock a workspace nobody holds
+
+    Returns:
+        Open descriptor holding the lock (close it to release), -1 for a
+        workspace without a lock file, or None while a job holds it
+    """
+    try:
+        fd = os.open(os.path.join(path, LOCK_NAME), os.O_RDWR)
+    except FileNotFoundError:
+        return -1
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def reap_orphans(root: str = WORKSPACE_ROOT, max_age: int = WORKSPACE_MAX_AGE) -> int:
+    """
+    Remove workspaces no running job holds, once their process is gone or
+    they are older than `max_age`
+
+    Returns:
+        Number of directories removed
+    """
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    now = time.time()
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        try:
+            pid = int(entry.split("_", 1)[0])
+            stale = not _pid_alive(pid) or now - os.path.getmtime(path) > max_age
+        except (ValueError, OSError):
+            continue
+        if not stale:
+            continue
+        fd = _claim(path)
+        if fd is None:
+            # Still held by a running job (e.g. a long segmented video)
+            continue
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        finally:
+            if fd >= 0:
+                os.close(fd)
+    return removed
+
+
+def start_reaper(root: str = WORKSPACE_ROOT, interval: int = REAP_INTERVAL) -> threading.Event:
+    """
+    Reap orphans now and then every `interval` seconds in a daemon thread
+
+    Returns:
+        Event that stops the thread when set
+    """
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                removed = reap_orphans(root)
+                if removed:
+                    print(f"🧹 Removed {removed} orphaned job workspaces")
+            except Exception as e:
+                print(f"⚠️ Workspace reaper failed: {e}")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=loop, name="workspace-reaper", daemon=True).start()
+    return stop
@@ -1,3 +1,81 @@
+// Latency budget for popup analyses; the backend trims the work to fit it.
+// It covers the analysis only - queueing and the video download are not counted.
+const ANALYSIS_BUDGET_MS = 3000;
+
+// Frames captured from the page's player: a few bursts of frames at a bounded size.
+// Frames of a burst are 200 ms of media time apart, the 5 fps the backend samples videos at,
+// so motion statistics match those of an uploaded video (the backend splits bursts at 0.4 s)
+const CAPTURE_MAX_SIDE = 640;
+const CAPTURE_RUNS = 3;
+const CAPTURE_RUN_LENGTH = 6;
+const CAPTURE_FRAME_INTERVAL_MS = 200;
+const CAPTURE_RUN_GAP_MS = 700;
+const CAPTURE_QUALITY = 0.8;
+
+// Runs in the page: draws bursts of frames of the largest playing video onto a canvas
+async function captureVideoFrames(maxSide, runCount, runLength, intervalMs, gapMs, quality) {
+    const videos = [...document.querySelectorAll('video')].filter(v => v.readyState >= 2 && v.videoWidth > 0);
+    if (videos.length === 0) return { error: 'no-video' };
+    const video = videos.reduce((a, b) => (a.clientWidth * a.clientHeight >= b.clientWidth * b.clientHeight ? a : b));
+
+    const scale = Math.min(1, maxSide / Math.max(video.videoWidth, video.videoHeight));
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
+    const ctx = canvas.getContext('2d');
+    const frames = [];
+    const grab = (timestamp) => {
+        ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+        frames.push({ data: canvas.toDataURL('image/jpeg', quality), timestamp });
+    };
+    // Grabs the first frame presented at least `intervalMs` of media time after `after`
+    // (or the next one when `after` is null); false if none comes (paused, stalled)
+    const grabAfter = (after) => new Promise(resolve => {
+        let settled = false;
+        const finish = (grabbed, timestamp) => {
+            if (settled) return;
+            settled = true;
+            clearTimeout(timer);
+            if (grabbed) grab(timestamp);
+            resolve(grabbed);
+        };
+        const timer = setTimeout(() => finish(false), intervalMs + 500);
+        if (video.requestVideoFrameCallback) {
+            const onFrame = (now, meta) => {
+                if (settled) return;
+                if (after !== null && meta.mediaTime - after < intervalMs / 1000) {
+                    video.requestVideoFrameCallback(onFrame);
+                } else {
+                    finish(true, meta.mediaTime);
+                }
+            };
+            video.requestVideoFrameCallback(onFrame);
+        } else {
+            setTimeout(() => finish(true, video.currentTime), after === null ? 0 : intervalMs);
+        }
+    });
+
+    try {
+        if (video.paused || video.ended) {
+            // A single still: the backend skips the motion checks
+            grab(video.currentTime);
+        } else {
+            for (let r = 0; r < runCount; r++) {
+                if (r > 0) await new Promise(resolve => setTimeout(resolve, gapMs));
+                let last = null;
+                for (let i = 0; i < runLength; i++) {
+                    if (!await grabAfter(last)) break;
+                    last = frames[frames.length - 1].timestamp;
+                }
+            }
+        }
+    } catch (e) {
+        // Cross-origin video served without CORS taints the canvas
+        return { error: e.name === 'SecurityError' ? 'tainted' : e.message };
+    }
+    return { frames, width: video.videoWidth, height: video.videoHeight };
+}
+
 // File Upload Logic
 document.getElementById('video-input').addEventListener('change', () => {
     document.getElementById('analyze-btn').classList.remove('hidden');
@@ -15,8 +93,9 @@ document.getElementById('analyze-btn').addEventListener('click', async () => {
     formData.append('file', videoInput.files[0]);
 
     try {
-        const response = await fetch('http://localhost:8000/api/analyze', {
+        const response = await fetch(`http://localhost:8000/api/analyze?budget_ms=${ANALYSIS_BUDGET_MS}`, {
             method: 'POST',
+            headers: { 'X-Priority': 'interactive' },
             body: formData
         });
         const result = await response.json();
@@ -38,6 +117,29 @@ document.getElementById('scan-btn').addEventListener('click', async () => {
     startLoading();
 
     try {
+        // Frames straight from the player: no video transfer, and blob-backed players work too
+        const [capture] = await chrome.scripting.executeScript({
+            target: { tabId: tab.id },
+            func: captureVideoFrames,
+            args: [CAPTURE_MAX_SIDE, CAPTURE_RUNS, CAPTURE_RUN_LENGTH, CAPTURE_FRAME_INTERVAL_MS,
+                   CAPTURE_RUN_GAP_MS, CAPTURE_QUALITY]
+        });
+        const captured = capture && capture.result;
+        if (captured && captured.frames && captured.frames.length > 0) {
+            const response = await fetch('http://localhost:8000/api/analyze_frames', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'X-Priority': 'interactive' },
+                body: JSON.stringify({
+                    frames: captured.frames, width: captured.width, height: captured.height,
+                    source: tab.url, budget_ms: ANALYSIS_BUDGET_MS
+                })
+            });
+            if (!response.ok) throw new Error("Backend failed to analyze the captured frames");
+            showResults(await response.json());
+            return;
+        }
+        console.log("Frame capture unavailable, falling back to the video URL:", captured && captured.error);
+
         const url = tab.url.toLowerCase();
         const isSocialMedia = ['youtube.com', 'youtu.be', 'tiktok.com', 'instagram.com', 'twitter.com', 'x.com'].some(s => url.includes(s));
 
@@ -67,7 +169,7 @@ document.getElementById('scan-btn').addEventListener('click', async () => {
 
         if (!videoUrl || videoUrl.startsWith('blob:')) {
             const msg = videoUrl?.startsWith('blob:')
-                ? "This video format (blob) is protected and cannot be scanned directly. Try scanning the main page URL instead."
+                ? "This video (blob) could not be captured from the player and cannot be downloaded. Try scanning the main page URL instead."
                 : "No scanable video found on this page.";
             alert(msg);
             resetUI();
@@ -77,8 +179,8 @@ document.getElementById('scan-btn').addEventListener('click', async () => {
         // Send URL to Backend
         const response = await fetch('http://localhost:8000/api/analyze_url', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: videoUrl })
+            headers: { 'Content-Type': 'application/json', 'X-Priority': 'interactive' },
+            body: JSON.stringify({ url: videoUrl, budget_ms: ANALYSIS_BUDGET_MS })
         });
 
         if (!response.ok) throw new Error("Backend failed to download/analyze");
@@ -122,6 +224,15 @@ function showResults(data) {
         div.innerHTML = `• <b>${ev.type}:</b> ${ev.explanation}`;
         evidenceList.appendChild(div);
     });
+
+    if (data.budget && data.budget.skipped.length > 0) {
+        const note = document.createElement('div');
+        note.style.marginTop = "8px";
+        note.style.fontSize = "11px";
+        note.innerText = `Quick scan: ${data.budget.skipped.length} checks skipped to answer in time` +
+            (data.budget.verdict_stable ? "." : " - the full analysis could change this verdict.");
+        evidenceList.appendChild(note);
+    }
 }
 
 function resetUI() {